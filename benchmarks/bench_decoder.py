@@ -0,0 +1,320 @@
+# benchmarks/bench_decoder.py
+"""
+Decoder micro-benchmarks on a deterministic synthetic VLP-32C capture.
+
+    python benchmarks/bench_decoder.py --output bench.json
+    python benchmarks/bench_decoder.py --baseline bench.json   # exit 1 on regression
+
+Every stage runs in a fresh process so its peak RSS is its own.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+LEGACY_PACKETS = 2_000     # per-packet / per-point legacy stages use a sample
+LEGACY_POINTS  = 200_000
+
+
+def _rss_mb():
+    """
+    Peak resident set size of this process in MB. On Linux VmHWM is used
+    because ru_maxrss survives exec() and would include the parent's peak.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+# -- stages -------------------------------------------------------------------
+# Each stage gets (pcap_path, tmp_dir), does its untimed setup and returns
+# (seconds, packets, points) for the timed part.
+
+def _payloads(path):
+    from decoder.pcap_reader import PcapReader
+    return np.array(PcapReader(path).payload_array())
+
+
+def _points(path):
+    from decoder.calibration import Calibration
+    from decoder.packet_parser import parse_packets
+    from decoder.coordinate_transform import compute_points
+    return compute_points(parse_packets(_payloads(path)), Calibration.load())
+
+
+def _frames(points, n_frames):
+    n = len(points['x'])
+    step = max(1, n // n_frames)
+    return [{k: v[i:i + step] for k, v in points.items()} for i in range(0, n, step)][:n_frames]
+
+
+def stage_pcap_read_mmap(path, tmp):
+    from decoder.pcap_reader import PcapReader
+    t = time.perf_counter()
+    arr = np.array(PcapReader(path).payload_array())
+    return time.perf_counter() - t, len(arr), 0
+
+
+def stage_pcap_read_scapy(path, tmp):
+    from scapy.all import rdpcap, UDP
+    t = time.perf_counter()
+    pl = [bytes(p[UDP].payload) for p in rdpcap(path) if UDP in p and len(p[UDP].payload) == 1206]
+    return time.perf_counter() - t, len(pl), 0
+
+
+def stage_parse_packet_dual(path, tmp):
+    from decoder.packet_parser import parse_packet_dual
+    pkts = [p.tobytes() for p in _payloads(path)[:LEGACY_PACKETS]]
+    t = time.perf_counter()
+    n_pts = sum(len(b[1]) for p in pkts for b in parse_packet_dual(p)[0])
+    return time.perf_counter() - t, len(pkts), n_pts
+
+
+def stage_parse_packets(path, tmp):
+    from decoder.packet_parser import parse_packets
+    arr = _payloads(path)
+    t = time.perf_counter()
+    batch = parse_packets(arr)
+    return time.perf_counter() - t, len(arr), len(batch['distance'])
+
+
+def stage_apply_timing_offset(path, tmp):
+    from decoder.calibration import load_timing_offsets
+    from decoder.timestamp_utils import apply_timing_offset
+    table = load_timing_offsets()
+    rng   = np.random.default_rng(0)
+    rows  = rng.integers(0, 32, LEGACY_POINTS).tolist()
+    cols  = rng.integers(0, 12, LEGACY_POINTS).tolist()
+    t = time.perf_counter()
+    for r, c in zip(rows, cols):
+        apply_timing_offset(1000, r, c, table)
+    return time.perf_counter() - t, 0, LEGACY_POINTS
+
+
+def stage_compute_cartesian(path, tmp):
+    from decoder.coordinate_transform import compute_cartesian
+    rng = np.random.default_rng(0)
+    d   = (rng.random(LEGACY_POINTS) * 100).tolist()
+    a   = (rng.random(LEGACY_POINTS) * 360).tolist()
+    v   = (rng.random(LEGACY_POINTS) * 40 - 25).tolist()
+    t = time.perf_counter()
+    for args in zip(d, a, v):
+        compute_cartesian(*args)
+    return time.perf_counter() - t, 0, LEGACY_POINTS
+
+
+def stage_compute_points(path, tmp):
+    from decoder.calibration import Calibration
+    from decoder.packet_parser import parse_packets
+    from decoder.coordinate_transform import compute_points
+    arr, calib = _payloads(path), Calibration.load()
+    batch = parse_packets(arr)
+    t = time.perf_counter()
+    pts = compute_points(batch, calib)
+    return time.perf_counter() - t, len(arr), len(pts['x'])
+
+
+def stage_write_csv_legacy(path, tmp):
+    from decoder.frame_writers import CSV_HEADER
+    from decoder.coordinate_transform import CSV_COLUMNS
+    frames = _frames(_points(path), 3)
+    t = time.perf_counter()
+    for i, f in enumerate(frames):
+        cols = [f[k].tolist() for k in CSV_COLUMNS]
+        with open(os.path.join(tmp, f"legacy_{i}.csv"), 'w', newline='') as fh:
+            w = csv.writer(fh)
+            w.writerow(CSV_HEADER)
+            w.writerows([i_, l, a, f"{d:.6f}", ad, ts, f"{v:.6f}", f"{x:.6f}", f"{y:.6f}", f"{z:.6f}"]
+                         for i_, l, a, d, ad, ts, v, x, y, z in zip(*cols))
+    return time.perf_counter() - t, 0, sum(len(f['x']) for f in frames)
+
+
+def _writer_stage(fmt):
+    def stage(path, tmp):
+        from decoder.frame_writers import make_frame_writer
+        writer = make_frame_writer(fmt)
+        frames = _frames(_points(path), 10)
+        t = time.perf_counter()
+        for i, f in enumerate(frames):
+            writer.write(f, os.path.join(tmp, f"frame_{i}"))
+        return time.perf_counter() - t, 0, sum(len(f['x']) for f in frames)
+    return stage
+
+
+def _end_to_end_stage(fmt):
+    def stage(path, tmp):
+        from decoder.calibration import Calibration
+        from decoder.pcap_reader import PcapReader
+        from decoder.packet_parser import parse_packets
+        from decoder.frame_assembler import FrameAssembler
+        from decoder.coordinate_transform import compute_points
+        from decoder.frame_writers import make_frame_writer
+        t = time.perf_counter()
+        calib, writer = Calibration.load(), make_frame_writer(fmt)
+        reader     = PcapReader(path)
+        offsets, _ = reader.payload_offsets()
+        assembler  = FrameAssembler()
+        n_pts = 0
+
+        def save(frame):
+            pts = compute_points(frame.batch, calib)
+            writer.write(pts, os.path.join(tmp, f"frame_{frame.frame_id}"))
+            return len(pts['x'])
+
+        for s in range(0, len(offsets), 1800):
+            for frame in assembler.push(parse_packets(reader.payload_array(offsets[s:s + 1800]))):
+                n_pts += save(frame)
+        frame = assembler.flush()
+        if frame is not None:
+            n_pts += save(frame)
+        return time.perf_counter() - t, len(offsets), n_pts
+    return stage
+
+
+STAGES = {
+    'pcap_read_mmap':      stage_pcap_read_mmap,
+    'pcap_read_scapy':     stage_pcap_read_scapy,
+    'parse_packet_dual':   stage_parse_packet_dual,
+    'parse_packets':       stage_parse_packets,
+    'apply_timing_offset': stage_apply_timing_offset,
+    'compute_cartesian':   stage_compute_cartesian,
+    'compute_points':      stage_compute_points,
+    'write_csv_legacy':    stage_write_csv_legacy,
+    'write_csv':           _writer_stage('csv'),
+    'write_npy':           _writer_stage('npy'),
+    'write_pcd':           _writer_stage('pcd'),
+    'end_to_end_csv':      _end_to_end_stage('csv'),
+    'end_to_end_npy':      _end_to_end_stage('npy'),
+}
+
+
+def _run_stage(name, path, tmp, repeat=1):
+    base_rss = _rss_mb()
+    runs = [STAGES[name](path, tmp) for _ in range(repeat)]
+    seconds, packets, points = min(runs)
+    return {
+        'seconds':       round(seconds, 6),
+        'packets':       packets,
+        'points':        points,
+        'packets_per_s': round(packets / seconds, 1) if packets else None,
+        'points_per_s':  round(points / seconds, 1) if points else None,
+        'base_rss_mb':   round(base_rss, 1),
+        'peak_rss_mb':   round(_rss_mb(), 1),
+    }
+
+
+# -- driver -------------------------------------------------------------------
+
+def throughput(result):
+    return result['points_per_s'] or result['packets_per_s']
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints new/baseline throughput per stage; returns the stages that got
+    slower than (1 - tolerance) of the baseline.
+    """
+    regressions = []
+    print(f"\n{'stage':<22}{'baseline':>14}{'current':>14}{'ratio':>8}")
+    for name, res in results['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base or not throughput(base) or not throughput(res):
+            continue
+        ratio = throughput(res) / throughput(base)
+        flag  = "  REGRESSION" if ratio < 1 - tolerance else ""
+        print(f"{name:<22}{throughput(base):>14,.0f}{throughput(res):>14,.0f}{ratio:>8.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser("VLP-32C decoder benchmarks")
+    parser.add_argument("-n", "--packets",   type=int, default=18_000,
+                        help="synthetic packets (18,000 ≈ 6 s dual-return at 600 RPM)")
+    parser.add_argument("--zero-ratio",      type=float, default=0.1,
+                        help="share of empty returns in the synthetic data")
+    parser.add_argument("--return-mode",     default="dual", choices=["strongest", "last", "dual"])
+    parser.add_argument("--stages",          nargs="*", default=list(STAGES),
+                        help=f"subset of: {' '.join(STAGES)}")
+    parser.add_argument("-r", "--repeat",    type=int, default=3,
+                        help="runs per stage; the fastest is reported")
+    parser.add_argument("-o", "--output",    help="write results JSON here")
+    parser.add_argument("-b", "--baseline",  help="compare against a previous results JSON")
+    parser.add_argument("--tolerance",       type=float, default=0.15,
+                        help="allowed throughput drop vs baseline (fraction)")
+    args = parser.parse_args()
+
+    from decoder.synthetic import write_synthetic_pcap
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        pcap = os.path.join(tmp, "synthetic.pcap")
+        # Generate in a child so the parent stays small
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            pool.submit(write_synthetic_pcap, pcap, args.packets, zero_ratio=args.zero_ratio,
+                        return_mode=args.return_mode).result()
+
+        results = {
+            'meta': {
+                'time':        time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'python':      platform.python_version(),
+                'numpy':       np.__version__,
+                'platform':    platform.platform(),
+                'machine':     platform.machine(),
+                'packets':     args.packets,
+                'zero_ratio':  args.zero_ratio,
+                'return_mode': args.return_mode,
+            },
+            'stages': {},
+        }
+
+        print(f"{'stage':<22}{'packets/s':>14}{'points/s':>14}{'peak MB':>10}")
+        for name in args.stages:
+            stage_dir = os.path.join(tmp, name)
+            os.makedirs(stage_dir)
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    res = pool.submit(_run_stage, name, pcap, stage_dir, args.repeat).result()
+            except ImportError as e:
+                print(f"{name:<22}skipped ({e})")
+                continue
+            results['stages'][name] = res
+            pps = f"{res['packets_per_s']:,.0f}" if res['packets_per_s'] else "-"
+            ptp = f"{res['points_per_s']:,.0f}" if res['points_per_s'] else "-"
+            print(f"{name:<22}{pps:>14}{ptp:>14}{res['peak_rss_mb']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressed stages: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+# benchmarks/soak_live.py
+"""
+End-to-end soak test of the live pipeline over loopback: live_capture.py
+(socket backend) is started on a local port and fed by the PCAP replayer.
+
+    python benchmarks/soak_live.py --duration 600 --output soak.json
+    python benchmarks/soak_live.py --pcap capture.pcap --speed 2 --duration 3600
+    python benchmarks/soak_live.py --speed 0 --duration 60 --max-drop 0.001   # exit 1 above 0.1 % loss
+    python benchmarks/soak_live.py --duration 60 -- --format npy --shm        # extra live_capture args
+
+Without --pcap a synthetic capture is generated. The capture is looped
+for the whole run (each pass boundary ends a partial frame). Reports
+sustained packets/s, drop rate (replayer sent vs pipeline received, less
+the ring backlog left at shutdown; plus the kernel / ring / continuity
+counters), frame latency percentiles and the capture process's memory
+over time. A run where the pipeline does not keep up with the replay
+(sustained rate, ring backlog or frame latency) fails even without drops.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from pipeline.metrics      import read_unix_stats
+from pipeline.replay       import PcapReplayer
+from pipeline.udp_receiver import DEFAULT_RING_SLOTS
+
+ROOT            = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOAK_PORT       = 23680
+SYNTH_PACKETS   = 30_000     # ~10 s of dual-return packets, looped
+READY_TIMEOUT_S = 60.0
+DRAIN_S         = 3.0        # capture keeps running this long after the replay stops
+WARMUP_SHARE    = 0.1        # leading part of the run left out of rate / memory trends
+MIN_RATE_SHARE  = 0.95       # sustained pkt/s below this share of the sent rate = behind
+MAX_BACKLOG_S   = 1.0        # ring backlog at shutdown above this many seconds of packets = behind
+MAX_LATENCY_S   = 1.0        # frame latency p50 above this = behind
+
+
+def _rss_mb(pid):
+    """
+    Current resident set size of process `pid` in MB (Linux), or None.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _wait_ready(proc, sock_path, timeout):
+    """
+    Waits until the capture socket is bound, i.e. the stats snapshot has
+    the receiver gauges. Returns the snapshot.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"live_capture.py exited early (code {proc.returncode})")
+        try:
+            snap = read_unix_stats(sock_path)
+            if 'ring.fill' in snap['gauges']:
+                return snap
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.1)
+    raise RuntimeError("live_capture.py did not become ready in time")
+
+
+def _sample(t0, replayer, proc, sock_path):
+    try:
+        snap = read_unix_stats(sock_path)
+    except (OSError, ValueError):
+        return None
+    g = snap['gauges']
+    return {
+        't':             time.time() - t0,
+        'sent':          replayer.sent,
+        'received':      snap['packets']['received'],
+        'frames':        snap['counters'].get('frames.written', 0),
+        'ring_fill':     g.get('ring.fill'),
+        'ring_overruns': g.get('ring.overruns'),
+        'kernel_drops':  g.get('kernel.drops'),
+        'rss_mb':        _rss_mb(proc.pid),
+    }
+
+
+def _last_line(path):
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    return json.loads(lines[-1]) if lines else None
+
+
+def _slope(x, y):
+    """
+    Least-squares slope of y over x, or None with fewer than 3 points.
+    """
+    if len(x) < 3:
+        return None
+    return float(np.polyfit(np.asarray(x, dtype=float), np.asarray(y, dtype=float), 1)[0])
+
+
+def summarize(samples, final, replay):
+    """
+    Run summary from the periodic samples, the final metrics line of the
+    capture process and the replayer stats. Rates and memory trends use
+    the samples taken while the replay was running, after the warm-up.
+    The warm-up lasts at least until the receiver's packet ring has
+    wrapped once: its pages are only touched as it first fills, which
+    looks like growth but is not. A run with fewer than two samples after
+    the warm-up has no sustained rate or memory trend (None).
+    Packets still queued in the ring when the capture stopped are reported
+    as backlog, not as drops; `behind` lists why the pipeline did not keep
+    up with the replay (empty when it did).
+    """
+    end     = replay['elapsed_s']
+    warmup  = WARMUP_SHARE * end
+    if replay['rate']:
+        warmup = max(warmup, DEFAULT_RING_SLOTS / replay['rate'])
+    steady  = [s for s in samples if warmup <= s['t'] <= end]
+    if len(steady) < 2:
+        steady = []
+    sent    = replay['sent']
+    recv    = final['packets']['received']
+    gauges  = final['gauges']
+    backlog = gauges.get('ring.fill') or 0
+    dropped = max(0, sent - recv - backlog)
+    rates   = [(b['received'] - a['received']) / (b['t'] - a['t'])
+               for a, b in zip(steady, steady[1:]) if b['t'] > a['t']]
+    rss     = [s['rss_mb'] for s in steady if s['rss_mb'] is not None]
+    rss_t   = [s['t'] for s in steady if s['rss_mb'] is not None]
+    latency = final['histograms'].get('frame.latency_s', {})
+    cont    = gauges.get('continuity')
+    growth  = _slope(rss_t, rss)
+    sustained = ((steady[-1]['received'] - steady[0]['received']) /
+                 (steady[-1]['t'] - steady[0]['t'])) if steady else None
+
+    behind = []
+    if sustained is not None and replay['rate'] and sustained < MIN_RATE_SHARE * replay['rate']:
+        behind.append(f"sustained {sustained:.0f} pkt/s < {MIN_RATE_SHARE:.0%} "
+                      f"of the {replay['rate']:.0f} pkt/s sent")
+    if replay['rate'] and backlog > MAX_BACKLOG_S * replay['rate']:
+        behind.append(f"ring backlog {backlog} packets "
+                      f"({backlog / replay['rate']:.1f}s) at shutdown")
+    if latency.get('p50') is not None and latency['p50'] > MAX_LATENCY_S:
+        behind.append(f"frame latency p50 {latency['p50']:.2f}s > {MAX_LATENCY_S}s")
+    return {
+        'warmup_s':  warmup,
+        'too_short': not steady,
+        'behind':    behind,
+        'packets': {
+            'sent':          sent,
+            'received':      recv,
+            'backlog':       backlog,
+            'dropped':       dropped,
+            'drop_rate':     dropped / sent if sent else 0.0,
+            'kernel_drops':  gauges.get('kernel.drops'),
+            'ring_overruns': gauges.get('ring.overruns'),
+            'send_errors':   replay['errors'],
+            'sensor_missing': cont.get('missing') if isinstance(cont, dict) else None,
+        },
+        'rate': {
+            'target':     replay['target'],
+            'sent':       replay['rate'],
+            'sustained':  sustained,
+            'min_interval': min(rates) if rates else None,
+            'replay_max_lag_s': replay['max_lag_s'],
+        },
+        'frames': {
+            'written':    final['counters'].get('frames.written', 0),
+            'incomplete': final['counters'].get('frames.incomplete', 0),
+            'latency_s':  {k: latency.get(k) for k in ('count', 'mean', 'p50', 'p90', 'p99', 'max')},
+        },
+        'memory': {
+            'rss_start_mb':   rss[0] if rss else None,
+            'rss_end_mb':     rss[-1] if rss else None,
+            'rss_peak_mb':    max(rss) if rss else None,
+            'growth_mb':      rss[-1] - rss[0] if rss else None,
+            'growth_mb_per_h': growth * 3600 if growth is not None else None,
+        },
+    }
+
+
+def _print_summary(summary):
+    p, r, f, m = summary['packets'], summary['rate'], summary['frames'], summary['memory']
+    lat = f['latency_s']
+    fmt = lambda v, spec: "n/a" if v is None else format(v, spec)
+    print(f"packets   sent {p['sent']}, received {p['received']}, backlog {p['backlog']}, "
+          f"dropped {p['dropped']} ({p['drop_rate'] * 100:.3f} %); kernel drops {p['kernel_drops']}, "
+          f"ring overruns {p['ring_overruns']}, send errors {p['send_errors']}")
+    print(f"rate      target {fmt(r['target'], '.0f')} pkt/s, sent {r['sent']:.0f}, "
+          f"sustained {fmt(r['sustained'], '.0f')}, worst interval {fmt(r['min_interval'], '.0f')}")
+    print(f"frames    {f['written']} written, {f['incomplete']} incomplete; latency "
+          f"p50 {fmt(lat['p50'], '.3f')}s p90 {fmt(lat['p90'], '.3f')}s "
+          f"p99 {fmt(lat['p99'], '.3f')}s max {fmt(lat['max'], '.3f')}s")
+    print(f"memory    RSS {fmt(m['rss_start_mb'], '.1f')} -> {fmt(m['rss_end_mb'], '.1f')} MB "
+          f"(peak {fmt(m['rss_peak_mb'], '.1f')}, trend {fmt(m['growth_mb_per_h'], '+.1f')} MB/h)")
+    if summary['too_short']:
+        print(f"[SOAK] run too short: no samples after the {summary['warmup_s']:.1f}s warm-up, "
+              f"no sustained rate or memory trend")
+    for msg in summary['behind']:
+        print(f"[SOAK] not keeping up: {msg}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pcap",         help="capture to replay (default: synthetic)")
+    parser.add_argument("--speed",        type=float, default=1.0,
+                        help="multiple of the recorded rate, 0 = as fast as possible")
+    parser.add_argument("--duration",     type=float, default=60.0, help="replay seconds")
+    parser.add_argument("--interval",     type=float, default=1.0, help="sampling period (s)")
+    parser.add_argument("--port",         type=int, default=SOAK_PORT, help="loopback UDP port")
+    parser.add_argument("--workdir",      help="capture output directory (default: temporary)")
+    parser.add_argument("--output",       help="write samples and summary to this JSON file")
+    parser.add_argument("--max-drop",     type=float,
+                        help="exit 1 if the drop rate is above this ratio")
+    parser.add_argument("--max-growth",   type=float,
+                        help="exit 1 if RSS grows faster than this many MB/h")
+    parser.add_argument("capture_args",   nargs=argparse.REMAINDER,
+                        help="extra live_capture.py arguments after --")
+    args = parser.parse_args()
+    extra = args.capture_args[1:] if args.capture_args[:1] == ['--'] else args.capture_args
+
+    tmp     = tempfile.TemporaryDirectory(prefix="soak_")
+    workdir = args.workdir or tmp.name
+    os.makedirs(workdir, exist_ok=True)
+    pcap = args.pcap
+    if pcap is None:
+        from decoder.synthetic import write_synthetic_pcap
+        pcap = os.path.join(tmp.name, "synthetic.pcap")
+        write_synthetic_pcap(pcap, SYNTH_PACKETS)
+
+    replayer  = PcapReplayer(pcap, port=args.port, speed=args.speed, loops=0)
+    sock_path = os.path.join(tmp.name, "stats.sock")
+    expected  = replayer.rate or replayer.packets / replayer.span_s
+    cmd = [sys.executable, os.path.join(ROOT, "live_capture.py"),
+           "-b", "socket", "-p", str(args.port), "-o", workdir,
+           "-d", str(args.duration + DRAIN_S), "--stats-socket", sock_path,
+           "--metrics-interval", str(args.interval), "--expected-rate", f"{expected:.1f}"] + extra
+    print(f"[SOAK] {replayer.packets} packets ({replayer.span_s:.1f}s) looped for "
+          f"{args.duration:.0f}s at {'max rate' if not args.speed else f'{expected:.0f} pkt/s'}")
+    print(f"[SOAK] output in {workdir}")
+
+    with open(os.path.join(workdir, "soak_capture.log"), 'w') as log:
+        proc = subprocess.Popen(cmd, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            _wait_ready(proc, sock_path, READY_TIMEOUT_S)
+            result = {}
+            sender = threading.Thread(target=lambda: result.update(replayer.run(args.duration)),
+                                      name="replay", daemon=True)
+            t0 = time.time()
+            sender.start()
+            samples = []
+            while sender.is_alive() or time.time() - t0 < args.duration + DRAIN_S - args.interval:
+                time.sleep(args.interval)
+                s = _sample(t0, replayer, proc, sock_path)
+                if s is not None:
+                    samples.append(s)
+                    rss = "n/a" if s['rss_mb'] is None else f"{s['rss_mb']:.1f}"
+                    print(f"[SOAK] t={s['t']:6.1f}s sent={s['sent']} recv={s['received']} "
+                          f"frames={s['frames']} ring={s['ring_fill']} rss={rss} MB", flush=True)
+            sender.join()
+            proc.wait(timeout=DRAIN_S + 60)
+        finally:
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait()
+            replayer.close()
+
+    final   = _last_line(os.path.join(workdir, "metrics.jsonl"))
+    summary = summarize(samples, final, result)
+    _print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': {'pcap': args.pcap or 'synthetic', 'speed': args.speed,
+                                  'duration_s': args.duration, 'capture_args': extra},
+                       'summary': summary, 'replay': result, 'samples': samples}, f, indent=2)
+        print(f"[SOAK] results written to {args.output}")
+
+    failed = [f"not keeping up: {msg}" for msg in summary['behind']]
+    if args.max_drop is not None and summary['packets']['drop_rate'] > args.max_drop:
+        failed.append(f"drop rate {summary['packets']['drop_rate']:.4%} > {args.max_drop:.4%}")
+    growth = summary['memory']['growth_mb_per_h']
+    if args.max_growth is not None and growth is None:
+        failed.append(f"run too short for an RSS trend (warm-up {summary['warmup_s']:.1f}s)")
+    elif args.max_growth is not None and growth > args.max_growth:
+        failed.append(f"RSS growth {growth:.1f} MB/h > {args.max_growth} MB/h")
+    for msg in failed:
+        print(f"[SOAK] FAIL: {msg}")
+    tmp.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# decoder/background.py
+
+import os
+import warnings
+
+import numpy as np
+
+from decoder.calibration import NUM_CHANNELS
+
+BACKGROUND_VERSION = 1
+AZ_BINS            = 1800    # 0.2° azimuth bins
+WARMUP_FRAMES      = 50      # ~5 s of revolutions at 600 RPM
+MARGIN_M           = 0.5     # foreground must be this much closer ...
+MARGIN_REL         = 0.02    # ... or this share of the background range, whichever is larger
+MIN_HIT_RATIO      = 0.5     # cells hit in fewer warm-up frames have no background
+UPDATE_ALPHA       = 0.02    # EMA weight of background-like observations
+FOREGROUND_ALPHA   = 0.002   # EMA weight of closer observations (slow scene changes)
+
+
+class BackgroundModel:
+    """
+    Static-scene range background on a (laser_id, azimuth bin) grid.
+    1. Warm-up: learn(points) collects, for each of `warmup_frames`
+       frames, the nearest return per cell; the background is the median
+       over those frames (cells seen in fewer than MIN_HIT_RATIO of the
+       frames stay +inf: any return there is foreground).
+    2. subtract(points) keeps only returns clearly closer than the
+       background: distance < background - max(margin, margin_rel * background).
+    3. With update=True, every subtracted frame also moves the background
+       towards the frame's nearest returns (EMA): quickly where the
+       observation looks like background, slowly where it is closer, so
+       parked vehicles and other lasting changes are absorbed over time.
+    Input is compute_points() frame columns (laser_id, azimuth in 0.01°,
+    distance_m).
+    """
+
+    def __init__(self, az_bins=AZ_BINS, warmup_frames=WARMUP_FRAMES, margin=MARGIN_M,
+                 margin_rel=MARGIN_REL, update=False, update_alpha=UPDATE_ALPHA,
+                 foreground_alpha=FOREGROUND_ALPHA):
+        self.az_bins          = az_bins
+        self.warmup_frames    = warmup_frames
+        self.margin           = margin
+        self.margin_rel       = margin_rel
+        self.update           = update
+        self.update_alpha     = update_alpha
+        self.foreground_alpha = foreground_alpha
+
+        self.range   = None          # (32, az_bins) float32 background range (m), once ready
+        self.frames  = 0             # frames learned / updated
+        self.removed = 0             # background points removed by subtract()
+        self.kept    = 0             # foreground points kept by subtract()
+        self._warmup = []
+
+    @property
+    def ready(self):
+        return self.range is not None
+
+    def cells(self, points):
+        """
+        Flat grid cell index of every point.
+        """
+        az_bin = (points['azimuth'].astype(np.int64) * self.az_bins // 36000) % self.az_bins
+        return points['laser_id'].astype(np.int64) * self.az_bins + az_bin
+
+    def nearest(self, points, cells=None):
+        """
+        (32, az_bins) grid of the nearest return per cell in one frame, +inf
+        where the cell has no return.
+        """
+        if cells is None:
+            cells = self.cells(points)
+        grid = np.full(NUM_CHANNELS * self.az_bins, np.inf, dtype=np.float32)
+        np.minimum.at(grid, cells, points['distance_m'].astype(np.float32))
+        return grid.reshape(NUM_CHANNELS, self.az_bins)
+
+    def learn(self, points):
+        """
+        Adds one warm-up frame. Returns True once the background is built.
+        """
+        if self.ready:
+            return True
+        self._warmup.append(self.nearest(points))
+        self.frames += 1
+        if len(self._warmup) >= self.warmup_frames:
+            self._build()
+        return self.ready
+
+    def finish(self):
+        """
+        Builds the background from the warm-up frames collected so far (for
+        inputs shorter than the warm-up window). Returns ready.
+        """
+        if not self.ready and self._warmup:
+            self._build()
+        return self.ready
+
+    def _build(self):
+        stack = np.stack(self._warmup)
+        hits  = np.isfinite(stack).sum(axis=0)
+        stack[~np.isfinite(stack)] = np.nan
+        with warnings.catch_warnings():
+            # Cells never hit are all-NaN; they are set to +inf just below
+            warnings.simplefilter('ignore', RuntimeWarning)
+            bg = np.nanmedian(stack, axis=0)
+        bg[hits < MIN_HIT_RATIO * len(self._warmup)] = np.inf
+        self.range   = bg.astype(np.float32)
+        self._warmup = []
+
+    def threshold(self):
+        """
+        Range below which a return counts as foreground, per cell (+inf
+        where there is no background).
+        """
+        finite = np.isfinite(self.range)
+        out    = np.full_like(self.range, np.inf)
+        out[finite] = self.range[finite] - np.maximum(self.margin,
+                                                      self.margin_rel * self.range[finite])
+        return out
+
+    def subtract(self, points):
+        """
+        Returns (foreground points, number of background points removed).
+        """
+        if not self.ready:
+            raise RuntimeError("background model is not built yet")
+        cells = self.cells(points)
+        keep  = points['distance_m'] < self.threshold().ravel()[cells]
+        if self.update:
+            self._update(self.nearest(points, cells))
+        n_fg = int(np.count_nonzero(keep))
+        n_bg = len(keep) - n_fg
+        self.removed += n_bg
+        self.kept    += n_fg
+        return {k: v[keep] for k, v in points.items()}, n_bg
+
+    def _update(self, obs):
+        seen  = np.isfinite(obs) & np.isfinite(self.range)
+        fg    = obs < self.threshold()
+        alpha = np.where(fg, self.foreground_alpha, self.update_alpha).astype(np.float32)
+        self.range[seen] += alpha[seen] * (obs[seen] - self.range[seen])
+        self.frames += 1
+
+    def apply(self, points):
+        """
+        Streaming use: learns while warming up (frames pass through
+        unchanged), subtracts afterwards. Returns (points, removed).
+        """
+        if not self.ready:
+            self.learn(points)
+            return points, 0
+        return self.subtract(points)
+
+    def save(self, path):
+        if not self.ready:
+            raise RuntimeError("background model is not built yet")
+        with open(path, 'wb') as f:
+            np.savez(f, range=self.range, version=BACKGROUND_VERSION, az_bins=self.az_bins,
+                     frames=self.frames, margin=self.margin, margin_rel=self.margin_rel)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Loads a saved background; kwargs override the saved margins and set
+        the update options.
+        """
+        with np.load(path) as data:
+            if int(data['version']) != BACKGROUND_VERSION:
+                raise ValueError(f"{path}: unsupported background version {int(data['version'])}")
+            kwargs.setdefault('margin', float(data['margin']))
+            kwargs.setdefault('margin_rel', float(data['margin_rel']))
+            model = cls(az_bins=int(data['az_bins']), **kwargs)
+            model.range  = data['range'].astype(np.float32)
+            model.frames = int(data['frames'])
+        return model
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """
+        Loads `path` if it exists, otherwise returns an empty model that
+        learns from the first warm-up frames.
+        """
+        if path and os.path.exists(path):
+            return cls.load(path, **kwargs)
+        return cls(**kwargs)
+
+    def coverage(self):
+        """
+        Share of grid cells with a finite background.
+        """
+        return float(np.isfinite(self.range).mean()) if self.ready else 0.0
@@ -1,5 +1,8 @@
 import os
-import pandas as pd
+import hashlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
 
 # Base directory: where this script resides
 BASE_DIR = os.path.dirname(__file__)
@@ -8,6 +11,15 @@ BASE_DIR = os.path.dirname(__file__)
 DATA_ORDER_PATH      = os.path.join(BASE_DIR, 'VLP-32C-Data-Order-in-Data-Block.csv')
 FIRING_SEQUENCE_PATH = os.path.join(BASE_DIR, 'firing_sequence.csv')
 TIMING_OFFSETS_PATH  = os.path.join(BASE_DIR, 'timing_offsets.csv')
+CALIB_XML_PATH       = os.path.join(os.path.dirname(BASE_DIR), 'calibration', 'VLP-32c.xml')
+
+# Compiled calibrations (.npz keyed by a hash of the source files)
+CACHE_DIR     = os.path.join(BASE_DIR, 'calib_cache')
+CACHE_VERSION = 1
+
+NUM_CHANNELS = 32
+NUM_BLOCKS   = 12
+NUM_RETURNS  = 2
 
 
 def load_data_order_and_angles():
@@ -17,6 +29,7 @@ def load_data_order_and_angles():
       - vertical_angles: Dict[channel_idx -> elevation angle (°)]
       - azimuth_offsets: Dict[channel_idx -> azimuth offset (°)]
     """
+    import pandas as pd
     df = pd.read_csv(DATA_ORDER_PATH)
     laser_id_map    = {idx: int(row['Laser ID']) for idx, row in df.iterrows()}
     vertical_angles = {idx: float(row['Elevation Angle (°)']) for idx, row in df.iterrows()}
@@ -29,6 +42,7 @@ def load_firing_sequence():
     Reads the firing sequence CSV for per-firing ordering info.
     Returns a pandas.DataFrame.
     """
+    import pandas as pd
     return pd.read_csv(FIRING_SEQUENCE_PATH)
 
 
@@ -37,6 +51,7 @@ def load_timing_offsets():
     Reads the timing offsets table: rows = firing sequence index (0–31),
     columns = block index (0–11). Returns a numpy array of shape (32, 12).
     """
+    import pandas as pd
     # Read raw CSV without indexing to preserve 32x12 layout
     df = pd.read_csv(TIMING_OFFSETS_PATH, header=None)
     # Ensure correct shape
@@ -45,6 +60,148 @@ def load_timing_offsets():
     return df.to_numpy()
 
 
+def read_xml_data_order(xml_path):
+    """
+    Reads the per-laser table of a VeloView calibration XML (<points_>
+    items) as an (L, 3) array of [laser id, elevation °, azimuth offset °],
+    the same rows parse_vlp32c_xml() writes to the Data Order CSV.
+    """
+    pts = ET.parse(xml_path).getroot().find('.//points_')
+    if pts is None:
+        raise ValueError(f"{xml_path}: no <points_> section")
+    rows = []
+    for item in pts.findall('item'):
+        px = item.find('px')
+        rows.append((float(px.find('id_').text),
+                     float(px.find('vertCorrection_').text),
+                     float(px.find('rotCorrection_').text)))
+    return np.array(rows, dtype=np.float64)
+
+
+def cache_key(paths):
+    """
+    Hex digest of the cache version and the contents of the source files.
+    """
+    h = hashlib.sha1(str(CACHE_VERSION).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+        h.update(b'\0')
+    return h.hexdigest()[:16]
+
+
+class Calibration:
+    """
+    Dense per-channel lookup tables for the VLP-32C, built once at start-up
+    so the decode path is pure array indexing:
+      - laser_id:        (32,) laser id for each channel in a data block
+      - vertical_angle:  (32,) elevation angle (°) for each channel
+      - cos_elev/sin_elev: (32,) cos/sin of the elevation angle
+      - azimuth_offset:  (32,) azimuth offset (°) for each channel
+      - timing:          (2, 12, 32) timing offset (µs) indexed by
+                         [return_id, firing, channel], already mapped
+                         through the firing sequence (firing = block index
+                         in single return, block // 2 in dual return)
+    """
+
+    def __init__(self, data_order, firing_sequence, timing_offsets):
+        """
+        - data_order:      (L, 3) array of [laser id, elevation °, azimuth offset °]
+        - firing_sequence: (32, 2) array of [laser id, laser id 2] per firing row
+        - timing_offsets:  (32, 12) array of offsets (µs), rows = firing row
+        """
+        data_order      = np.asarray(data_order, dtype=np.float64)
+        firing_sequence = np.asarray(firing_sequence, dtype=np.int64)
+        timing_offsets  = np.asarray(timing_offsets, dtype=np.float64)
+        if firing_sequence.shape != (NUM_CHANNELS, NUM_RETURNS):
+            raise ValueError(f"firing sequence must be (32,2), got {firing_sequence.shape}")
+        if timing_offsets.shape != (NUM_CHANNELS, NUM_BLOCKS):
+            raise ValueError(f"Expected timing_offsets shape (32,12), got {timing_offsets.shape}")
+
+        # Per-laser tables, indexed by row like load_data_order_and_angles()
+        self.elevation_by_laser = data_order[:, 1].copy()
+        self.offset_by_laser    = data_order[:, 2].copy()
+
+        # Per-channel tables
+        self.laser_id       = data_order[:NUM_CHANNELS, 0].astype(np.int64)
+        self.vertical_angle = self.elevation_by_laser[self.laser_id]
+        self.azimuth_offset = self.offset_by_laser[self.laser_id]
+        elev_rad            = np.radians(self.vertical_angle)
+        self.cos_elev       = np.cos(elev_rad)
+        self.sin_elev       = np.sin(elev_rad)
+
+        # Firing row of each laser for the primary / secondary return
+        seq_row = np.zeros((NUM_RETURNS, int(firing_sequence.max()) + 1), dtype=np.int64)
+        rows    = np.arange(NUM_CHANNELS)
+        seq_row[0, firing_sequence[:, 0]] = rows
+        seq_row[1, firing_sequence[:, 1]] = rows
+
+        # timing[ret, blk, ch] = timing_offsets[seq_row[ret, laser_id[ch]], blk]
+        ch_rows     = seq_row[:, self.laser_id]                        # (2, 32)
+        self.timing = timing_offsets[ch_rows].transpose(0, 2, 1).copy() # (2, 12, 32)
+
+        # Source tables, kept for the calibration cache
+        self.data_order      = data_order
+        self.firing_sequence = firing_sequence
+        self.timing_offsets  = timing_offsets
+        self.cache_path      = None   # set by load() when served from the cache
+
+    @classmethod
+    def load(cls, data_order_path=DATA_ORDER_PATH,
+             firing_sequence_path=FIRING_SEQUENCE_PATH,
+             timing_offsets_path=TIMING_OFFSETS_PATH,
+             xml_path=None, cache_dir=CACHE_DIR):
+        """
+        Builds a Calibration from the three calibration CSVs, or from
+        `xml_path` (VeloView XML) instead of the Data Order CSV.
+        With cache_dir, the parsed tables are kept in
+        <cache_dir>/calib_<hash>.npz keyed by the source file contents, so
+        later runs skip the text parsing; an unwritable cache dir only
+        disables caching.
+        """
+        sources = (xml_path or data_order_path, firing_sequence_path, timing_offsets_path)
+        path    = None
+        if cache_dir:
+            path = os.path.join(cache_dir, f"calib_{cache_key(sources)}.npz")
+            try:
+                with np.load(path) as data:
+                    calib = cls(data['data_order'], data['firing_sequence'],
+                                data['timing_offsets'])
+                calib.cache_path = path
+                return calib
+            except (OSError, KeyError, ValueError):
+                pass
+
+        if xml_path:
+            data_order = read_xml_data_order(xml_path)
+        else:
+            data_order = np.loadtxt(data_order_path, delimiter=',', skiprows=1,
+                                    ndmin=2, encoding='utf-8')
+        firing_seq = np.loadtxt(firing_sequence_path, delimiter=',', skiprows=1,
+                                ndmin=2, dtype=np.int64)
+        timing     = np.loadtxt(timing_offsets_path, delimiter=',', ndmin=2)
+        calib = cls(data_order, firing_seq, timing)
+        if path:
+            calib.save(path)
+        return calib
+
+    def save(self, path):
+        """
+        Writes the source tables to `path` (.npz), atomically; returns
+        False if the location is not writable.
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.savez(f, data_order=self.data_order, firing_sequence=self.firing_sequence,
+                         timing_offsets=self.timing_offsets)
+            os.replace(tmp, path)
+        except OSError:
+            return False
+        return True
+
+
 if __name__ == '__main__':
     lid_map, vert_angles, azi_offsets = load_data_order_and_angles()
     print(f"Loaded {len(lid_map)} channels.")
@@ -52,3 +209,5 @@ if __name__ == '__main__':
     print(f"Firing seq rows: {len(fs)}")
     to = load_timing_offsets()
     print(f"Timing offsets shape: {to.shape}")
+    calib = Calibration.load()
+    print(f"Compiled timing table shape: {calib.timing.shape}")
@@ -0,0 +1,355 @@
+# decoder/continuity.py
+
+import os
+import csv
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from decoder.packet_parser   import as_packet_array, BLOCKS_PER_PACKET, BLOCK_FLAG
+from decoder.frame_assembler import block_headers, rollover_blocks
+
+HOUR_US           = 3_600_000_000   # sensor timestamps are µs past the hour
+AZ_BINS           = 360             # 1° azimuth bins for frame coverage
+GAP_FACTOR        = 1.5             # delta > 1.5 periods (or sweeps) = lost packet(s)
+JITTER_US         = 2               # tolerated |delta - period| before 'irregular'
+COMPLETE_COVERAGE = 0.99            # share of azimuth bins a complete frame must hit
+MIN_ESTIMATE      = 64              # deltas needed before the period estimate is fixed
+
+# Per-packet flags (transition from the previous packet to this one)
+FLAG_GAP          = 1   # timestamp delta spans one or more missing packets
+FLAG_IRREGULAR    = 2   # timestamp delta off the nominal period, but no gap
+FLAG_AZ_JUMP      = 4   # azimuth advanced more than one packet's sweep
+FLAG_DUPLICATE    = 8   # same timestamp and azimuth as the previous packet
+FLAG_OUT_OF_ORDER = 16  # timestamp went backwards
+
+FrameContinuity = namedtuple('FrameContinuity', [
+    'frame_id', 'packets', 'missing', 'duplicates', 'out_of_order',
+    'az_jumps', 'irregular', 'coverage', 'complete'])
+FrameContinuity.__doc__ = """
+Completeness of one revolution:
+  - packets:   packets whose first valid block lies in the frame
+  - missing:   packets estimated lost from timestamp gaps
+  - coverage:  share of 1° azimuth bins with at least one block
+  - complete:  no loss, no azimuth jump and coverage >= 99%
+"""
+
+FRAME_CONTINUITY_COLUMNS = list(FrameContinuity._fields)
+
+# Quantities of the per-frame counts, in column order (the first six are
+# the FrameContinuity counts)
+TOTAL_KEYS = ('packets', 'missing', 'duplicates', 'out_of_order', 'az_jumps', 'irregular',
+              'invalid')
+
+
+def packet_headers(payloads):
+    """
+    Returns (timestamp int64 (N,), block flag (N, 12), block azimuth
+    (N, 12)) of a packet batch. (N, 1206) uint8 arrays are read column-wise
+    so only the header bytes are touched.
+    """
+    if isinstance(payloads, np.ndarray) and payloads.dtype == np.uint8 and payloads.ndim == 2:
+        ts = np.ascontiguousarray(payloads[:, 1200:1204]).view('<u4').ravel()
+        flag, az = block_headers(payloads)
+        return ts.astype(np.int64), flag, az
+    pkts = as_packet_array(payloads)
+    return (pkts['timestamp'].astype(np.int64),
+            pkts['blocks']['flag'], pkts['blocks']['azimuth'])
+
+
+class ContinuityChecker:
+    """
+    Streaming packet-loss / gap detector working on whole batches.
+    Feed the same packet batches, in the same order, as the decoder with
+    check(); each call returns the FrameContinuity of the revolutions it
+    completed. Frames are cut on raw block azimuth rollover exactly like
+    FrameAssembler, so frame ids match.
+    Per packet it compares with the previous packet:
+      - timestamp delta vs. the nominal period (gap / irregular)
+      - azimuth step vs. one packet's sweep (az jump)
+      - duplicate (same timestamp and azimuth) and out-of-order packets
+    period_us / az_step default to the median delta / step of the first
+    MIN_ESTIMATE packets. With partial_start the input starts inside a
+    packet whose leading blocks end the revolution before first_frame_id
+    (a resumed follow run); that piece is dropped instead of reported.
+    `base` is the closed_summary() of the earlier runs, which summary()
+    adds to this run's counts.
+    """
+
+    def __init__(self, period_us=None, az_step=None, first_frame_id=0, partial_start=False,
+                 base=None):
+        self.period_us = period_us
+        self.az_step   = az_step
+        self._fixed_period = period_us is not None
+        self._fixed_step   = az_step is not None
+
+        self.first_frame_id = first_frame_id
+        self.frame_id      = first_frame_id - 1 if partial_start else first_frame_id
+        self.last_block_az = None
+        self._drop_first   = partial_start
+        self._last_ts = None        # unwrapped µs of the previous packet
+        self._last_az = None
+        self._hw_ts   = None        # latest timestamp seen, and its packet's azimuth
+        self._hw_az   = None
+        self._samples = ([], [])    # deltas / steps collected for the estimates
+        self._frame   = self._new_frame()
+        self.frames   = []          # FrameContinuity of every completed frame
+        self.totals   = dict.fromkeys(('packets', 'invalid', 'missing', 'duplicates',
+                                       'out_of_order', 'az_jumps', 'irregular'), 0)
+        self.base     = base
+        self._closed  = np.zeros(len(TOTAL_KEYS), dtype=np.int64)   # counts of reported frames
+        self._dropped = np.zeros(len(TOTAL_KEYS), dtype=np.int64)   # counts of the partial_start piece
+
+    @staticmethod
+    def _new_frame():
+        return {'counts': np.zeros(len(TOTAL_KEYS), dtype=np.int64),
+                'bins':   np.zeros(AZ_BINS, dtype=bool)}
+
+    def _estimate(self, dt, step):
+        """
+        Median packet period / azimuth step over the first MIN_ESTIMATE
+        in-order deltas, accumulated across batches.
+        """
+        if self._fixed_period and self._fixed_step:
+            return
+        self._samples[0].extend(dt[dt > 0][:MIN_ESTIMATE].tolist())
+        self._samples[1].extend(step[(step > 0) & (step < 18000)][:MIN_ESTIMATE].tolist())
+        if not self._fixed_period and self._samples[0]:
+            self.period_us     = float(np.median(self._samples[0]))
+            self._fixed_period = len(self._samples[0]) >= MIN_ESTIMATE
+        if not self._fixed_step and self._samples[1]:
+            self.az_step     = float(np.median(self._samples[1]))
+            self._fixed_step = len(self._samples[1]) >= MIN_ESTIMATE
+
+    def _flags(self, ts, valid, az):
+        """
+        Per-packet flags and missing-packet estimates of a batch (packets
+        without a valid block are skipped). Returns (flags, missing, has
+        data, first valid block).
+        Timestamps are unwrapped across the hour and compared with the
+        latest timestamp seen so far (high-water mark), so a late packet is
+        flagged out-of-order and fills the hole it left (missing -1)
+        instead of showing up as two gaps.
+        """
+        n      = len(ts)
+        has    = valid.any(axis=1)
+        first  = np.argmax(valid, axis=1)
+        pkt_az = az[np.arange(n), first].astype(np.int64)
+
+        all_flags   = np.zeros(n, dtype=np.uint8)
+        all_missing = np.zeros(n, dtype=np.int64)
+        idx = np.flatnonzero(has)
+        if len(idx) == 0:
+            return all_flags, all_missing, has, first
+
+        ts_v, az_v = ts[idx], pkt_az[idx]
+        if self._last_ts is None:
+            # The very first packet has nothing to be compared with
+            self._last_ts = self._hw_ts = int(ts_v[0])
+            self._last_az = self._hw_az = int(az_v[0])
+            ts_v, az_v, idx = ts_v[1:], az_v[1:], idx[1:]
+
+        # Unwrapped timestamps, continuing from the previous packet
+        raw = np.diff(np.concatenate(([self._last_ts % HOUR_US], ts_v)))
+        raw[raw < -HOUR_US // 2] += HOUR_US
+        raw[raw > HOUR_US // 2]  -= HOUR_US
+        tsu = self._last_ts + np.cumsum(raw)
+
+        # High-water mark before each packet, and the azimuth of the packet that set it
+        hw       = np.maximum.accumulate(np.concatenate(([self._hw_ts], tsu)))
+        prev_hw  = hw[:-1]
+        new_hw   = tsu > prev_hw
+        hw_pos   = np.maximum.accumulate(np.where(new_hw, np.arange(len(tsu)), -1))
+        hw_az    = np.where(hw_pos >= 0, az_v[np.maximum(hw_pos, 0)], self._hw_az)
+        prev_hwaz = np.concatenate(([self._hw_az], hw_az[:-1]))
+        prev_az  = np.concatenate(([self._last_az], az_v[:-1]))
+
+        d     = tsu - prev_hw                          # progress past the high-water mark
+        dprev = raw                                    # delta to the previous packet
+        s     = (az_v - prev_hwaz) % 36000
+        self._estimate(d[new_hw], s[new_hw])
+
+        if len(tsu):
+            self._last_ts, self._last_az = int(tsu[-1]), int(az_v[-1])
+            self._hw_ts, self._hw_az     = int(hw[-1]), int(hw_az[-1])
+
+        flags   = np.zeros(len(d), dtype=np.uint8)
+        missing = np.zeros(len(d), dtype=np.int64)
+        if self.period_us:
+            dup  = (dprev == 0) & (az_v == prev_az)
+            ooo  = (d < 0) & ~dup
+            late = ooo | ((d == 0) & ~dup)
+            gap  = d > GAP_FACTOR * self.period_us
+            irr  = ~(dup | late | gap) & (np.abs(d - self.period_us) > JITTER_US)
+            jump = ~(dup | late) & (s > GAP_FACTOR * (self.az_step or 36000))
+            flags[gap]  |= FLAG_GAP
+            flags[irr]  |= FLAG_IRREGULAR
+            flags[jump] |= FLAG_AZ_JUMP
+            flags[dup]  |= FLAG_DUPLICATE
+            flags[ooo]  |= FLAG_OUT_OF_ORDER
+            missing[gap]  = np.rint(d[gap] / self.period_us).astype(np.int64) - 1
+            missing[late] = -1
+
+        all_flags[idx]   = flags
+        all_missing[idx] = missing
+        return all_flags, all_missing, has, first
+
+    def check(self, payloads):
+        """
+        Checks a batch of packets; returns the list of FrameContinuity for
+        frames completed by this batch.
+        """
+        ts, flag, az = packet_headers(payloads)
+        if len(ts) == 0:
+            return []
+        valid = flag == BLOCK_FLAG
+        flags, missing, has, first = self._flags(ts, valid, az)
+
+        t = self.totals
+        t['packets']      += int(has.sum())
+        t['invalid']      += int(len(has) - has.sum())
+        t['missing']      += int(missing.sum())
+        t['duplicates']   += int(np.count_nonzero(flags & FLAG_DUPLICATE))
+        t['out_of_order'] += int(np.count_nonzero(flags & FLAG_OUT_OF_ORDER))
+        t['az_jumps']     += int(np.count_nonzero(flags & FLAG_AZ_JUMP))
+        t['irregular']    += int(np.count_nonzero(flags & FLAG_IRREGULAR))
+
+        # Frame cuts at block granularity, same rule as FrameAssembler
+        pkt, blk = np.nonzero(valid)
+        if len(pkt) == 0:
+            return []
+        block_az  = az[pkt, blk]
+        cuts      = rollover_blocks(block_az, self.last_block_az)
+        self.last_block_az = int(block_az[-1])
+        cut_keys  = pkt[cuts] * BLOCKS_PER_PACKET + blk[cuts]
+        n_slots   = len(cuts) + 1
+
+        # Packet statistics go to the frame holding the packet's first valid block
+        p_idx   = np.flatnonzero(has)
+        p_slot  = np.searchsorted(cut_keys, p_idx * BLOCKS_PER_PACKET + first[p_idx], side='right')
+        f       = flags[p_idx]
+        columns = (np.ones(len(p_idx), dtype=np.int64), missing[p_idx],
+                   (f & FLAG_DUPLICATE) > 0, (f & FLAG_OUT_OF_ORDER) > 0,
+                   (f & FLAG_AZ_JUMP) > 0, (f & FLAG_IRREGULAR) > 0)
+        counts  = np.stack([np.bincount(p_slot, weights=c, minlength=n_slots) for c in columns],
+                           axis=1).astype(np.int64)
+        # Packets without a valid block go to the frame their position falls in
+        q_slot  = np.searchsorted(cut_keys, np.flatnonzero(~has) * BLOCKS_PER_PACKET, side='right')
+        counts  = np.column_stack((counts, np.bincount(q_slot, minlength=n_slots)))
+
+        b_slot = np.searchsorted(cut_keys, pkt * BLOCKS_PER_PACKET + blk, side='right')
+        bins   = np.zeros((n_slots, AZ_BINS), dtype=bool)
+        bins[b_slot, (block_az // 100) % AZ_BINS] = True
+
+        done = []
+        for s in range(n_slots):
+            self._frame['counts'] += counts[s]
+            self._frame['bins']   |= bins[s]
+            if s < n_slots - 1:
+                frame = self._close_frame()
+                if frame is not None:
+                    done.append(frame)
+        return done
+
+    def flush(self):
+        """
+        Returns the FrameContinuity of the trailing partial frame (or None).
+        """
+        if not self._frame['bins'].any() or self._drop_first:
+            return None
+        frame = self._close_frame()
+        self.last_block_az = None
+        return frame
+
+    def _close_frame(self):
+        if self._drop_first:
+            self._drop_first = False
+            self._dropped    = self._frame['counts'].copy()
+            self.frame_id   += 1
+            self._frame      = self._new_frame()
+            return None
+        c        = self._frame['counts']
+        coverage = float(self._frame['bins'].mean())
+        missing  = max(0, int(c[1]))   # late packets may fill holes of an earlier frame
+        self._closed += c
+        frame = FrameContinuity(self.frame_id, int(c[0]), missing, int(c[2]), int(c[3]),
+                                int(c[4]), int(c[5]), round(coverage, 4),
+                                bool(missing == 0 and c[4] == 0 and coverage >= COMPLETE_COVERAGE))
+        self.frames.append(frame)
+        self.frame_id += 1
+        self._frame = self._new_frame()
+        return frame
+
+    def summary(self):
+        """
+        Totals over every packet checked (plus `base`, less the dropped
+        partial_start piece, which an earlier run already counted).
+        Missing packets are summed unclamped, so a late packet fills its
+        hole even when the two fall in different frames (or runs).
+        """
+        dropped = dict(zip(TOTAL_KEYS, self._dropped.tolist()))
+        t = {k: v - dropped[k] for k, v in self.totals.items()}
+        t['frames']          = len(self.frames)
+        t['complete_frames'] = sum(f.complete for f in self.frames)
+        if self.base is not None:
+            for k in TOTAL_KEYS + ('frames', 'complete_frames'):
+                t[k] += self.base[k]
+        t['missing']         = max(0, t['missing'])
+        t['loss_ratio']      = t['missing'] / (t['packets'] + t['missing']) if t['packets'] else 0.0
+        t['period_us']       = self.period_us
+        t['az_step']         = self.az_step
+        return t
+
+    def closed_summary(self):
+        """
+        Counts of the frames reported so far (with `base`), i.e. up to the
+        open revolution: what a resumed run passes back in as `base`.
+        'missing' is the unclamped sum, like the running totals.
+        """
+        out = {k: int(v) for k, v in zip(TOTAL_KEYS, self._closed)}
+        out['frames']          = len(self.frames)
+        out['complete_frames'] = sum(f.complete for f in self.frames)
+        if self.base is not None:
+            for k in out:
+                out[k] += self.base[k]
+        out['period_us'] = self.period_us
+        out['az_step']   = self.az_step
+        return out
+
+
+def save_continuity(checker, output_dir, resume=False):
+    """
+    Writes frame_continuity.csv (one row per frame) and
+    continuity_summary.json to output_dir. Returns the summary dict.
+    With resume (a resumed follow run) the rows already in the file for
+    frames before checker.first_frame_id are kept and the new rows are
+    appended after them; rows of frames this run reports again (the
+    revolution that was open when the earlier run stopped) are replaced.
+    """
+    path = os.path.join(output_dir, "frame_continuity.csv")
+    kept = []
+    if resume and os.path.exists(path):
+        with open(path, newline='') as f:
+            kept = [row for row in list(csv.reader(f))[1:]
+                    if row and int(row[0]) < checker.first_frame_id]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FRAME_CONTINUITY_COLUMNS)
+        writer.writerows(kept)
+        writer.writerows(checker.frames)
+    summary = checker.summary()
+    with open(os.path.join(output_dir, "continuity_summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def describe(frame):
+    """
+    Short log suffix for an incomplete frame ('' when complete).
+    """
+    if frame is None or frame.complete:
+        return ""
+    return (f" [incomplete: missing={frame.missing} dup={frame.duplicates} "
+            f"ooo={frame.out_of_order} az_jumps={frame.az_jumps} "
+            f"coverage={frame.coverage:.1%}]")
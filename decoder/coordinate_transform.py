@@ -2,6 +2,22 @@
 
 import math
 
+import numpy as np
+
+from config import DISTANCE_RESOLUTION
+from decoder.packet_parser import RETURN_DUPLICATE
+
+# One revolution = 360° per 100 ms → degrees per microsecond
+ROTATION_RATE_DEG_PER_US = 360.0 / 100_000.0
+
+# Output columns of a decoded frame; the first ten are the CSV layout
+FRAME_COLUMNS = [
+    'intensity', 'laser_id', 'azimuth', 'distance_m',
+    'adjustedtime', 'timestamp', 'vertical_angle', 'x', 'y', 'z',
+    'return_type',
+]
+CSV_COLUMNS = FRAME_COLUMNS[:10]
+
 def compute_cartesian(distance_m, azimuth_deg, vertical_angle_deg):
     """
     Convert polar LiDAR returns (distance, azimuth, vertical angle)
@@ -15,3 +31,67 @@ def compute_cartesian(distance_m, azimuth_deg, vertical_angle_deg):
     z = distance_m * math.sin(vertical_rad)
 
     return x, y, z
+
+def compute_cartesian_array(distance_m, azimuth_deg, cos_elev, sin_elev):
+    """
+    Array version of compute_cartesian() taking precomputed cos/sin of the
+    vertical angle. Returns x, y, z arrays.
+    """
+    azimuth_rad = np.radians(azimuth_deg)
+    horiz = distance_m * cos_elev
+
+    x = horiz * np.sin(azimuth_rad)
+    y = horiz * np.cos(azimuth_rad)
+    z = distance_m * sin_elev
+
+    return x, y, z
+
+def compute_points(batch, calib, drop_zero=True, drop_duplicates=True):
+    """
+    Turn a parse_packets() batch into frame columns using a Calibration.
+    Per point:
+      - timestamp = packet timestamp + firing offset (integer µs)
+      - azimuth   = block azimuth advanced by the firing delay,
+                    anchored per block (Velodyne logic)
+    Returns a dict keyed by FRAME_COLUMNS, plus 'block_azimuth' (the raw
+    azimuth of the point's block, which range images bin by; it is not
+    written by the frame writers). Zero-distance returns are
+    dropped unless drop_zero is False, dual-return duplicates
+    (RETURN_DUPLICATE) unless drop_duplicates is False; both go in the
+    same pass, before any per-point work.
+    """
+    keep = None
+    if drop_zero:
+        keep = batch['distance'] != 0
+    if drop_duplicates:
+        dup  = batch['return_type'] != RETURN_DUPLICATE
+        keep = dup if keep is None else keep & dup
+    if keep is not None:
+        batch = {k: v[keep] for k, v in batch.items()}
+
+    ch      = batch['channel']
+    base_ts = batch['timestamp'].astype(np.int64)
+    offset  = calib.timing[batch['return_id'], batch['firing'], ch]
+    ts      = (base_ts + offset).astype(np.int64)
+
+    az_off  = calib.azimuth_offset[ch]
+    az_base = (batch['azimuth'] / 100.0 - az_off) % 360.0
+    az_deg  = (az_base + (ts - base_ts) * ROTATION_RATE_DEG_PER_US + az_off) % 360.0
+
+    dist_m  = batch['distance'] * DISTANCE_RESOLUTION
+    x, y, z = compute_cartesian_array(dist_m, az_deg, calib.cos_elev[ch], calib.sin_elev[ch])
+
+    return {
+        'intensity':      batch['intensity'].astype(np.int64),
+        'laser_id':       calib.laser_id[ch],
+        'azimuth':        np.rint(az_deg * 100).astype(np.int64),
+        'distance_m':     dist_m,
+        'adjustedtime':   ts,
+        'timestamp':      ts,
+        'vertical_angle': calib.vertical_angle[ch],
+        'x':              x,
+        'y':              y,
+        'z':              z,
+        'return_type':    batch['return_type'],
+        'block_azimuth':  batch['azimuth'],
+    }
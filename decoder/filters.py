@@ -0,0 +1,197 @@
+# decoder/filters.py
+
+import json
+import threading
+
+import numpy as np
+
+VOXEL_MODES  = ('first', 'centroid')
+FILTER_STEPS = ('range', 'z', 'roi', 'voxel')   # order the filters are applied in
+
+
+def select(points, keep):
+    return {k: v[keep] for k, v in points.items()}
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Even-odd rule point-in-polygon test on whole arrays.
+    polygon is a sequence of (x, y) vertices (closing edge implied).
+    The loop runs over the polygon edges, not over the points.
+    """
+    poly   = np.asarray(polygon, dtype=np.float64)
+    inside = np.zeros(len(x), dtype=bool)
+    x0, y0 = poly[-1]
+    for x1, y1 in poly:
+        crosses = (y0 > y) != (y1 > y)
+        if crosses.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_at = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (x < x_at)
+        x0, y0 = x1, y1
+    return inside
+
+
+def voxel_downsample(points, size, mode='first'):
+    """
+    Keeps one point per voxel of edge `size` (scalar or (sx, sy, sz) in m).
+      - first:    the first point of each voxel, all columns unchanged
+      - centroid: x/y/z are the mean of the voxel's points, the other
+                  columns come from the voxel's first point
+    Output keeps the original point order (by first point per voxel).
+    """
+    if mode not in VOXEL_MODES:
+        raise ValueError(f"voxel mode must be one of {VOXEL_MODES}")
+    n = len(points['x'])
+    if n == 0:
+        return points
+    size = np.broadcast_to(np.asarray(size, dtype=np.float64), (3,))
+    idx  = np.floor(np.stack([points['x'], points['y'], points['z']], axis=1) / size).astype(np.int64)
+    idx -= idx.min(axis=0)
+    dims = idx.max(axis=0) + 1
+    key  = (idx[:, 0] * dims[1] + idx[:, 1]) * dims[2] + idx[:, 2]
+
+    # Group equal keys with one unstable sort; a voxel's first point is the
+    # smallest original index in its group
+    order  = np.argsort(key)
+    skey   = key[order]
+    starts = np.flatnonzero(np.concatenate(([True], skey[1:] != skey[:-1])))
+    first  = np.minimum.reduceat(order, starts)
+    keep   = np.argsort(first)
+    out    = select(points, first[keep])
+    if mode == 'centroid':
+        counts = np.diff(np.append(starts, n))
+        for c in ('x', 'y', 'z'):
+            mean   = np.add.reduceat(points[c][order], starts) / counts
+            out[c] = mean[keep].astype(points[c].dtype)
+    return out
+
+
+class FrameFilter:
+    """
+    Point filter stage run on decoded frame columns (compute_points()
+    output), right after the Cartesian transform. Every step is optional:
+      - range:  range_min <= distance_m <= range_max
+      - z:      z_min <= z <= z_max
+      - roi:    inside `polygon` [[x, y], ...] or `box` [xmin, ymin, xmax, ymax]
+      - voxel:  voxel_size (m, scalar or [sx, sy, sz]) with voxel_mode
+                'first' or 'centroid'
+    apply() returns (points, removed) where removed maps each step to the
+    number of points it dropped; `totals` accumulates over all frames
+    (under a lock: segment conversion threads share one filter).
+    """
+
+    def __init__(self, polygon=None, box=None, z_min=None, z_max=None,
+                 range_min=None, range_max=None, voxel_size=None, voxel_mode='first'):
+        if polygon is not None and box is not None:
+            raise ValueError("give either polygon or box, not both")
+        if polygon is not None and len(polygon) < 3:
+            raise ValueError("polygon needs at least 3 vertices")
+        if voxel_mode not in VOXEL_MODES:
+            raise ValueError(f"voxel_mode must be one of {VOXEL_MODES}")
+        self.polygon    = None if polygon is None else np.asarray(polygon, dtype=np.float64)
+        self.box        = None if box is None else tuple(float(v) for v in box)
+        self.z_min      = z_min
+        self.z_max      = z_max
+        self.range_min  = range_min
+        self.range_max  = range_max
+        self.voxel_size = voxel_size
+        self.voxel_mode = voxel_mode
+        self.totals     = dict.fromkeys(('input',) + FILTER_STEPS + ('output',), 0)
+        self._lock      = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, cfg):
+        unknown = set(cfg) - {'polygon', 'box', 'z_min', 'z_max', 'range_min',
+                              'range_max', 'voxel_size', 'voxel_mode'}
+        if unknown:
+            raise ValueError(f"unknown filter keys: {sorted(unknown)}")
+        return cls(**cfg)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']                  # sent to worker processes
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return any(v is not None for v in (self.polygon, self.box, self.z_min, self.z_max,
+                                           self.range_min, self.range_max, self.voxel_size))
+
+    def _mask(self, points, step):
+        if step == 'range':
+            if self.range_min is None and self.range_max is None:
+                return None
+            d = points['distance_m']
+            keep = np.ones(len(d), dtype=bool)
+            if self.range_min is not None:
+                keep &= d >= self.range_min
+            if self.range_max is not None:
+                keep &= d <= self.range_max
+            return keep
+        if step == 'z':
+            if self.z_min is None and self.z_max is None:
+                return None
+            z = points['z']
+            keep = np.ones(len(z), dtype=bool)
+            if self.z_min is not None:
+                keep &= z >= self.z_min
+            if self.z_max is not None:
+                keep &= z <= self.z_max
+            return keep
+        if step == 'roi':
+            x, y = points['x'], points['y']
+            if self.box is not None:
+                xmin, ymin, xmax, ymax = self.box
+                return (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+            if self.polygon is not None:
+                (xmin, ymin), (xmax, ymax) = self.polygon.min(axis=0), self.polygon.max(axis=0)
+                keep = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+                idx  = np.flatnonzero(keep)
+                keep[idx] = points_in_polygon(x[idx], y[idx], self.polygon)
+                return keep
+        return None
+
+    def apply(self, points):
+        n_in    = len(points['x'])
+        removed = dict.fromkeys(FILTER_STEPS, 0)
+        for step in FILTER_STEPS[:-1]:
+            keep = self._mask(points, step)
+            if keep is not None:
+                removed[step] = int(len(keep) - np.count_nonzero(keep))
+                if removed[step]:
+                    points = select(points, keep)
+        if self.voxel_size is not None:
+            n = len(points['x'])
+            points = voxel_downsample(points, self.voxel_size, self.voxel_mode)
+            removed['voxel'] = n - len(points['x'])
+
+        self.add_totals(n_in, len(points['x']), removed)
+        return points, removed
+
+    def add_totals(self, n_in, n_out, removed):
+        """
+        Adds one frame's counts to `totals`; also used for frames filtered
+        in worker processes.
+        """
+        with self._lock:
+            t = self.totals
+            t['input']  += n_in
+            t['output'] += n_out
+            for step, n in removed.items():
+                t[step] += n
+
+
+def format_removed(removed):
+    """
+    Compact log text for apply()'s removed counts, e.g. 'range -120, roi -48211'.
+    """
+    return ", ".join(f"{k} -{v}" for k, v in removed.items() if v) or "none removed"
@@ -0,0 +1,488 @@
+# decoder/frame_archive.py
+
+import os
+import re
+import sys
+import json
+import lzma
+import mmap
+import zlib
+import struct
+import argparse
+
+import numpy as np
+
+from config import DISTANCE_RESOLUTION
+from decoder.calibration          import NUM_CHANNELS
+from decoder.coordinate_transform import CSV_COLUMNS, FRAME_COLUMNS, compute_cartesian_array
+from decoder.frame_writers        import CSV_HEADER, FRAME_FORMATS, make_frame_writer
+from decoder.packet_parser        import RETURN_SINGLE
+
+ARCHIVE_MAGIC   = b'LFAR'
+ARCHIVE_VERSION = 2          # 2: return_type column; version 1 files are still read
+ARCHIVE_SUFFIX  = '.lfa'
+CHUNK_POINTS    = 65536      # a chunk is closed once it holds this many points (whole frames)
+HOUR_US         = 3_600_000_000
+CODECS          = {
+    'zlib': (lambda b: zlib.compress(b, 6), zlib.decompress),
+    'lzma': (lambda b: lzma.compress(b, preset=1), lzma.decompress),
+}
+
+# x/y/z are recomputed from the quantized polar columns; the stored
+# azimuth is rounded to 0.01°, so points may move by up to this share of
+# their range (0.005° in rad) plus the CSV rounding
+XYZ_TOL_ABS_M = 1e-3
+XYZ_TOL_REL   = np.radians(0.005) * 1.01
+
+# Fixed trailer at the very end of the file
+TAIL = struct.Struct('<QQI4s')   # meta offset, meta length, version, magic
+
+# Quantized per-point columns, stored byte-shuffled per chunk in this order
+POINT_COLUMNS = [
+    ('intensity', 'u1'),
+    ('laser_id',  'u1'),
+    ('azimuth',   '<i2'),   # 0.01°, delta to the previous point of the frame, mod 2**16
+    ('distance',  '<u2'),   # DISTANCE_RESOLUTION units
+    ('dt',        '<i4'),   # µs, timestamp delta to the previous point (DT_ESCAPE: see below)
+    ('adjusted',  '<i4'),   # µs, adjustedtime - timestamp
+    ('return_type', 'u1'),  # RETURN_SINGLE / RETURN_DISTINCT / RETURN_DUPLICATE
+]
+V1_COLUMNS = POINT_COLUMNS[:-1]
+
+# Deltas that do not fit (the top-of-hour jump) are stored as DT_ESCAPE
+# and their full int64 value follows the chunk's columns
+DT_ESCAPE = np.iinfo(np.int32).min
+
+# One row per frame
+ARCHIVE_INDEX_DTYPE = np.dtype([
+    ('frame_id',    '<i8'),
+    ('chunk',       '<i4'),
+    ('first_point', '<i4'),   # position of the frame's first point in its chunk
+    ('n_points',    '<i4'),
+    ('ts_base',     '<i8'),   # timestamp of the first point, as stored (µs past the hour)
+    ('ts_start',    '<i8'),   # earliest / latest timestamp, unwrapped across hours
+    ('ts_end',      '<i8'),
+])
+
+# One row per compressed chunk
+CHUNK_DTYPE = np.dtype([
+    ('offset',   '<i8'),
+    ('size',     '<i8'),
+    ('n_points', '<i8'),
+    ('escapes',  '<i8'),   # int64 deltas after the columns
+])
+
+
+def _shuffle(a):
+    """
+    Byte planes of an array (all first bytes, then all second bytes, ...);
+    compresses better than interleaved little-endian integers.
+    """
+    return a.view(np.uint8).reshape(-1, a.itemsize).T.tobytes()
+
+
+def _unshuffle(buf, dtype, n):
+    dtype = np.dtype(dtype)
+    return np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, n).T.copy().view(dtype).ravel()
+
+
+class FrameArchiveWriter:
+    """
+    Appends frames (dicts of FRAME_COLUMNS arrays) to a compact archive.
+    Per point only the quantized integers are kept (POINT_COLUMNS): range
+    in 4 mm units, azimuth in 0.01°, laser id, intensity and timestamps
+    as deltas within the frame. vertical_angle is stored once per laser
+    and x/y/z are recomputed on read, which is why frames whose x/y/z do
+    not follow from their polar columns (e.g. merged world-frame clouds)
+    are refused with ValueError.
+    Frames are grouped into chunks of about `chunk_points` points, each
+    compressed on its own; a frame index and chunk table at the end of the
+    file give random access. The file is written as <path>.tmp and
+    renamed on close().
+    """
+
+    def __init__(self, path, codec='zlib', chunk_points=CHUNK_POINTS, source=None):
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of {list(CODECS)}")
+        self.path         = path
+        self.codec        = codec
+        self.chunk_points = chunk_points
+        self.source       = source
+        self.elevation    = np.full(NUM_CHANNELS, np.nan)
+        self.frames       = []     # ARCHIVE_INDEX_DTYPE rows
+        self.chunks       = []     # CHUNK_DTYPE rows
+        self.raw_bytes    = 0
+        self.max_error_m  = 0.0
+
+        self._tmp     = path + ".tmp"
+        self._file    = open(self._tmp, 'wb')
+        self._file.write(ARCHIVE_MAGIC + struct.pack('<I', ARCHIVE_VERSION))
+        self._pending = []         # quantized column dicts of the open chunk
+        self._n_open  = 0
+        self._wraps   = 0
+        self._last_ts = None
+
+    def _quantize(self, points):
+        n      = len(points['x'])
+        dist_m = np.asarray(points['distance_m'], dtype=np.float64)
+        units  = np.rint(dist_m / DISTANCE_RESOLUTION)
+        if n and (units.max() > np.iinfo(np.uint16).max or
+                  np.abs(units * DISTANCE_RESOLUTION - dist_m).max() > DISTANCE_RESOLUTION / 4):
+            raise ValueError("distance_m is not a multiple of the 4 mm sensor resolution")
+
+        laser = np.asarray(points['laser_id'], dtype=np.int64)
+        elev  = np.asarray(points['vertical_angle'], dtype=np.float64)
+        table = self.elevation.copy()
+        table[laser] = elev
+        if np.any(np.abs(table[laser] - elev) > 1e-6) or \
+                np.any(np.abs(table - self.elevation) > 1e-6):
+            raise ValueError("vertical_angle differs between points of the same laser")
+        self.elevation = table
+
+        az = np.asarray(points['azimuth'], dtype=np.int64)
+        ts = np.asarray(points['timestamp'], dtype=np.int64)
+        dt = np.diff(ts, prepend=ts[:1])
+        adjusted = np.asarray(points['adjustedtime'], dtype=np.int64) - ts
+        if n and np.abs(adjusted).max() > np.iinfo(np.int32).max:
+            raise ValueError("adjustedtime and timestamp differ by more than 32 bits")
+        escape = np.abs(dt) >= -DT_ESCAPE
+        cols = {
+            'intensity': np.asarray(points['intensity']).astype(np.uint8),
+            'laser_id':  laser.astype(np.uint8),
+            'azimuth':   np.diff(az, prepend=0).astype('<i2'),   # wraps mod 2**16
+            'distance':  units.astype('<u2'),
+            'dt':        np.where(escape, DT_ESCAPE, dt).astype('<i4'),
+            'escapes':   dt[escape],
+            'adjusted':  adjusted.astype('<i4'),
+            'return_type': np.asarray(points['return_type']).astype(np.uint8),
+        }
+
+        # The archive only works if x/y/z follow from the stored columns
+        x, y, z = _cartesian(cols['distance'], az, table, laser)
+        err = np.sqrt((x - points['x']) ** 2 + (y - points['y']) ** 2 + (z - points['z']) ** 2)
+        if n:
+            worst = float((err - XYZ_TOL_REL * dist_m).max())
+            if worst > XYZ_TOL_ABS_M:
+                raise ValueError(f"x/y/z do not follow from the polar columns (off by {worst:.3f} m); "
+                                 f"transformed or merged frames cannot be archived")
+            self.max_error_m = max(self.max_error_m, float(err.max()))
+        return cols, ts
+
+    def add(self, points, frame_id):
+        """
+        Adds one frame. Frames are expected in time order (the index keeps
+        them in the order added).
+        """
+        cols, ts = self._quantize(points)
+        n = len(ts)
+        if n:
+            # Unwrap the top-of-hour rollover so the index times increase
+            if self._last_ts is not None and \
+                    ts[0] + self._wraps * HOUR_US < self._last_ts - HOUR_US // 2:
+                self._wraps += 1
+            inside  = np.cumsum(np.diff(ts, prepend=ts[:1]) < -HOUR_US // 2)   # wrap within the frame
+            wrapped = ts + (self._wraps + inside) * HOUR_US
+            start, end    = int(wrapped.min()), int(wrapped.max())
+            self._last_ts = start
+        else:
+            start = end = self._last_ts or 0
+        self.frames.append((frame_id, len(self.chunks), self._n_open, n,
+                            int(ts[0]) if n else 0, start, end))
+        self._pending.append(cols)
+        self._n_open += n
+        if self._n_open >= self.chunk_points:
+            self._flush_chunk()
+
+    def _flush_chunk(self):
+        if not self._pending:
+            return
+        body = b"".join(_shuffle(np.concatenate([c[name] for c in self._pending]).astype(dtype))
+                        for name, dtype in POINT_COLUMNS)
+        escapes = np.concatenate([c['escapes'] for c in self._pending]).astype('<i8')
+        body += escapes.tobytes()
+        data = CODECS[self.codec][0](body)
+        self.chunks.append((self._file.tell(), len(data), self._n_open, len(escapes)))
+        self._file.write(data)
+        self.raw_bytes += len(body)
+        self._pending, self._n_open = [], 0
+
+    def close(self):
+        self._flush_chunk()
+        frames = np.array(self.frames, dtype=ARCHIVE_INDEX_DTYPE)
+        chunks = np.array(self.chunks, dtype=CHUNK_DTYPE)
+        meta = json.dumps({
+            'version':   ARCHIVE_VERSION,
+            'codec':     self.codec,
+            'frames':    len(frames),
+            'chunks':    len(chunks),
+            'points':    int(frames['n_points'].sum()),
+            'elevation': [None if np.isnan(e) else float(e) for e in self.elevation],
+            'source':    self.source,
+        }).encode()
+        offset = self._file.tell()
+        self._file.write(meta)
+        self._file.write(frames.tobytes())
+        self._file.write(chunks.tobytes())
+        self._file.write(TAIL.pack(offset, len(meta), ARCHIVE_VERSION, ARCHIVE_MAGIC))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.unlink(self._tmp)
+
+
+def _cartesian(distance_units, azimuth, elevation, laser):
+    elev = np.radians(elevation)
+    return compute_cartesian_array(distance_units * DISTANCE_RESOLUTION, azimuth / 100.0,
+                                   np.cos(elev)[laser], np.sin(elev)[laser])
+
+
+class FrameArchiveReader:
+    """
+    Random access to a frame archive. Only the trailer is read on open;
+    read_frame() decompresses the one chunk holding the frame (the last
+    chunk is kept, so neighbouring frames come for free) and rebuilds the
+    FRAME_COLUMNS with the same dtypes as compute_points().
+      - frames_between(t0, t1): frame ids overlapping a time window (µs,
+                                unwrapped like index['ts_start'/'ts_end'])
+      - read_range(t0, t1):     (frame_id, points) for those frames
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < 8 + TAIL.size or self._mm[:4] != ARCHIVE_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: not a frame archive")
+        offset, length, version, magic = TAIL.unpack_from(self._mm, len(self._mm) - TAIL.size)
+        if magic != ARCHIVE_MAGIC or version not in (1, ARCHIVE_VERSION):
+            self._mm.close()
+            raise ValueError(f"{path}: unsupported or truncated frame archive")
+        self.meta  = json.loads(self._mm[offset:offset + length])
+        pos        = offset + length
+        n_frames   = self.meta['frames']
+        # Copies: views would keep the map from being closed
+        self.index = np.frombuffer(self._mm, dtype=ARCHIVE_INDEX_DTYPE, count=n_frames,
+                                   offset=pos).copy()
+        pos       += n_frames * ARCHIVE_INDEX_DTYPE.itemsize
+        self.chunks = np.frombuffer(self._mm, dtype=CHUNK_DTYPE, count=self.meta['chunks'],
+                                    offset=pos).copy()
+        self.elevation = np.array([np.nan if e is None else e for e in self.meta['elevation']])
+        self._decompress = CODECS[self.meta['codec']][1]
+        self._columns = V1_COLUMNS if version == 1 else POINT_COLUMNS
+        self._rows   = {int(f): i for i, f in enumerate(self.index['frame_id'])}
+        self._cached = (None, None)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def frame_ids(self):
+        return self.index['frame_id']
+
+    def _chunk(self, k):
+        if self._cached[0] != k:
+            row  = self.chunks[k]
+            body = memoryview(self._decompress(self._mm[int(row['offset']):
+                                                        int(row['offset'] + row['size'])]))
+            n, pos, cols = int(row['n_points']), 0, {}
+            for name, dtype in self._columns:
+                size = n * np.dtype(dtype).itemsize
+                cols[name] = _unshuffle(body[pos:pos + size], dtype, n)
+                pos += size
+            dt = cols['dt'].astype(np.int64)
+            dt[dt == DT_ESCAPE] = np.frombuffer(body, dtype='<i8', count=int(row['escapes']),
+                                                offset=pos)
+            cols['dt'] = dt
+            if 'return_type' not in cols:
+                cols['return_type'] = np.full(n, RETURN_SINGLE, dtype=np.uint8)
+            self._cached = (k, cols)
+        return self._cached[1]
+
+    def read_frame(self, frame_id):
+        """
+        Frame columns of `frame_id` (KeyError if it is not archived).
+        """
+        row  = self.index[self._rows[frame_id]]
+        cols = self._chunk(int(row['chunk']))
+        a, n = int(row['first_point']), int(row['n_points'])
+        c    = {name: v[a:a + n] for name, v in cols.items()}
+
+        azimuth = np.cumsum(c['azimuth'], dtype=np.int64) % 65536
+        ts      = int(row['ts_base']) + np.cumsum(c['dt'])
+        laser   = c['laser_id'].astype(np.int64)
+        x, y, z = _cartesian(c['distance'].astype(np.float64), azimuth, self.elevation, laser)
+        return {
+            'intensity':      c['intensity'].astype(np.int64),
+            'laser_id':       laser,
+            'azimuth':        azimuth,
+            'distance_m':     c['distance'] * DISTANCE_RESOLUTION,
+            'adjustedtime':   ts + c['adjusted'],
+            'timestamp':      ts,
+            'vertical_angle': self.elevation[laser],
+            'x':              x,
+            'y':              y,
+            'z':              z,
+            'return_type':    c['return_type'].copy(),
+        }
+
+    def frames_between(self, t0, t1):
+        idx = self.index
+        return idx['frame_id'][(idx['ts_end'] >= t0) & (idx['ts_start'] <= t1)]
+
+    def read_range(self, t0, t1):
+        """
+        Yields (frame_id, points) for frames overlapping [t0, t1].
+        """
+        for frame_id in self.frames_between(t0, t1).tolist():
+            yield frame_id, self.read_frame(frame_id)
+
+    def __iter__(self):
+        for frame_id in self.index['frame_id'].tolist():
+            yield frame_id, self.read_frame(frame_id)
+
+    def close(self):
+        self.index = self.chunks = None
+        self._cached = (None, None)
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -- conversion from frame files ------------------------------------------------
+
+FRAME_FILE_RE = re.compile(r'^frame_(\d+)\.(csv|npy)$')
+
+
+def list_frame_files(frame_dir):
+    """
+    (frame_id, path) of the frame_<id>.csv / .npy files in a folder (e.g.
+    csv_frames/), in frame id order.
+    """
+    found = []
+    for name in os.listdir(frame_dir):
+        m = FRAME_FILE_RE.match(name)
+        if m:
+            found.append((int(m.group(1)), os.path.join(frame_dir, name)))
+    return sorted(found)
+
+
+def read_frame_file(path):
+    """
+    Frame columns from a CSV written by CsvFrameWriter (or the legacy
+    csv.writer code) or an .npy FRAME_DTYPE file. CSV frames (and .npy
+    files from before the return_type column) come back as RETURN_SINGLE.
+    """
+    if path.endswith('.npy'):
+        rec = np.load(path)
+        cols = {k: rec[k] for k in FRAME_COLUMNS if k in rec.dtype.names}
+    else:
+        with open(path) as f:
+            header = f.readline().strip().split(',')
+        if header != CSV_HEADER:
+            raise ValueError(f"{path}: unexpected CSV header")
+        data = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+        cols = {k: data[:, i] for i, k in enumerate(CSV_COLUMNS)}
+    cols.setdefault('return_type', np.full(len(cols['x']), RETURN_SINGLE, dtype=np.uint8))
+    return cols
+
+
+def convert_frames(frame_dir, archive_path, codec='zlib', chunk_points=CHUNK_POINTS, log=print):
+    """
+    Packs every frame file of `frame_dir` into one archive. Returns a
+    summary dict (frames, points, input / archive bytes, ratio).
+    """
+    files = list_frame_files(frame_dir)
+    if not files:
+        raise ValueError(f"{frame_dir}: no frame_<id>.csv/.npy files")
+    in_bytes = 0
+    with FrameArchiveWriter(archive_path, codec=codec, chunk_points=chunk_points,
+                            source=os.path.abspath(frame_dir)) as writer:
+        for i, (frame_id, path) in enumerate(files):
+            try:
+                writer.add(read_frame_file(path), frame_id)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}") from None
+            in_bytes += os.path.getsize(path)
+            if log and (i + 1) % 100 == 0:
+                log(f"[ARCHIVE] {i + 1}/{len(files)} frames")
+    out_bytes = os.path.getsize(archive_path)
+    return {
+        'frames':      len(files),
+        'points':      int(sum(f[3] for f in writer.frames)),
+        'input_bytes': in_bytes,
+        'bytes':       out_bytes,
+        'ratio':       in_bytes / out_bytes if out_bytes else None,
+        'max_xyz_error_m': writer.max_error_m,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact archive of decoded frames")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="pack a csv_frames/ folder into one archive")
+    p.add_argument("frames",                help="folder of frame_<id>.csv / .npy files")
+    p.add_argument("archive",               help=f"output archive (e.g. day{ARCHIVE_SUFFIX})")
+    p.add_argument("--codec",               choices=list(CODECS), default="zlib")
+    p.add_argument("--chunk-points",        type=int, default=CHUNK_POINTS)
+
+    p = sub.add_parser("info", help="summary of an archive")
+    p.add_argument("archive")
+
+    p = sub.add_parser("extract", help="write frames back as files")
+    p.add_argument("archive")
+    p.add_argument("-o", "--output",        required=True, help="output folder")
+    p.add_argument("--frame",               type=int, nargs="*", help="frame ids (default: all)")
+    p.add_argument("--start-us",            type=int, help="time window start (unwrapped µs)")
+    p.add_argument("--end-us",              type=int, help="time window end (unwrapped µs)")
+    p.add_argument("-f", "--format",        choices=FRAME_FORMATS, default="csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        summary = convert_frames(args.frames, args.archive, codec=args.codec,
+                                 chunk_points=args.chunk_points)
+        print(f"[ARCHIVE] {summary['frames']} frames, {summary['points']} pts: "
+              f"{summary['input_bytes'] / 1e6:.1f} MB -> {summary['bytes'] / 1e6:.1f} MB "
+              f"({summary['ratio']:.1f}x), max x/y/z error {summary['max_xyz_error_m'] * 1e3:.1f} mm")
+        return
+
+    with FrameArchiveReader(args.archive) as reader:
+        if args.command == "info":
+            idx = reader.index
+            print(json.dumps({k: v for k, v in reader.meta.items() if k != 'elevation'}))
+            if len(idx):
+                print(f"frames {int(idx['frame_id'][0])}..{int(idx['frame_id'][-1])}, "
+                      f"time {int(idx['ts_start'].min())}..{int(idx['ts_end'].max())} µs, "
+                      f"{os.path.getsize(args.archive) / max(1, reader.meta['points']):.2f} bytes/pt")
+            return
+
+        if args.frame:
+            ids = args.frame
+        elif args.start_us is not None or args.end_us is not None:
+            ids = reader.frames_between(args.start_us if args.start_us is not None else -2**62,
+                                        args.end_us if args.end_us is not None else 2**62).tolist()
+        else:
+            ids = reader.frame_ids.tolist()
+        os.makedirs(args.output, exist_ok=True)
+        writer = make_frame_writer(args.format)
+        for frame_id in ids:
+            writer.write(reader.read_frame(frame_id), os.path.join(args.output, f"frame_{frame_id}"))
+        print(f"[ARCHIVE] {len(ids)} frames written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# decoder/frame_assembler.py
+
+from collections import namedtuple
+
+import numpy as np
+
+from decoder.packet_parser import CHANNELS_PER_BLOCK, BLOCKS_PER_PACKET, BLOCK_FLAG
+
+# Byte columns of the 12 (flag, azimuth) block headers in a raw payload
+_BLOCK_HEADER_COLS = (np.arange(BLOCKS_PER_PACKET)[:, None] * 100 + np.arange(4)).ravel()
+
+AssembledFrame = namedtuple('AssembledFrame', ['frame_id', 'batch', 't_first', 't_last'])
+AssembledFrame.__doc__ = """
+One complete revolution:
+  - frame_id: consecutive frame number
+  - batch:    parse_packets()-style dict of per-point arrays
+  - t_first:  stamp of the first batch that contributed to the frame
+  - t_last:   stamp of the batch that completed it
+"""
+
+
+def rollover_blocks(block_az, last_az=None):
+    """
+    Returns indices of blocks that start a new revolution, i.e. whose raw
+    azimuth is smaller than the previous block's (wrap past 359.99°).
+    `last_az` is the azimuth of the block preceding block_az[0], if any.
+    """
+    block_az = np.asarray(block_az, dtype=np.int64)
+    if len(block_az) == 0:
+        return np.empty(0, dtype=np.intp)
+    prev = np.empty_like(block_az)
+    prev[0]  = block_az[0] if last_az is None else last_az
+    prev[1:] = block_az[:-1]
+    return np.flatnonzero(block_az < prev)
+
+
+def block_headers(payloads):
+    """
+    Reads only the block flags and raw azimuths of an (N, 1206) payload
+    array. Returns (flag, azimuth), each (N, 12) uint16.
+    """
+    hdr = np.ascontiguousarray(payloads[:, _BLOCK_HEADER_COLS]).view('<u2')
+    hdr = hdr.reshape(len(payloads), BLOCKS_PER_PACKET, 2)
+    return hdr[..., 0], hdr[..., 1]
+
+
+def find_frame_starts(read_chunk, n_packets, chunk=100_000):
+    """
+    Locates every revolution start in a packet sequence without decoding
+    the channel data.
+    - read_chunk(start, stop) must return payloads [start, stop) as an
+      (n, 1206) uint8 array
+    Returns int64 keys packet_idx * 12 + block_idx of the first block of
+    each frame; key 0 (frame 0) is always included. Frame k spans keys
+    [starts[k], starts[k + 1]).
+    """
+    keys    = [np.zeros(1, dtype=np.int64)]
+    last_az = None
+    for start in range(0, n_packets, chunk):
+        flag, az = block_headers(read_chunk(start, min(start + chunk, n_packets)))
+        pkt, blk = np.nonzero(flag == BLOCK_FLAG)
+        if len(pkt) == 0:
+            continue
+        block_az = az[pkt, blk]
+        cuts     = rollover_blocks(block_az, last_az)
+        last_az  = int(block_az[-1])
+        keys.append((pkt[cuts] + start).astype(np.int64) * BLOCKS_PER_PACKET + blk[cuts])
+    return np.concatenate(keys)
+
+
+def slice_batch(batch, start, stop):
+    return {k: v[start:stop] for k, v in batch.items()}
+
+
+def concat_batches(parts):
+    if len(parts) == 1:
+        return parts[0]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+class FrameAssembler:
+    """
+    Streaming revolution splitter.
+    Feed parse_packets() batches in arrival order with push(); every time the
+    raw block azimuth rolls over, the accumulated points are emitted as an
+    AssembledFrame. The split happens at block granularity, exactly like
+    the rollover check in main1.py, so frames match real revolutions
+    regardless of how packets were batched.
+    """
+
+    def __init__(self, first_frame_id=0):
+        self.frame_id      = first_frame_id
+        self.last_block_az = None
+        self._parts   = []
+        self._t_first = None
+
+    @property
+    def pending_points(self):
+        return sum(len(p['azimuth']) for p in self._parts)
+
+    @property
+    def pending_timestamp(self):
+        """
+        Raw packet timestamp of the open revolution's first point, or None.
+        """
+        return int(self._parts[0]['timestamp'][0]) if self._parts else None
+
+    def push(self, batch, stamp=None):
+        """
+        Adds a batch; returns the list of AssembledFrame it completed.
+        """
+        n = len(batch['azimuth'])
+        if n == 0:
+            return []
+        if self._t_first is None:
+            self._t_first = stamp
+
+        block_az = batch['azimuth'][::CHANNELS_PER_BLOCK]
+        cuts     = rollover_blocks(block_az, self.last_block_az) * CHANNELS_PER_BLOCK
+        self.last_block_az = int(block_az[-1])
+
+        frames = []
+        start  = 0
+        for cut in cuts.tolist():
+            if cut > start:
+                self._parts.append(slice_batch(batch, start, cut))
+            frame = self._emit(stamp)
+            if frame is not None:
+                frames.append(frame)
+            self._t_first = stamp
+            start = cut
+        self._parts.append(slice_batch(batch, start, n))
+        return frames
+
+    def flush(self, stamp=None):
+        """
+        Emits the trailing partial revolution (if any) and resets.
+        """
+        frame = self._emit(stamp)
+        self.last_block_az = None
+        self._t_first = None
+        return frame
+
+    def _emit(self, stamp):
+        if not self._parts:
+            return None
+        frame = AssembledFrame(self.frame_id, concat_batches(self._parts), self._t_first, stamp)
+        self.frame_id += 1
+        self._parts = []
+        return frame
@@ -0,0 +1,184 @@
+# decoder/frame_index.py
+
+import os
+import sys
+import logging
+import itertools
+
+import numpy as np
+
+from decoder.pcap_reader          import PcapReader
+from decoder.packet_parser        import parse_packets, BLOCKS_PER_PACKET, BLOCK_FLAG
+from decoder.frame_assembler      import find_frame_starts, block_headers
+from decoder.coordinate_transform import compute_points
+
+INDEX_VERSION = 1
+INDEX_SUFFIX  = '.fidx.npz'
+HOUR_US       = 3_600_000_000   # sensor timestamps are µs past the hour
+
+# One row per revolution
+INDEX_DTYPE = np.dtype([
+    ('frame',        '<i8'),
+    ('byte_offset',  '<i8'),   # file offset of the record holding the first packet
+    ('packet_index', '<i8'),   # index of the first packet among matching packets
+    ('packet_count', '<i4'),
+    ('first_block',  'u1'),    # first block of the frame in its first packet
+    ('end_block',    'u1'),    # one past the last block in its last packet
+    ('ts_first',     '<i8'),   # sensor µs of first/last packet, unwrapped across hours
+    ('ts_last',      '<i8'),
+    ('az_first',     '<u2'),   # raw azimuth of the first/last valid block
+    ('az_last',      '<u2'),
+])
+
+
+def index_path(pcap_path):
+    return pcap_path + INDEX_SUFFIX
+
+
+def build_frame_index(pcap_path):
+    """
+    Scans a PCAP once and returns an INDEX_DTYPE array describing every
+    revolution. Only block headers and footers are read, plus the first
+    and last packet of each frame.
+    """
+    with PcapReader(pcap_path) as reader:
+        records, offsets, _ = reader.scan_offsets()
+        n_packets = len(offsets)
+        if n_packets == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+
+        def read(a, b):
+            return reader.payload_array(offsets[a:b])
+
+        starts = find_frame_starts(read, n_packets)
+        ends   = np.append(starts[1:], n_packets * BLOCKS_PER_PACKET)   # exclusive keys
+
+        first_pkt, first_blk = np.divmod(starts, BLOCKS_PER_PACKET)
+        last_pkt,  last_blk  = np.divmod(ends - 1, BLOCKS_PER_PACKET)
+
+        first = reader.payload_array(offsets[first_pkt])
+        last  = reader.payload_array(offsets[last_pkt])
+        ts_first = first[:, 1200:1204].copy().view('<u4').ravel().astype(np.int64)
+        ts_last  = last[:, 1200:1204].copy().view('<u4').ravel().astype(np.int64)
+
+        # Azimuth of the first valid block at/after the start and the last
+        # valid block at/before the end (within those two packets)
+        rows = np.arange(len(starts))
+        flag, az = block_headers(first)
+        ok = (flag == BLOCK_FLAG) & (np.arange(BLOCKS_PER_PACKET) >= first_blk[:, None])
+        az_first = az[rows, np.argmax(ok, axis=1)]
+        flag, az = block_headers(last)
+        ok = (flag == BLOCK_FLAG) & (np.arange(BLOCKS_PER_PACKET) <= last_blk[:, None])
+        az_last = az[rows, BLOCKS_PER_PACKET - 1 - np.argmax(ok[:, ::-1], axis=1)]
+
+    # Unwrap the top-of-hour rollover so timestamps increase over the file
+    wraps    = np.concatenate(([0], np.cumsum(np.diff(ts_first) < -HOUR_US // 2)))
+    ts_first = ts_first + wraps * HOUR_US
+    ts_last  = ts_last + (wraps + (ts_last + wraps * HOUR_US < ts_first)) * HOUR_US
+
+    index = np.empty(len(starts), dtype=INDEX_DTYPE)
+    index['frame']        = rows
+    index['byte_offset']  = records[first_pkt]
+    index['packet_index'] = first_pkt
+    index['packet_count'] = last_pkt - first_pkt + 1
+    index['first_block']  = first_blk
+    index['end_block']    = last_blk + 1
+    index['ts_first']     = ts_first
+    index['ts_last']      = ts_last
+    index['az_first']     = az_first
+    index['az_last']      = az_last
+    return index
+
+
+def load_frame_index(pcap_path, rebuild=False):
+    """
+    Returns the frame index of a PCAP, reading the sidecar file
+    (<pcap>.fidx.npz) when it matches the PCAP's size and mtime and
+    (re)building it otherwise. The sidecar is only a cache: when it cannot
+    be written (read-only folder, full disk) the built index is returned.
+    """
+    st   = os.stat(pcap_path)
+    path = index_path(pcap_path)
+    if not rebuild and os.path.exists(path):
+        with np.load(path) as data:
+            if (int(data['version']) == INDEX_VERSION
+                    and int(data['pcap_size']) == st.st_size
+                    and int(data['pcap_mtime_ns']) == st.st_mtime_ns):
+                return data['frames']
+
+    index = build_frame_index(pcap_path)
+    try:
+        with open(path, 'wb') as f:
+            np.savez(f, frames=index, version=INDEX_VERSION,
+                     pcap_size=st.st_size, pcap_mtime_ns=st.st_mtime_ns)
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"Frame index {path} not written: {e}")
+        # Do not leave a partial sidecar behind
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return index
+
+
+class IndexedPcap:
+    """
+    Random access to the revolutions of a PCAP through its frame index:
+      - read_frame(n):        parse_packets() batch of frame n only
+      - decode_frame(n, cal): frame columns of frame n (compute_points)
+      - frames_between(t0, t1): frame numbers overlapping a sensor time
+                              window (µs, unwrapped like the index)
+    Only the packets of the requested frames are read.
+    """
+
+    def __init__(self, pcap_path, rebuild_index=False):
+        self.path   = pcap_path
+        self.index  = load_frame_index(pcap_path, rebuild=rebuild_index)
+        self.reader = PcapReader(pcap_path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_frame(self, n):
+        row  = self.index[n]
+        recs = itertools.islice(self.reader.records(start=int(row['byte_offset'])),
+                                int(row['packet_count']))
+        batch = parse_packets([rec.payload for rec in recs])
+
+        # Trim blocks that belong to the neighbouring frames
+        last = int(row['packet_count']) - 1
+        keep = ~(((batch['packet'] == 0) & (batch['block'] < row['first_block'])) |
+                 ((batch['packet'] == last) & (batch['block'] >= row['end_block'])))
+        return {k: v[keep] for k, v in batch.items()}
+
+    def decode_frame(self, n, calib):
+        return compute_points(self.read_frame(n), calib)
+
+    def frames_between(self, t0, t1):
+        idx = self.index
+        return idx['frame'][(idx['ts_last'] >= t0) & (idx['ts_first'] <= t1)]
+
+    def read_time_range(self, t0, t1):
+        """
+        Yields (frame number, batch) for frames overlapping [t0, t1].
+        """
+        for n in self.frames_between(t0, t1).tolist():
+            yield n, self.read_frame(n)
+
+
+if __name__ == '__main__':
+    pcap = sys.argv[1]
+    idx  = load_frame_index(pcap, rebuild='--rebuild' in sys.argv)
+    print(f"{len(idx)} frames indexed in {index_path(pcap)}")
+    for row in idx[:5]:
+        print(row)
@@ -0,0 +1,263 @@
+# decoder/frame_writers.py
+
+import numpy as np
+
+from decoder.coordinate_transform import FRAME_COLUMNS, CSV_COLUMNS
+
+# Header used by the CSV output (VeloView / ParaView naming); the CSV keeps
+# the original ten columns, return_type is only in the binary formats
+CSV_HEADER = [
+    'intensity', 'laser_id', 'azimuth', 'distance_m',
+    'adjustedtime', 'timestamp', 'vertical_angle',
+    'Points_m_XYZ:0', 'Points_m_XYZ:1', 'Points_m_XYZ:2',
+]
+
+# Packed record layout for the binary writers (41 bytes per point)
+FRAME_DTYPE = np.dtype([
+    ('intensity',      'u1'),
+    ('laser_id',       'u1'),
+    ('azimuth',        '<u2'),
+    ('distance_m',     '<f4'),
+    ('adjustedtime',   '<i8'),
+    ('timestamp',      '<i8'),
+    ('vertical_angle', '<f4'),
+    ('x',              '<f4'),
+    ('y',              '<f4'),
+    ('z',              '<f4'),
+    ('return_type',    'u1'),
+])
+
+FRAME_FORMATS = ('csv', 'npy', 'npz', 'parquet', 'pcd')
+
+# Columns written with six decimals by the CSV writer
+CSV_FLOAT_COLUMNS = {'distance_m', 'vertical_angle', 'x', 'y', 'z'}
+
+
+def points_to_records(points):
+    """
+    Packs a dict of frame columns into one FRAME_DTYPE structured array.
+    """
+    n   = len(points['x'])
+    rec = np.empty(n, dtype=FRAME_DTYPE)
+    for k in FRAME_COLUMNS:
+        rec[k] = points[k]
+    return rec
+
+
+# -- CSV ----------------------------------------------------------------------
+
+_PAD = 0   # filler byte removed before writing
+
+
+def _digits(mag, width):
+    """
+    ASCII digits of non-negative int64 values as an (n, width) uint8 matrix,
+    with leading zeros replaced by _PAD (the last digit is always kept).
+    """
+    out = np.empty((len(mag), width), dtype=np.uint8)
+    m   = mag.copy()
+    for k in range(width - 1, -1, -1):
+        out[:, k] = m % 10 + 48
+        m //= 10
+    lead = ~np.logical_or.accumulate(out != 48, axis=1)
+    lead[:, -1] = False
+    out[lead] = _PAD
+    return out
+
+
+def _sign(neg):
+    return np.where(neg, ord('-'), _PAD).astype(np.uint8)[:, None]
+
+
+def _int_chars(values):
+    values = np.asarray(values, dtype=np.int64)
+    mag    = np.abs(values)
+    width  = len(str(int(mag.max()))) if len(mag) else 1
+    return [_sign(values < 0), _digits(mag, width)]
+
+
+def _fixed_chars(values, decimals=6):
+    """
+    '%.{decimals}f'-style text for a float array, built column-wise.
+    Rounding is done with np.rint on the scaled value, which can differ
+    from Python's exact decimal rounding in the last digit on rare ties.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale  = 10 ** decimals
+    q      = np.rint(np.abs(values) * scale).astype(np.int64)
+    ip, fp = np.divmod(q, scale)
+    width  = len(str(int(ip.max()))) if len(ip) else 1
+    frac   = np.empty((len(q), decimals), dtype=np.uint8)
+    for k in range(decimals - 1, -1, -1):
+        frac[:, k] = fp % 10 + 48
+        fp //= 10
+    dot = np.full((len(q), 1), ord('.'), dtype=np.uint8)
+    return [_sign(np.signbit(values)), _digits(ip, width), dot, frac]
+
+
+def format_csv_rows(points):
+    """
+    Formats all rows of a frame as CSV text (bytes) without a per-point
+    Python loop: every column is rendered into a fixed-width ASCII matrix,
+    the matrices are laid side by side and the padding bytes dropped.
+    Integers are written as-is, floats with six decimals; rows end in
+    CRLF like csv.writer.
+    """
+    n = len(points['x'])
+    if n == 0:
+        return b""
+    comma   = np.full((n, 1), ord(','), dtype=np.uint8)
+    newline = np.tile(np.frombuffer(b"\r\n", dtype=np.uint8), (n, 1))
+    pieces  = []
+    for i, k in enumerate(CSV_COLUMNS):
+        if i:
+            pieces.append(comma)
+        if k in CSV_FLOAT_COLUMNS:
+            pieces.extend(_fixed_chars(points[k]))
+        else:
+            pieces.extend(_int_chars(points[k]))
+    pieces.append(newline)
+    flat = np.concatenate(pieces, axis=1).ravel()
+    return flat[flat != _PAD].tobytes()
+
+
+class CsvFrameWriter:
+    """
+    Compatibility writer: same header and row layout as the original
+    csv.writer output, formatted with format_csv_rows().
+    """
+    extension = '.csv'
+
+    def write(self, points, path):
+        path += self.extension
+        with open(path, 'wb') as f:
+            f.write((",".join(CSV_HEADER) + "\r\n").encode())
+            f.write(format_csv_rows(points))
+        return path
+
+
+# -- NumPy --------------------------------------------------------------------
+
+class NpyFrameWriter:
+    """
+    One FRAME_DTYPE structured array per frame (np.save).
+    """
+    extension = '.npy'
+
+    def write(self, points, path):
+        path += self.extension
+        np.save(path, points_to_records(points))
+        return path
+
+
+class NpzFrameWriter:
+    """
+    One array per column (np.savez, optionally zlib-compressed).
+    """
+    extension = '.npz'
+
+    def __init__(self, compressed=True):
+        self.compressed = compressed
+
+    def write(self, points, path):
+        path += self.extension
+        rec  = points_to_records(points)
+        save = np.savez_compressed if self.compressed else np.savez
+        save(path, **{k: rec[k] for k in FRAME_COLUMNS})
+        return path
+
+
+# -- Parquet ------------------------------------------------------------------
+
+class ParquetFrameWriter:
+    """
+    Columnar Parquet file via pyarrow (optional dependency).
+    """
+    extension = '.parquet'
+
+    def __init__(self, compression='zstd'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        self._pa  = pyarrow
+        self._pq  = pyarrow.parquet
+        self.compression = compression
+
+    def write(self, points, path):
+        path += self.extension
+        rec   = points_to_records(points)
+        table = self._pa.table({k: rec[k] for k in FRAME_COLUMNS})
+        self._pq.write_table(table, path, compression=self.compression)
+        return path
+
+
+# -- PCD ----------------------------------------------------------------------
+
+# Field order, PCD type and size for the binary PCD writer
+PCD_FIELDS = [
+    ('x',              'F', '<f4'),
+    ('y',              'F', '<f4'),
+    ('z',              'F', '<f4'),
+    ('intensity',      'U', 'u1'),
+    ('laser_id',       'U', 'u1'),
+    ('azimuth',        'U', '<u2'),
+    ('distance_m',     'F', '<f4'),
+    ('adjustedtime',   'U', '<u4'),   # µs past the hour fits in 32 bits
+    ('timestamp',      'U', '<u4'),
+    ('vertical_angle', 'F', '<f4'),
+    ('return_type',    'U', 'u1'),
+]
+PCD_DTYPE = np.dtype([(name, dt) for name, _, dt in PCD_FIELDS])
+
+
+class PcdFrameWriter:
+    """
+    Binary PCD v0.7 (readable by Open3D, PCL and ParaView).
+    """
+    extension = '.pcd'
+
+    def write(self, points, path):
+        path += self.extension
+        n   = len(points['x'])
+        rec = np.empty(n, dtype=PCD_DTYPE)
+        for name, _, _ in PCD_FIELDS:
+            rec[name] = points[name]
+        header = "\n".join([
+            "# .PCD v0.7 - Point Cloud Data file format",
+            "VERSION 0.7",
+            "FIELDS " + " ".join(name for name, _, _ in PCD_FIELDS),
+            "SIZE "   + " ".join(str(np.dtype(dt).itemsize) for _, _, dt in PCD_FIELDS),
+            "TYPE "   + " ".join(t for _, t, _ in PCD_FIELDS),
+            "COUNT "  + " ".join("1" for _ in PCD_FIELDS),
+            f"WIDTH {n}",
+            "HEIGHT 1",
+            "VIEWPOINT 0 0 0 1 0 0 0",
+            f"POINTS {n}",
+            "DATA binary",
+        ]) + "\n"
+        with open(path, 'wb') as f:
+            f.write(header.encode('ascii'))
+            f.write(rec.tobytes())
+        return path
+
+
+WRITERS = {
+    'csv':     CsvFrameWriter,
+    'npy':     NpyFrameWriter,
+    'npz':     NpzFrameWriter,
+    'parquet': ParquetFrameWriter,
+    'pcd':     PcdFrameWriter,
+}
+
+
+def make_frame_writer(fmt):
+    """
+    Returns a writer for one of FRAME_FORMATS. Every writer has
+    write(points, path_without_extension) -> written path.
+    """
+    try:
+        return WRITERS[fmt]()
+    except KeyError:
+        raise ValueError(f"Unknown frame format {fmt!r}; expected one of {FRAME_FORMATS}")
@@ -2,34 +2,174 @@
 
 import struct
 
+import numpy as np
+
+PACKET_SIZE        = 1206
+BLOCKS_PER_PACKET  = 12
+CHANNELS_PER_BLOCK = 32
+BLOCK_FLAG         = 0xEEFF
+
+# Byte layout of one 1206-byte VLP-32C data packet:
+#   12 x (flag u16, azimuth u16, 32 x (distance u16, intensity u8)), timestamp u32, factory u8 x 2
+CHANNEL_DTYPE = np.dtype([('distance', '<u2'), ('intensity', 'u1')])
+BLOCK_DTYPE   = np.dtype([
+    ('flag',     '<u2'),
+    ('azimuth',  '<u2'),
+    ('channels', CHANNEL_DTYPE, (CHANNELS_PER_BLOCK,)),
+])
+PACKET_DTYPE  = np.dtype([
+    ('blocks',    BLOCK_DTYPE, (BLOCKS_PER_PACKET,)),
+    ('timestamp', '<u4'),
+    ('factory',   'u1', (2,)),
+])
+assert PACKET_DTYPE.itemsize == PACKET_SIZE
+
+# Return mode in the first factory byte (offset 1204)
+RETURN_MODES = {'strongest': 0x37, 'last': 0x38, 'dual': 0x39}
+
+# Per-point return_type flag
+RETURN_SINGLE    = 0   # the only return of its firing (single-return mode, or both dual returns equal)
+RETURN_DISTINCT  = 1   # one of two dual returns with different ranges
+RETURN_DUPLICATE = 2   # dual second return equal to the first; dropped by compute_points()
+
+
+def as_packet_array(payloads):
+    """
+    View a batch of raw payloads as a structured array of PACKET_DTYPE.
+    Accepts:
+      - a contiguous bytes-like buffer (length multiple of 1206)
+      - a uint8 numpy array of shape (N, 1206)
+      - a list of 1206-byte payloads (joined into one buffer)
+    Contiguous inputs are viewed without copying.
+    """
+    if isinstance(payloads, np.ndarray):
+        if payloads.dtype == PACKET_DTYPE:
+            return payloads
+        arr = np.ascontiguousarray(payloads, dtype=np.uint8).reshape(-1)
+        return arr.view(PACKET_DTYPE)
+    if isinstance(payloads, (list, tuple)):
+        payloads = b"".join(payloads)
+    return np.frombuffer(payloads, dtype=PACKET_DTYPE)
+
+
+def dual_return_packets(pkts):
+    """
+    (N,) bool: packets in dual-return mode, from the factory byte. Packets
+    with an unknown mode byte are treated as dual (block pairs), which was
+    the decoder's assumption before the mode was read.
+    """
+    mode = pkts['factory'][:, 0]
+    return (mode != RETURN_MODES['strongest']) & (mode != RETURN_MODES['last'])
+
+
+def return_types(pkts, valid, dual):
+    """
+    (N, 12, 32) return_type of every channel. In dual-return packets block
+    2k holds one return and block 2k+1 the other return of the same
+    firing; when both ranges are equal there was only one echo, so the
+    odd block's copy is flagged RETURN_DUPLICATE.
+    """
+    # (N, 6, 64): each row is one block pair, even block first
+    n     = len(pkts)
+    dist  = pkts['blocks']['channels']['distance'].reshape(n, BLOCKS_PER_PACKET // 2,
+                                                           2 * CHANNELS_PER_BLOCK)
+    d0    = dist[..., :CHANNELS_PER_BLOCK]
+    d1    = dist[..., CHANNELS_PER_BLOCK:]
+    pair  = (dual[:, None] & valid[:, 0::2] & valid[:, 1::2])[..., None]   # (N, 6, 1)
+    same  = (d0 == d1) & pair
+    both  = (d0 != d1) & (d0 != 0) & (d1 != 0) & pair
+
+    # RETURN_SINGLE = 0, RETURN_DISTINCT = 1, RETURN_DUPLICATE = 2
+    types = np.empty(dist.shape, dtype=np.uint8)
+    types[..., :CHANNELS_PER_BLOCK] = both
+    np.add(both, same.view(np.uint8) * np.uint8(RETURN_DUPLICATE),
+           out=types[..., CHANNELS_PER_BLOCK:], casting='unsafe')
+    return types.reshape(n, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK)
+
+
+def parse_packets(payloads):
+    """
+    Decode a batch of Velodyne packets in one pass.
+    Returns a dict of flat per-point arrays (one entry per channel of every
+    valid block, in packet -> block -> channel order):
+      - azimuth:     raw block azimuth (hundredths of a degree)
+      - distance:    raw distance (DISTANCE_RESOLUTION units)
+      - intensity:   raw intensity
+      - block:       block index within its packet (0-11)
+      - channel:     channel index within its block (0-31)
+      - return_id:   dual return: block index parity (even = 0, odd = 1);
+                     single return (strongest / last): 0
+      - firing:      firing of the block within the packet: the block index,
+                     or block // 2 in dual return (block pairs fire together)
+      - return_type: RETURN_SINGLE / RETURN_DISTINCT / RETURN_DUPLICATE
+      - timestamp:   raw packet timestamp (µs past the hour)
+      - packet:      packet index within the batch
+    Blocks whose flag is not 0xEEFF are masked out. The return mode is read
+    per packet from the factory byte, so mixed batches decode correctly.
+    Duplicates are only flagged here, so every valid block keeps its 32
+    points; compute_points() drops them together with the empty returns.
+    """
+    pkts   = as_packet_array(payloads)
+    blocks = pkts['blocks']                          # (N, 12)
+    valid  = blocks['flag'] == BLOCK_FLAG            # (N, 12)
+    dual   = dual_return_packets(pkts)               # (N,)
+
+    pkt_idx, blk_idx = np.nonzero(valid)
+    chans = blocks['channels'][pkt_idx, blk_idx]     # (V, 32)
+    n_ch  = CHANNELS_PER_BLOCK
+    blk   = blk_idx.astype(np.uint8)
+    pair  = dual[pkt_idx]
+    types = return_types(pkts, valid, dual)         # (N, 12, 32)
+    all_valid = len(blk_idx) == valid.size
+
+    return {
+        'azimuth':     np.repeat(blocks['azimuth'][pkt_idx, blk_idx], n_ch),
+        'distance':    chans['distance'].reshape(-1),
+        'intensity':   chans['intensity'].reshape(-1),
+        'block':       np.repeat(blk, n_ch),
+        'channel':     np.tile(np.arange(n_ch, dtype=np.uint8), len(blk_idx)),
+        'return_id':   np.repeat(np.where(pair, blk % 2, 0).astype(np.uint8), n_ch),
+        'firing':      np.repeat(np.where(pair, blk // 2, blk).astype(np.uint8), n_ch),
+        'return_type': types.reshape(-1) if all_valid else types[pkt_idx, blk_idx].reshape(-1),
+        'timestamp':   np.repeat(pkts['timestamp'][pkt_idx], n_ch),
+        'packet':      np.repeat(pkt_idx, n_ch),
+    }
+
+
+def return_mode(payloads):
+    """
+    Name of the return mode of a batch ('strongest', 'last', 'dual', or
+    'mixed' / 'unknown'), from the factory bytes.
+    """
+    modes = np.unique(as_packet_array(payloads)['factory'][:, 0])
+    names = {v: k for k, v in RETURN_MODES.items()}
+    if len(modes) != 1:
+        return 'mixed' if len(modes) else 'unknown'
+    return names.get(int(modes[0]), 'unknown')
+
+
 def parse_packet_dual(packet):
     """
     Parse all 12 data blocks in a Velodyne packet.
-    Alternates returns by block index (even/odd).
+    return_id follows the packet's return mode (block parity in dual
+    return, 0 in single return).
     Returns:
       - blocks: List of tuples (azimuth, channels, block_idx)
         where channels is a list of (distance, intensity, return_id)
       - timestamp: Raw timestamp from the packet footer.
+    Thin wrapper over parse_packets() kept for per-packet callers.
     """
+    batch = parse_packets(packet[:PACKET_SIZE])
+    n_ch  = CHANNELS_PER_BLOCK
+
     blocks = []
-    for block_idx in range(12):
-        offset = block_idx * 100
-        block = packet[offset:offset+100]
-
-        flag = struct.unpack("<H", block[0:2])[0]
-        if flag != 0xEEFF:
-            continue
-
-        azimuth = struct.unpack("<H", block[2:4])[0]
-        channels = []
-        # 32 channels per block, each 3 bytes: 2 for distance, 1 for intensity
-        for ch in range(32):
-            i = 4 + ch * 3
-            distance = struct.unpack("<H", block[i:i+2])[0]
-            intensity = block[i+2]
-            channels.append((distance, intensity, block_idx % 2))
-
-        blocks.append((azimuth, channels, block_idx))
+    for start in range(0, len(batch['distance']), n_ch):
+        end       = start + n_ch
+        block_idx = int(batch['block'][start])
+        channels  = list(zip(batch['distance'][start:end].tolist(),
+                             batch['intensity'][start:end].tolist(),
+                             batch['return_id'][start:end].tolist()))
+        blocks.append((int(batch['azimuth'][start]), channels, block_idx))
 
     # Timestamp in microseconds is stored in the last 4 bytes of the packet
     timestamp = struct.unpack("<I", packet[1200:1204])[0]
@@ -0,0 +1,155 @@
+# decoder/parallel_convert.py
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from decoder.pcap_reader          import PcapReader
+from decoder.packet_parser        import parse_packets, BLOCKS_PER_PACKET
+from decoder.frame_assembler      import find_frame_starts
+from decoder.coordinate_transform import compute_points
+from decoder.frame_writers        import make_frame_writer
+from decoder.filters              import format_removed
+from decoder.range_image          import cluster_boxes, save_boxes, BOXES_SUFFIX
+
+FRAMES_PER_TASK = 8   # revolutions decoded per worker task
+
+# Per-process state set up by _init_worker()
+_worker = {}
+
+
+def _init_worker(pcap_path, calib, fmt, output_dir, frame_filter=None, background=None,
+                 clusters=False):
+    _worker['reader']     = PcapReader(pcap_path)
+    _worker['calib']      = calib
+    _worker['writer']     = make_frame_writer(fmt)
+    _worker['output_dir'] = output_dir
+    _worker['filter']     = frame_filter
+    _worker['background'] = background
+    _worker['clusters']   = clusters
+
+
+def _convert_frames(first_frame, frame_keys, pkt_start, offsets, is_last):
+    """
+    Worker task: decodes packets [pkt_start, pkt_start + len(offsets)) and
+    writes frames first_frame .. first_frame + len(frame_keys) - 2.
+    frame_keys holds the global start keys of those frames plus the start
+    of the following one (or a sentinel past the end).
+    Returns [(frame_id, n_points, removed)] in frame order; removed holds
+    the points dropped by background subtraction and by each filter step
+    (None when neither is configured).
+    """
+    reader, calib, writer = _worker['reader'], _worker['calib'], _worker['writer']
+    frame_filter, background = _worker['filter'], _worker['background']
+
+    batch = parse_packets(reader.payload_array(offsets))
+    key   = (batch['packet'] + pkt_start) * BLOCKS_PER_PACKET + batch['block']
+    slot  = np.searchsorted(frame_keys, key, side='right') - 1
+    bounds = np.searchsorted(slot, np.arange(len(frame_keys)))
+
+    done = []
+    n_frames = len(frame_keys) - 1
+    for i in range(n_frames):
+        part   = {k: v[bounds[i]:bounds[i + 1]] for k, v in batch.items()}
+        points = compute_points(part, calib)
+        # Like the serial path, a trailing frame without points is not written
+        if is_last and i == n_frames - 1 and len(points['x']) == 0:
+            continue
+        removed = None
+        if background is not None:
+            points, n_bg = background.subtract(points)
+            removed = {'background': n_bg}
+        if frame_filter:
+            points, steps = frame_filter.apply(points)
+            removed = {**(removed or {}), **steps}
+        frame_id = first_frame + i
+        path     = os.path.join(_worker['output_dir'], f"frame_{frame_id}")
+        writer.write(points, path)
+        if _worker['clusters']:
+            save_boxes(cluster_boxes(points, calib), path + BOXES_SUFFIX)
+        done.append((frame_id, len(points['x']), removed))
+    return done
+
+
+def convert_parallel(pcap_path, calib, output_dir, fmt="csv", workers=None,
+                     max_in_flight=None, frames_per_task=FRAMES_PER_TASK, frame_filter=None,
+                     background=None, clusters=False, on_frame=None):
+    """
+    Multi-core offline conversion of one PCAP.
+    1. One cheap pass over the block headers finds every revolution start.
+    2. Runs of `frames_per_task` revolutions are decoded, transformed and
+       written by a ProcessPoolExecutor; frame ids are global, so files are
+       numbered exactly as in the serial conversion.
+    3. At most `max_in_flight` tasks are outstanding (default 2 per worker)
+       so memory stays flat on long files; results are logged in order.
+    With a ready BackgroundModel (used read-only) and/or a FrameFilter,
+    workers subtract and filter every frame; the removed counts are added
+    to background.removed / frame_filter.totals here. With clusters, a
+    frame_<id>_boxes.csv of cluster bounding boxes is written per frame.
+    on_frame(frame_id) is called as each frame is logged.
+    Returns the number of frames written.
+    """
+    log     = logging.getLogger(__name__)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+
+    reader     = PcapReader(pcap_path)
+    offsets, _ = reader.payload_offsets()
+    n_packets  = len(offsets)
+    starts     = find_frame_starts(lambda a, b: reader.payload_array(offsets[a:b]), n_packets)
+    reader.close()
+    n_frames = len(starts) if n_packets else 0
+    log.info(f"Indexed {n_packets} packets into {n_frames} frames; "
+             f"converting with {workers} workers")
+
+    # Sentinel start key past the last block of the file
+    keys = np.append(starts, n_packets * BLOCKS_PER_PACKET)
+
+    def task_args(first):
+        last      = min(first + frames_per_task, n_frames)
+        pkt_start = int(keys[first]) // BLOCKS_PER_PACKET
+        pkt_stop  = (int(keys[last]) - 1) // BLOCKS_PER_PACKET + 1
+        return (first, keys[first:last + 1], pkt_start,
+                offsets[pkt_start:pkt_stop], last == n_frames)
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(pcap_path, calib, fmt, output_dir,
+                                       frame_filter, background, clusters)) as pool:
+        pending  = {}   # task index -> future
+        finished = {}   # task index -> result, waiting for in-order logging
+        next_task, next_log = 0, 0
+        task_starts = range(0, n_frames, frames_per_task)
+
+        while next_log < len(task_starts):
+            while next_task < len(task_starts) and len(pending) + len(finished) < max_in_flight:
+                pending[next_task] = pool.submit(_convert_frames, *task_args(task_starts[next_task]))
+                next_task += 1
+
+            done, _ = wait(pending.values(), return_when=FIRST_COMPLETED)
+            for idx in [i for i, f in pending.items() if f in done]:
+                finished[idx] = pending.pop(idx).result()
+
+            while next_log in finished:
+                for frame_id, n_pts, removed in finished.pop(next_log):
+                    if removed is None:
+                        log.info(f"Frame {frame_id} saved ({n_pts} pts)")
+                    else:
+                        _add_removed_totals(frame_filter, background, n_pts, removed)
+                        log.info(f"Frame {frame_id} saved ({n_pts} pts; {format_removed(removed)})")
+                    written += 1
+                    if on_frame is not None:
+                        on_frame(frame_id)
+                next_log += 1
+    return written
+
+
+def _add_removed_totals(frame_filter, background, n_out, removed):
+    if background is not None:
+        background.removed += removed['background']
+        background.kept    += n_out + sum(v for k, v in removed.items() if k != 'background')
+    if frame_filter:
+        steps = {k: v for k, v in removed.items() if k != 'background'}
+        frame_filter.add_totals(n_out + sum(steps.values()), n_out, steps)
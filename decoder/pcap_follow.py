@@ -0,0 +1,157 @@
+# decoder/pcap_follow.py
+
+import os
+import json
+
+from decoder.pcap_reader     import PcapReader, VELODYNE_PORT
+from decoder.packet_parser   import parse_packets
+from decoder.frame_assembler import FrameAssembler
+
+CHECKPOINT_VERSION = 1
+CHUNK_PACKETS      = 1800    # packets decoded per batch (~1 s of data)
+POLL_INTERVAL_S    = 0.2
+
+
+class PcapFollower:
+    """
+    Incremental reader of a capture file that is still being written
+    (e.g. tcpdump -w). Each poll() remaps the file and decodes only the
+    complete records appended since the previous poll; a record that is
+    still being written is left for the next one.
+    The follower tracks where the open (not yet complete) revolution
+    starts: the record offset of its first packet and the first block of
+    that packet that belongs to it. save_checkpoint() stores that resume
+    point with the frame id, so a restart re-reads only the open
+    revolution and continues the frame numbering. Frames are written
+    before the checkpoint moves past them, so a crash can repeat a frame
+    but never skip one. `packets` counts the packets followed across
+    restarts (the checkpoint stores the count at the resume point, so the
+    re-read revolution is not counted twice); `extra` is caller state
+    (e.g. continuity totals) saved with the checkpoint.
+    """
+
+    def __init__(self, path, port=VELODYNE_PORT, checkpoint=None, chunk=CHUNK_PACKETS):
+        self.path       = path
+        self.port       = port
+        self.checkpoint = checkpoint
+        self.chunk      = chunk
+        self.assembler  = FrameAssembler()
+
+        self.inode   = None
+        self.offset  = None       # next unread record boundary (None = first record)
+        self.resume  = None       # (record offset, block) where the open revolution starts
+        self.packets = 0
+        self.resumed = False
+        self.extra   = {}
+        self._skip   = 0          # leading blocks of the first packet to drop on resume
+        self._resume_packets = 0  # packets before the resume point
+        if checkpoint and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"{self.checkpoint}: unsupported checkpoint version")
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if state['inode'] != st.st_ino or st.st_size < state['offset']:
+            return   # different or truncated file: start over
+        self.inode   = state['inode']
+        self.offset  = state['resume_offset']
+        self.resume  = (state['resume_offset'], state['resume_block'])
+        self._skip   = state['resume_block']
+        self.packets = self._resume_packets = state.get('resume_packets', state['packets'])
+        self.extra   = state.get('extra', {})
+        self.assembler.frame_id = state['frame_id']
+        self.resumed = True
+
+    def poll(self):
+        """
+        Generator over the newly appended complete records, in chunks of
+        up to `chunk` packets. Yields (payloads, frames): the chunk's
+        (n, 1206) payload view (valid until the next iteration) and the
+        AssembledFrames it completed.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self.inode is not None and (st.st_ino != self.inode or
+                                       self.offset is not None and st.st_size < self.offset):
+            # Replaced or truncated: follow the new file from its start
+            self.offset, self.resume, self._skip = None, None, 0
+            self.assembler.last_block_az = None
+        if self.offset is not None and st.st_size <= self.offset:
+            return
+        try:
+            reader = PcapReader(self.path, port=self.port)
+        except ValueError:
+            return   # global header not written yet
+        self.inode = st.st_ino
+
+        with reader:
+            records, offsets, _ = reader.scan_offsets(self.offset)
+            end = reader.scan_end
+            for i in range(0, len(offsets), self.chunk):
+                j        = min(i + self.chunk, len(offsets))
+                payloads = reader.payload_array(offsets[i:j])
+                batch    = parse_packets(payloads)
+                if self._skip:
+                    keep  = (batch['packet'] != 0) | (batch['block'] >= self._skip)
+                    batch = {k: v[keep] for k, v in batch.items()}
+                    self._skip = 0
+                frames = self.assembler.push(batch)
+
+                next_off = int(records[j]) if j < len(records) else end
+                n, pend  = len(batch['azimuth']), self.assembler.pending_points
+                if pend == 0:
+                    self.resume = (next_off, 0)
+                    self._resume_packets = self.packets + j - i
+                elif pend <= n:
+                    first = n - pend
+                    self.resume = (int(records[i + batch['packet'][first]]),
+                                   int(batch['block'][first]))
+                    self._resume_packets = self.packets + int(batch['packet'][first])
+                self.offset   = next_off
+                self.packets += j - i
+                yield payloads, frames
+            if len(offsets) == 0:
+                self.offset = end
+                if self.assembler.pending_points == 0:
+                    self.resume = (end, 0)
+                    self._resume_packets = self.packets
+
+    def flush(self):
+        """
+        Emits the open revolution (end of the recording). The resume point
+        is kept, so a restart on a file that grew after all re-emits it
+        complete under the same frame id.
+        """
+        return self.assembler.flush()
+
+    def state(self):
+        resume_offset, resume_block = self.resume if self.resume else (self.offset, 0)
+        resume_packets = self._resume_packets if self.resume else self.packets
+        return {
+            'version':       CHECKPOINT_VERSION,
+            'path':          os.path.abspath(self.path),
+            'inode':         self.inode,
+            'offset':        self.offset,
+            'resume_offset': resume_offset,
+            'resume_block':  resume_block,
+            'frame_id':      self.assembler.frame_id,
+            'packets':       self.packets,
+            'resume_packets': resume_packets,
+            'extra':         self.extra,
+        }
+
+    def save_checkpoint(self):
+        if not self.checkpoint or self.offset is None:
+            return
+        tmp = self.checkpoint + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state(), f, indent=2)
+        os.replace(tmp, self.checkpoint)
@@ -1,15 +1,352 @@
 # decoder/pcap_reader.py
 
-from scapy.all import rdpcap, UDP
+import array
+import mmap
+import struct
+from collections import namedtuple
 
-def read_pcap(file_path):
+import numpy as np
+
+VELODYNE_PORT = 2368
+PAYLOAD_SIZE  = 1206
+GATHER_CHUNK  = 1024     # records per fancy-index copy in payload_array() (~10 MB of index)
+
+# File magics
+PCAP_MAGIC_US  = 0xA1B2C3D4
+PCAP_MAGIC_NS  = 0xA1B23C4D
+PCAPNG_SHB     = 0x0A0D0D0A
+PCAPNG_BOM     = 0x1A2B3C4D
+
+# pcapng block types
+BLOCK_IDB = 0x00000001
+BLOCK_PB  = 0x00000002   # obsolete Packet Block
+BLOCK_SPB = 0x00000003
+BLOCK_EPB = 0x00000006
+
+# Link types
+LINKTYPE_NULL      = 0
+LINKTYPE_ETHERNET  = 1
+LINKTYPE_RAW       = 101
+LINKTYPE_LOOP      = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4      = 228
+
+ETHERTYPE_IPV4  = 0x0800
+ETHERTYPE_VLANS = (0x8100, 0x88A8)
+IPPROTO_UDP     = 17
+
+PcapRecord = namedtuple('PcapRecord', ['offset', 'timestamp', 'frame', 'payload'])
+PcapRecord.__doc__ = """
+One matching packet record:
+  - offset:    byte offset of the record (header included) in the file
+  - timestamp: capture time in seconds (float)
+  - frame:     memoryview of the captured link-layer frame
+  - payload:   memoryview of the UDP payload
+"""
+
+
+class PcapReader:
+    """
+    Zero-copy reader for libpcap and pcapng captures.
+    The file is memory-mapped and record, Ethernet/IPv4/UDP headers are
+    parsed in place; payloads are returned as memoryview slices of the map.
+    Only UDP datagrams to/from `port` with a `payload_size`-byte payload
+    are returned (pass None to disable either filter).
+    """
+
+    def __init__(self, file_path, port=VELODYNE_PORT, payload_size=PAYLOAD_SIZE):
+        self.path         = file_path
+        self.port         = port
+        self.payload_size = payload_size
+
+        with open(file_path, 'rb') as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty file cannot be mapped
+                self._mm = b""
+        self._view = memoryview(self._mm)
+        self.size  = len(self._mm)
+        self.scan_end = None   # offset where the last full scan stopped
+
+        if self.size < 4:
+            raise ValueError(f"{file_path}: not a pcap/pcapng file (too short)")
+        magic_le = struct.unpack_from('<I', self._mm, 0)[0]
+        if magic_le == PCAPNG_SHB:
+            self.format = 'pcapng'
+            self._interfaces = []
+            self.data_start  = self._scan_pcapng_preamble()
+            self.linktype    = self._interfaces[0][0] if self._interfaces else LINKTYPE_ETHERNET
+        elif magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self.format = 'pcap'
+            self._init_pcap('<', magic_le)
+        elif struct.unpack_from('>I', self._mm, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self.format = 'pcap'
+            self._init_pcap('>', struct.unpack_from('>I', self._mm, 0)[0])
+        else:
+            raise ValueError(f"{file_path}: unknown capture magic 0x{magic_le:08x}")
+
+    # -- context management -------------------------------------------------
+
+    def close(self):
+        """
+        Releases the memory map. If payload views are still referenced the
+        map stays alive until they are garbage collected.
+        """
+        self._view.release()
+        if isinstance(self._mm, mmap.mmap):
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- public API -----------------------------------------------------------
+
+    def __iter__(self):
+        """
+        Streams matching UDP payloads as memoryview slices (no copy).
+        """
+        for rec in self.records():
+            yield rec.payload
+
+    def records(self, start=None):
+        """
+        Generator of PcapRecord for every matching packet, starting at byte
+        offset `start` (a record boundary; default: first record).
+        Stops quietly at a truncated trailing record.
+        """
+        view = self._view
+        for off, ts, f0, f1, p0, p1 in self._scan(start):
+            yield PcapRecord(off, ts, view[f0:f1], view[p0:p1])
+
+    def scan_offsets(self, start=None):
+        """
+        Scans the file once, from byte offset `start` (a record boundary;
+        default: first record), and returns:
+          - records:    int64 array of record byte offsets in the file
+          - offsets:    int64 array of payload byte offsets in the file
+          - timestamps: float64 array of capture times (s)
+        Afterwards `scan_end` is the offset of the first byte not consumed:
+        the end of the file or the start of a truncated trailing record.
+        """
+        # array.array keeps 8 bytes per packet instead of a list of Python objects
+        records, offsets, stamps = array.array('q'), array.array('q'), array.array('d')
+        for off, ts, _, _, p0, _ in self._scan(start):
+            records.append(off)
+            offsets.append(p0)
+            stamps.append(ts)
+        return (np.array(records, dtype=np.int64),
+                np.array(offsets, dtype=np.int64),
+                np.array(stamps, dtype=np.float64))
+
+    def payload_offsets(self):
+        """
+        Returns (payload byte offsets, capture timestamps) of every matching
+        packet; see scan_offsets().
+        """
+        _, offsets, stamps = self.scan_offsets()
+        return offsets, stamps
+
+    def payload_array(self, offsets=None):
+        """
+        Returns all matching payloads (or those at the given payload
+        `offsets`) as one (N, payload_size) uint8 array.
+        When records are evenly spaced (the usual case for a sensor
+        capture) this is a strided view onto the map with no copy;
+        otherwise payloads are copied into a new array, GATHER_CHUNK
+        records at a time so the index stays small.
+        """
+        if self.payload_size is None:
+            raise ValueError("payload_array() needs a fixed payload_size")
+        if offsets is None:
+            offsets, _ = self.payload_offsets()
+        size = self.payload_size
+        if len(offsets) == 0:
+            return np.empty((0, size), dtype=np.uint8)
+
+        flat   = np.frombuffer(self._mm, dtype=np.uint8)
+        stride = np.diff(offsets)
+        if len(offsets) == 1 or (stride == stride[0]).all() and stride[0] >= size:
+            step = int(stride[0]) if len(stride) else size
+            return np.lib.stride_tricks.as_strided(
+                flat[offsets[0]:], shape=(len(offsets), size),
+                strides=(step, 1), writeable=False)
+        out  = np.empty((len(offsets), size), dtype=np.uint8)
+        cols = np.arange(size)
+        for i in range(0, len(offsets), GATHER_CHUNK):
+            out[i:i + GATHER_CHUNK] = flat[offsets[i:i + GATHER_CHUNK, None] + cols]
+        return out
+
+    def _scan(self, start=None):
+        """
+        Yields (record_offset, timestamp, frame_start, frame_end,
+        payload_start, payload_end) for every matching packet.
+        """
+        off = self.data_start if start is None else start
+        if self.format == 'pcap':
+            return self._pcap_scan(off)
+        return self._pcapng_scan(off)
+
+    # -- classic libpcap ------------------------------------------------------
+
+    def _init_pcap(self, endian, magic):
+        self._endian   = endian
+        self._ts_scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        self._rec_hdr  = struct.Struct(endian + 'IIII')
+        self.linktype  = struct.unpack_from(endian + 'I', self._mm, 20)[0] & 0x0FFFFFFF
+        self.data_start = 24
+
+    def _pcap_scan(self, off):
+        mm, size = self._mm, self.size
+        hdr, scale, linktype = self._rec_hdr, self._ts_scale, self.linktype
+        match = self._match
+        while off + 16 <= size:
+            ts_sec, ts_frac, incl_len, _ = hdr.unpack_from(mm, off)
+            start = off + 16
+            end   = start + incl_len
+            if end > size:
+                break
+            hit = match(mm, start, incl_len, linktype)
+            if hit is not None:
+                yield off, ts_sec + ts_frac * scale, start, end, hit[0], hit[1]
+            off = end
+        self.scan_end = off
+
+    # -- pcapng ---------------------------------------------------------------
+
+    def _scan_pcapng_preamble(self):
+        """
+        Reads the section header and interface blocks that precede the
+        first packet so records() can start at any later block offset.
+        """
+        off = 0
+        while off + 12 <= self.size:
+            btype, blen = self._pcapng_block_header(off)
+            if btype in (BLOCK_EPB, BLOCK_SPB, BLOCK_PB) or blen < 12 or off + blen > self.size:
+                break
+            self._pcapng_meta_block(off, btype, blen)
+            off += blen
+        return off
+
+    def _pcapng_block_header(self, off):
+        # The SHB type reads the same in both byte orders; its byte-order
+        # magic sets the order of every block up to the next SHB
+        if struct.unpack_from('<I', self._mm, off)[0] == PCAPNG_SHB:
+            bom = struct.unpack_from('<I', self._mm, off + 8)[0]
+            self._endian = '<' if bom == PCAPNG_BOM else '>'
+        return struct.unpack_from(self._endian + 'II', self._mm, off)
+
+    def _pcapng_meta_block(self, off, btype, blen):
+        if btype == PCAPNG_SHB:
+            self._interfaces = []
+        elif btype == BLOCK_IDB:
+            e = self._endian
+            linktype = struct.unpack_from(e + 'H', self._mm, off + 8)[0]
+            scale    = 1e-6
+            # Options follow the 8-byte IDB body; look for if_tsresol (code 9)
+            opt, end = off + 16, off + blen - 4
+            while opt + 4 <= end:
+                code, olen = struct.unpack_from(e + 'HH', self._mm, opt)
+                if code == 0:
+                    break
+                if code == 9 and olen >= 1:
+                    res   = self._mm[opt + 4]
+                    scale = 2.0 ** -(res & 0x7F) if res & 0x80 else 10.0 ** -res
+                opt += 4 + ((olen + 3) & ~3)
+            self._interfaces.append((linktype, scale))
+
+    def _pcapng_scan(self, off):
+        mm, size = self._mm, self.size
+        match = self._match
+        while off + 12 <= size:
+            btype, blen = self._pcapng_block_header(off)
+            if blen < 12 or off + blen > size:
+                break
+            e = self._endian
+            if btype == BLOCK_EPB or btype == BLOCK_PB:
+                if btype == BLOCK_EPB:
+                    iface, ts_hi, ts_lo, cap_len, _ = struct.unpack_from(e + 'IIIII', mm, off + 8)
+                else:
+                    iface, _, ts_hi, ts_lo, cap_len, _ = struct.unpack_from(e + 'HHIIII', mm, off + 8)
+                linktype, scale = self._interfaces[iface]
+                start = off + 28
+                hit = match(mm, start, cap_len, linktype)
+                if hit is not None:
+                    yield (off, ((ts_hi << 32) | ts_lo) * scale,
+                           start, start + cap_len, hit[0], hit[1])
+            elif btype == BLOCK_SPB:
+                orig_len = struct.unpack_from(e + 'I', mm, off + 8)[0]
+                cap_len  = min(orig_len, blen - 16)
+                linktype, _ = self._interfaces[0]
+                start = off + 12
+                hit = match(mm, start, cap_len, linktype)
+                if hit is not None:
+                    yield off, 0.0, start, start + cap_len, hit[0], hit[1]
+            else:
+                self._pcapng_meta_block(off, btype, blen)
+            off += blen
+        self.scan_end = off
+
+    # -- link / network / transport headers -----------------------------------
+
+    def _match(self, buf, start, caplen, linktype):
+        """
+        Returns (payload_start, payload_end) file offsets of the UDP payload
+        of the frame at `start`, or None if it does not pass the filters.
+        """
+        end = start + caplen
+        if linktype == LINKTYPE_ETHERNET:
+            l3 = start + 14
+            if l3 > end:
+                return None
+            ethertype = (buf[l3 - 2] << 8) | buf[l3 - 1]
+            while ethertype in ETHERTYPE_VLANS and l3 + 4 <= end:
+                ethertype = (buf[l3 + 2] << 8) | buf[l3 + 3]
+                l3 += 4
+            if ethertype != ETHERTYPE_IPV4:
+                return None
+        elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+            l3 = start + 4
+            if l3 > end or 2 not in struct.unpack_from('<I', buf, start) + struct.unpack_from('>I', buf, start):
+                return None
+        elif linktype == LINKTYPE_LINUX_SLL:
+            l3 = start + 16
+            if l3 > end or ((buf[start + 14] << 8) | buf[start + 15]) != ETHERTYPE_IPV4:
+                return None
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+            l3 = start
+        else:
+            return None
+
+        # IPv4
+        if l3 + 20 > end or buf[l3] >> 4 != 4 or buf[l3 + 9] != IPPROTO_UDP:
+            return None
+        if ((buf[l3 + 6] << 8) | buf[l3 + 7]) & 0x3FFF:
+            return None   # fragment
+        udp = l3 + (buf[l3] & 0x0F) * 4
+
+        # UDP
+        if udp + 8 > end:
+            return None
+        sport, dport, ulen = struct.unpack_from('>HHH', buf, udp)
+        if self.port is not None and sport != self.port and dport != self.port:
+            return None
+        p0, p1 = udp + 8, min(udp + ulen, end)
+        if self.payload_size is not None and p1 - p0 != self.payload_size:
+            return None
+        return p0, p1
+
+
+def read_pcap(file_path, port=VELODYNE_PORT):
     """
-    Loads a pcap file and returns a list of raw UDP payloads (bytes)
-    matching Velodyne packet size (1206 bytes).
+    Memory-maps a pcap/pcapng file and returns its Velodyne payloads
+    (1206 bytes, UDP port 2368) as an (N, 1206) uint8 array, usually a
+    zero-copy view onto the file.
     """
-    packets = rdpcap(file_path)
-    return [
-        bytes(p[UDP].payload)
-        for p in packets
-        if UDP in p and len(p[UDP].payload) == 1206
-    ]
+    return PcapReader(file_path, port=port).payload_array()
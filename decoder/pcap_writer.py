@@ -0,0 +1,74 @@
+# decoder/pcap_writer.py
+
+import struct
+import time
+
+from decoder.pcap_reader import PCAP_MAGIC_US, LINKTYPE_ETHERNET, VELODYNE_PORT
+
+# Default addressing for payloads written without their original headers
+SENSOR_MAC = b"\x60\x76\x88\x00\x00\x00"
+BCAST_MAC  = b"\xff\xff\xff\xff\xff\xff"
+SENSOR_IP  = bytes([192, 168, 1, 201])
+BCAST_IP   = bytes([255, 255, 255, 255])
+
+
+def udp_frame_header(payload_len, port=VELODYNE_PORT, src_ip=SENSOR_IP, dst_ip=BCAST_IP):
+    """
+    Builds the 42-byte Ethernet/IPv4/UDP header for a payload of
+    `payload_len` bytes (UDP checksum left at 0, which IPv4 allows).
+    """
+    ip_len = 20 + 8 + payload_len
+    ip = bytearray(struct.pack('>BBHHHBBH4s4s', 0x45, 0, ip_len, 0, 0x4000, 64, 17, 0,
+                               src_ip, dst_ip))
+    csum = sum(struct.unpack('>10H', ip))
+    csum = (csum & 0xFFFF) + (csum >> 16)
+    csum = (csum & 0xFFFF) + (csum >> 16)
+    struct.pack_into('>H', ip, 10, ~csum & 0xFFFF)
+    udp = struct.pack('>HHHH', port, port, 8 + payload_len, 0)
+    return BCAST_MAC + SENSOR_MAC + b"\x08\x00" + bytes(ip) + udp
+
+
+class PcapRecordWriter:
+    """
+    Minimal libpcap (microsecond) writer.
+      - write(frame, ts):          append a raw link-layer frame
+      - write_payload(payload, ts): append a UDP payload wrapped in
+                                    Ethernet/IPv4/UDP headers
+    """
+
+    def __init__(self, file_path, linktype=LINKTYPE_ETHERNET, snaplen=65535):
+        self.path  = file_path
+        self.count = 0
+        self._f    = open(file_path, 'wb')
+        self._f.write(struct.pack('<IHHiIII', PCAP_MAGIC_US, 2, 4, 0, 0, snaplen, linktype))
+        self._headers = {}
+
+    def write(self, frame, ts=None):
+        ts = time.time() if ts is None else ts
+        sec  = int(ts)
+        usec = int(round((ts - sec) * 1e6))
+        if usec >= 1_000_000:
+            sec, usec = sec + 1, usec - 1_000_000
+        n = len(frame)
+        self._f.write(struct.pack('<IIII', sec, usec, n, n))
+        self._f.write(frame)
+        self.count += 1
+
+    def write_payload(self, payload, ts=None, port=VELODYNE_PORT):
+        n   = len(payload)
+        hdr = self._headers.get((n, port))
+        if hdr is None:
+            hdr = self._headers[(n, port)] = udp_frame_header(n, port)
+        self.write(hdr + bytes(payload), ts)
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
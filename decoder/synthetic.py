@@ -0,0 +1,111 @@
+# decoder/synthetic.py
+
+import numpy as np
+
+from decoder.packet_parser import (
+    PACKET_DTYPE, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK, BLOCK_FLAG, RETURN_MODES,
+)
+from decoder.pcap_writer import PcapRecordWriter
+
+FIRING_CYCLE_US = 55.296          # one firing of all 32 lasers
+HOUR_US         = 3_600_000_000
+MAX_RANGE_UNITS = 50_000          # 200 m in 4 mm units
+
+# Factory byte 1205 (1204 is the return mode, see RETURN_MODES)
+PRODUCT_VLP32C = 0x28
+
+
+def packet_period_us(return_mode='dual'):
+    """
+    Time covered by one packet: 12 firings in single-return modes,
+    6 firings (block pairs) in dual-return mode.
+    """
+    firings = BLOCKS_PER_PACKET // 2 if return_mode == 'dual' else BLOCKS_PER_PACKET
+    return firings * FIRING_CYCLE_US
+
+
+def generate_packets(n_packets, rpm=600, return_mode='dual', zero_ratio=0.1,
+                     elevations=None, sensor_height=5.0, start_us=0,
+                     start_azimuth=0.0, seed=0):
+    """
+    Builds n_packets valid 1206-byte VLP-32C data packets, deterministic
+    for a given seed. Returns an (n_packets, 1206) uint8 array.
+      - azimuth advances with the firing time at `rpm`
+      - timestamps advance by packet_period_us() and wrap at the hour
+      - lasers pointing down see a ground plane `sensor_height` below the
+        sensor, the others see walls 10-80 m away; a share of returns hit
+        closer objects, and `zero_ratio` of all returns are empty
+      - in dual mode odd blocks repeat the even block's firing; most
+        second returns equal the first, some are farther
+    """
+    if return_mode not in RETURN_MODES:
+        raise ValueError(f"return_mode must be one of {list(RETURN_MODES)}")
+    rng = np.random.default_rng(seed)
+    if elevations is None:
+        from decoder.calibration import Calibration
+        elevations = Calibration.load().vertical_angle
+    elevations = np.asarray(elevations, dtype=np.float64)
+
+    dual    = return_mode == 'dual'
+    period  = packet_period_us(return_mode)
+    rate    = rpm * 360.0 / 60e6                      # degrees per µs
+    pkt_us  = start_us + np.arange(n_packets) * period
+
+    # Firing time of every block (block pairs share a firing in dual mode)
+    firing  = np.arange(BLOCKS_PER_PACKET) // 2 if dual else np.arange(BLOCKS_PER_PACKET)
+    blk_us  = pkt_us[:, None] + firing * FIRING_CYCLE_US
+    azimuth = np.rint((start_azimuth + blk_us * rate) * 100) % 36000
+
+    # Per-laser scene: ground for downward lasers, walls for the rest
+    shape   = (n_packets, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK)
+    down    = elevations < -0.5
+    ground  = sensor_height / np.sin(-np.radians(np.minimum(elevations, -0.5)))
+    wall_m  = 10.0 + 70.0 * rng.random(shape)
+    range_m = np.where(down, np.minimum(ground, 120.0), wall_m)
+    range_m = range_m * (1.0 + 0.01 * rng.standard_normal(shape))
+    objects = rng.random(shape) < 0.08
+    range_m = np.where(objects, np.minimum(range_m, 3.0 + rng.exponential(15.0, shape)), range_m)
+
+    distance  = np.clip(np.rint(range_m / 0.004), 1, MAX_RANGE_UNITS).astype(np.uint16)
+    intensity = np.clip(rng.gamma(2.0, 20.0, shape), 0, 255).astype(np.uint8)
+
+    if dual:
+        # Second return: same as first unless a farther surface is hit
+        first  = distance[:, 0::2]
+        far    = rng.random(first.shape) < 0.15
+        second = np.where(far, np.clip(first + rng.integers(100, 5000, first.shape),
+                                       0, MAX_RANGE_UNITS), first)
+        distance[:, 1::2]  = second
+        intensity[:, 1::2] = np.where(far, intensity[:, 1::2], intensity[:, 0::2])
+
+    distance[rng.random(shape) < zero_ratio] = 0
+
+    pkts = np.zeros(n_packets, dtype=PACKET_DTYPE)
+    pkts['blocks']['flag']                  = BLOCK_FLAG
+    pkts['blocks']['azimuth']               = azimuth
+    pkts['blocks']['channels']['distance']  = distance
+    pkts['blocks']['channels']['intensity'] = intensity
+    pkts['timestamp']     = (np.floor(pkt_us) % HOUR_US).astype(np.uint32)
+    pkts['factory'][:, 0] = RETURN_MODES[return_mode]
+    pkts['factory'][:, 1] = PRODUCT_VLP32C
+    return pkts.view(np.uint8).reshape(n_packets, -1)
+
+
+def write_synthetic_pcap(path, n_packets, start_time=1_700_000_000.0, chunk=10_000, **kwargs):
+    """
+    Writes a PCAP of generate_packets() output with capture times that
+    follow the packet timestamps. Generation is chunked so any length can
+    be written in bounded memory. Returns the number of packets written.
+    """
+    period   = packet_period_us(kwargs.get('return_mode', 'dual'))
+    seed     = kwargs.pop('seed', 0)
+    start_us = kwargs.pop('start_us', 0)
+    with PcapRecordWriter(path) as writer:
+        for first in range(0, n_packets, chunk):
+            n    = min(chunk, n_packets - first)
+            pkts = generate_packets(n, start_us=start_us + first * period,
+                                    seed=seed + first, **kwargs)
+            stamps = start_time + (first + np.arange(n)) * period * 1e-6
+            for payload, ts in zip(pkts, stamps.tolist()):
+                writer.write_payload(payload.tobytes(), ts)
+    return n_packets
@@ -1,28 +1,94 @@
+import time
+T_START = time.perf_counter()   # cold-start reference, taken before the heavy imports
+
 import os
 import argparse
 import logging
 import threading
-import time
-import csv
 import platform
 import subprocess
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+from config import OUTPUT_DIR
+from decoder.packet_parser     import parse_packets, PACKET_SIZE
+from decoder.frame_assembler   import FrameAssembler
+from decoder.pcap_reader       import PcapReader, VELODYNE_PORT
+from decoder.pcap_writer       import PcapRecordWriter
+from pipeline.udp_receiver     import UdpReceiver, PacketRing, DEFAULT_RCVBUF, DEFAULT_RING_SLOTS
+from pipeline.segment_pool     import (SegmentPool, OVERLOAD_POLICIES, DEFAULT_WORKERS,
+                                       DEFAULT_MAX_PENDING, DEFAULT_DRAIN_S)
+from decoder.calibration       import Calibration
+from decoder.coordinate_transform import compute_points
+from decoder.frame_writers     import make_frame_writer, FRAME_FORMATS
+from decoder.continuity        import ContinuityChecker, save_continuity, describe
+from decoder.filters           import FrameFilter, format_removed
+from decoder.background        import BackgroundModel, WARMUP_FRAMES
+from pipeline.metrics          import (Metrics, MetricsReporter, StatsServer,
+                                       EXPECTED_PKT_RATE, DEFAULT_INTERVAL)
+from pipeline.multi_sensor     import load_sensors, FrameMerger
+from pipeline.shm_ring         import (FrameRingWriter, DEFAULT_RING_NAME, DEFAULT_SLOTS,
+                                       DEFAULT_MAX_POINTS)
+T_IMPORTED = time.perf_counter()
 
-from scapy.all import sniff, PcapWriter, get_if_list, rdpcap, UDP
+FRAME_DURATION_SECONDS = 0.1   # LiDAR frame period
+READ_BATCH             = 512   # packets decoded per pipeline iteration
 
-from config import OUTPUT_DIR, DISTANCE_RESOLUTION
-from decoder.packet_parser     import parse_packet_dual as parse_packet
-from decoder.calibration       import (
-    load_data_order_and_angles,
-    load_firing_sequence,
-    load_timing_offsets
-)
-from decoder.coordinate_transform import compute_cartesian
-from decoder.timestamp_utils      import apply_timing_offset
+# Pipeline instrumentation; main() replaces it with the configured instance
+metrics = Metrics()
 
-# One revolution = 360° per 100 ms → degrees per microsecond
-ROTATION_RATE_DEG_PER_US = 360.0 / 100_000.0
-FRAME_DURATION_SECONDS   = 0.1  # LiDAR frame period
+# Optional stages applied after the Cartesian transform (set by main()):
+# background subtraction, then the point filter
+frame_filter    = None
+background      = None
+background_path = None
+background_lock = threading.Lock()   # segment conversions run on several threads
+
+# Shared-memory ring the stream pipeline publishes frames to (set by main())
+frame_ring = None
+
+first_frame_logged = False
+first_frame_lock   = threading.Lock()
+
+def log_first_frame():
+    """
+    Logs the time from start to the first frame written, once (segment
+    conversions call it from several threads).
+    """
+    global first_frame_logged
+    with first_frame_lock:
+        if first_frame_logged:
+            return
+        first_frame_logged = True
+        logging.info(f"[STARTUP] First frame written {time.perf_counter() - T_START:.3f}s after start")
+
+def apply_filter(points):
+    """
+    Runs background subtraction (learning it during warm-up) and the
+    FrameFilter, if configured, recording removed counts and time in the
+    metrics. Returns (points, log suffix).
+    """
+    if background is None and not frame_filter:
+        return points, ""
+    t0 = time.perf_counter()
+    removed = {}
+    if background is not None:
+        with background_lock:
+            was_ready = background.ready
+            points, removed['background'] = background.apply(points)
+            if background.ready and not was_ready:
+                background.save(background_path)
+                logging.info(f"[BACKGROUND] Learned from {background.frames} frames "
+                             f"({background.coverage():.1%} cells), saved to {background_path}")
+    if frame_filter:
+        points, steps = frame_filter.apply(points)
+        removed.update(steps)
+    metrics.observe('filter.frame_s', time.perf_counter() - t0)
+    for step, n in removed.items():
+        if n:
+            metrics.add(f'filter.{step}', n)
+    return points, f"; {format_removed(removed)}"
 
 def setup_main_logger(output_dir: str):
     os.makedirs(output_dir, exist_ok=True)
@@ -46,6 +112,7 @@ def auto_detect_interface(timeout: float = 2.0, filter_expr: str = "udp port 236
     macOS: uses `ifconfig` to find status: active interfaces.
     Skips virtual, loopback, and unsupported interfaces.
     """
+    from scapy.all import sniff, get_if_list
     skip_keywords = ['lo', 'loopback', 'gif', 'stf', 'anpi', 'utun', 'awdl',
                      'vmnet', 'p2p', 'tap', 'bridge', 'llw', 'ap', 'vm']
     system = platform.system().lower()
@@ -89,17 +156,22 @@ def auto_detect_interface(timeout: float = 2.0, filter_expr: str = "udp port 236
 
     raise RuntimeError("No usable interface found")
 
-def split_and_convert_segment(seg_path: str, label: str, output_dir: str, seg_len: float):
+def split_and_convert_segment(seg_path: str, label: str, output_dir: str, seg_len: float,
+                              port: int = VELODYNE_PORT):
+    t0 = time.perf_counter()
     try:
-        pkts = rdpcap(seg_path)
+        reader = PcapReader(seg_path, port=port)
+        pkts   = list(reader.records())
     except Exception as e:
         logging.error(f"[ERROR] Cannot read {seg_path}: {e}")
-        return
+        metrics.add('segments.failed')
+        return False
+    metrics.observe('segment.read_s', time.perf_counter() - t0)
 
     total_pkts = len(pkts)
     if total_pkts == 0:
         logging.info(f"[SPLIT] {label}: 0 pkts (skipped)")
-        return
+        return True
 
     num_slices = max(1, int(round(seg_len / FRAME_DURATION_SECONDS)))
     base, extra = divmod(total_pkts, num_slices)
@@ -114,68 +186,137 @@ def split_and_convert_segment(seg_path: str, label: str, output_dir: str, seg_le
         os.makedirs(slice_dir, exist_ok=True)
         slice_name = f"{label}_slice_{slice_idx}.pcap"
         slice_path = os.path.join(slice_dir, slice_name)
-        writer = PcapWriter(slice_path, append=False, sync=True, linktype=1)
-        for p in slice_pkts:
-            writer.write(p)
-        writer.close()
+        t0 = time.perf_counter()
+        with PcapRecordWriter(slice_path, linktype=reader.linktype) as writer:
+            for rec in slice_pkts:
+                writer.write(rec.frame, rec.timestamp)
+        t1 = time.perf_counter()
+        metrics.observe('slice.pcap_write_s', t1 - t0)
         logging.info(f"  [SPLIT]   {slice_name} -> {len(slice_pkts)} pkts")
 
-        points = []
-        for p in slice_pkts:
-            if UDP not in p:
-                continue
-            raw = bytes(p[UDP].payload)
-            blocks, base_ts = parse_packet(raw)
-            for blk_idx, (azi_raw, channels, _) in enumerate(blocks):
-                block_deg = azi_raw / 100.0
-                for ch_idx, (dist_raw, intensity, ret_id) in enumerate(channels):
-                    if dist_raw == 0:
-                        continue
-                    lid      = laser_map[ch_idx]
-                    vert_ang = vertical_angles[lid]
-                    az_off   = azimuth_offsets[lid]
-                    row_idx  = seq_primary[lid] if ret_id == 0 else seq_secondary[lid]
-                    ts_pt    = apply_timing_offset(base_ts, row_idx, blk_idx, timing_offsets)
-                    dt_us    = ts_pt - base_ts
-                    az_base  = (block_deg - az_off) % 360.0
-                    az_deg   = (az_base + dt_us * ROTATION_RATE_DEG_PER_US + az_off) % 360.0
-                    az_int   = int(round(az_deg * 100))
-                    dist_m   = dist_raw * DISTANCE_RESOLUTION
-                    x, y, z  = compute_cartesian(dist_m, az_deg, vert_ang)
-
-                    points.append([
-                        int(intensity), lid, az_int,
-                        f"{dist_m:.6f}", ts_pt, ts_pt,
-                        f"{vert_ang:.6f}", f"{x:.6f}", f"{y:.6f}", f"{z:.6f}"
-                    ])
-
         csv_dir = os.path.join(output_dir, "csv_frames")
         os.makedirs(csv_dir, exist_ok=True)
-        csv_name = f"{label}_frame_{slice_idx}.csv"
-        csv_path = os.path.join(csv_dir, csv_name)
-        if points:
-            with open(csv_path, 'w', newline='', encoding='utf-8') as cf:
-                w = csv.writer(cf)
-                w.writerow([
-                    'intensity','laser_id','azimuth','distance_m',
-                    'adjustedtime','timestamp','vertical_angle',
-                    'Points_m_XYZ:0','Points_m_XYZ:1','Points_m_XYZ:2'
-                ])
-                w.writerows(points)
-            logging.info(f"    [CSV]     {csv_name} created with {len(points)} pts")
+        csv_name = f"{label}_frame_{slice_idx}{frame_writer.extension}"
+        csv_path = os.path.join(csv_dir, f"{label}_frame_{slice_idx}")
+        if not slice_pkts:
+            # Fewer packets than slices: nothing to decode
+            logging.info(f"    [CSV]     {csv_name} skipped (0 pts)")
+            continue
+
+        payloads = [rec.payload for rec in slice_pkts]
+        batch    = parse_packets(payloads)
+        t2 = time.perf_counter()
+        points   = compute_points(batch, calib)
+        t3 = time.perf_counter()
+        n_raw    = len(points['x'])
+        metrics.observe('decode.batch_s', t2 - t1)
+        metrics.observe('transform.frame_s', t3 - t2)
+        points, filtered = apply_filter(points)
+        n_pts    = len(points['x'])
+        t4 = time.perf_counter()
+
+        if n_raw:
+            frame_writer.write(points, csv_path)
+            metrics.observe('write.frame_s', time.perf_counter() - t4)
+            metrics.add('frames.written')
+            metrics.add('frames.points', n_pts)
+            log_first_frame()
+            metrics.observe('frame.latency_s', time.time() - slice_pkts[0].timestamp)
+            logging.info(f"    [CSV]     {csv_name} created with {n_pts} pts{filtered}")
         else:
             logging.info(f"    [CSV]     {csv_name} skipped (0 pts)")
+    return True
+
+def start_scapy_capture(iface: str, port: int = VELODYNE_PORT,
+                        maxsize: int = DEFAULT_RING_SLOTS) -> Queue:
+    """
+    Starts a scapy sniff() thread on `iface` and returns the bounded Queue
+    that receives the captured packets. Packets arriving while the queue
+    is full are dropped and counted ('capture.queue_drops').
+    """
+    from scapy.all import sniff
+    pkt_q = Queue(maxsize=maxsize)
+
+    def enqueue(p):
+        try:
+            pkt_q.put_nowait(p)
+        except Full:
+            metrics.add('capture.queue_drops')
 
-def record_segments(iface: str, output_dir: str, segment_len: float, total_dur: float):
-    pkt_q = Queue()
     threading.Thread(
         target=lambda: sniff(iface=iface,
-                             filter="udp port 2368",
-                             prn=pkt_q.put,
+                             filter=f"udp port {port}",
+                             prn=enqueue,
                              store=False),
         daemon=True
     ).start()
     logging.info("Packet capture thread started.")
+    return pkt_q
+
+def start_socket_capture(port: int = VELODYNE_PORT, rcvbuf: int = DEFAULT_RCVBUF) -> UdpReceiver:
+    """
+    Binds a plain UDP socket on `port` and starts the ring-buffer receiver.
+    """
+    receiver = UdpReceiver(port=port, rcvbuf=rcvbuf).start()
+    logging.info(f"UDP socket receiver started on port {port} "
+                 f"(SO_RCVBUF={receiver.rcvbuf_actual} bytes)")
+    return receiver
+
+def _capture_scapy_segment(pkt_q: Queue, seg_path: str, deadline: float) -> int:
+    from scapy.all import PcapWriter
+    writer = PcapWriter(seg_path, append=False, sync=True, linktype=1)
+    pkt_count = 0
+    while time.time() < deadline:
+        try:
+            p = pkt_q.get(timeout=0.01)
+            writer.write(p)
+            pkt_count += 1
+            metrics.packets(1)
+        except Empty:
+            continue
+    writer.close()
+    return pkt_count
+
+def _capture_socket_segment(receiver: UdpReceiver, seg_path: str, deadline: float) -> int:
+    pkt_count = 0
+    with PcapRecordWriter(seg_path) as writer:
+        while time.time() < deadline:
+            payloads, stamps = receiver.ring.read(timeout=0.01)
+            if len(stamps):
+                metrics.packets(len(stamps))
+                metrics.observe('queue.wait_s', time.time() - stamps[0])
+            for payload, ts in zip(payloads, stamps.tolist()):
+                writer.write_payload(payload, ts, port=receiver.port)
+            pkt_count += len(stamps)
+    return pkt_count
+
+def record_segments(iface: str, output_dir: str, segment_len: float, total_dur: float,
+                    backend: str = "scapy", port: int = VELODYNE_PORT,
+                    rcvbuf: int = DEFAULT_RCVBUF, workers: int = DEFAULT_WORKERS,
+                    max_pending: int = DEFAULT_MAX_PENDING, policy: str = "skip-decode",
+                    drain_timeout: float = DEFAULT_DRAIN_S):
+    """
+    Captures `segment_len` PCAP segments for `total_dur` seconds and hands
+    each one to a fixed pool of `workers` conversion threads. At most
+    `max_pending` segments wait for a worker; beyond that `policy`
+    (block / drop-oldest / skip-decode) sheds load. After capture, pending
+    conversions get at most `drain_timeout` seconds to finish.
+    """
+    pool = SegmentPool(split_and_convert_segment, workers=workers,
+                       max_pending=max_pending, policy=policy)
+    metrics.gauge('segments.pending',    pool.pending)
+    metrics.gauge('segments.converting', lambda: pool.busy)
+    metrics.gauge('segments.converted',  lambda: pool.converted)
+    metrics.gauge('segments.shed',       lambda: dict(pool.shed))
+    logging.info(f"[POOL] {workers} conversion workers, {max_pending} pending max, "
+                 f"overload policy: {policy}")
+
+    if backend == "socket":
+        receiver = start_socket_capture(port, rcvbuf)
+        add_receiver_gauges(receiver)
+    else:
+        pkt_q = start_scapy_capture(iface, port)
+        metrics.gauge('queue.depth', pkt_q.qsize)
 
     full_segments = int(total_dur // segment_len)
 
@@ -187,25 +328,238 @@ def record_segments(iface: str, output_dir: str, segment_len: float, total_dur:
         os.makedirs(seg_dir, exist_ok=True)
         seg_path = os.path.join(seg_dir, fname)
 
-        writer = PcapWriter(seg_path, append=False, sync=True, linktype=1)
-        pkt_count = 0
-        while time.time() < start + segment_len:
-            try:
-                p = pkt_q.get(timeout=0.01)
-                writer.write(p)
-                pkt_count += 1
-            except Empty:
-                continue
-        writer.close()
-        logging.info(f"[CAPTURE] Finished segment -> {fname} ({pkt_count} pkts)")
+        if backend == "socket":
+            pkt_count = _capture_socket_segment(receiver, seg_path, start + segment_len)
+            st = receiver.stats()
+            logging.info(f"[CAPTURE] Finished segment -> {fname} ({pkt_count} pkts, "
+                         f"kernel drops={st['kernel_drops']}, ring overruns={st['ring_overruns']})")
+        else:
+            pkt_count = _capture_scapy_segment(pkt_q, seg_path, start + segment_len)
+            logging.info(f"[CAPTURE] Finished segment -> {fname} ({pkt_count} pkts)")
+
+        metrics.add('segments.captured')
+        pool.submit(seg_path, label, output_dir, segment_len, port)
+
+    if backend == "socket":
+        logging.info(f"[CAPTURE] Receiver stats: {receiver.stats()}")
+        receiver.stop()
+    logging.info(f"[CAPTURE] All segments captured. Draining conversions "
+                 f"({pool.pending()} pending, {pool.busy} running, "
+                 f"timeout {drain_timeout:.1f}s)")
+    st = pool.close(drain_timeout)
+    logging.info(f"[POOL] Done: {st}")
+    return st
+
+def add_receiver_gauges(receiver: UdpReceiver):
+    """
+    Registers the socket receiver's ring fill and drop counters as gauges.
+    """
+    metrics.gauge('ring.fill',       lambda: len(receiver.ring))
+    metrics.gauge('ring.overruns',   lambda: receiver.ring.overruns)
+    metrics.gauge('capture.ignored', lambda: receiver.ignored)
+    metrics.gauge('kernel.drops',    receiver.kernel_drops)
+
+def _scapy_reader(pkt_q: Queue, port: int):
+    """
+    Returns a read() callable draining the scapy queue into
+    (payload list, receive timestamps) like PacketRing.read().
+    """
+    from scapy.all import UDP
+
+    def read():
+        payloads, stamps = [], []
+        try:
+            p = pkt_q.get(timeout=0.01)
+            while len(payloads) < READ_BATCH:
+                if UDP in p and len(p[UDP].payload) == PACKET_SIZE:
+                    payloads.append(bytes(p[UDP].payload))
+                    stamps.append(float(p.time))
+                else:
+                    metrics.add('capture.ignored')
+                p = pkt_q.get_nowait()
+        except Empty:
+            pass
+        return payloads, np.asarray(stamps, dtype=np.float64)
+    return read
+
+def stream_frames(read, output_dir: str, total_dur: float, port: int = VELODYNE_PORT,
+                  archive_pcap: bool = False, continuity: bool = True):
+    """
+    In-memory live pipeline: capture → decode → revolution assembly → writer.
+    `read()` returns (payloads, receive timestamps) batches from the capture
+    thread. Frames are cut on raw azimuth rollover and written as soon as
+    the revolution completes. With archive_pcap the raw payloads are also
+    appended to one PCAP per run under segments/. With continuity every
+    batch goes through the packet loss / gap check; per-frame results and
+    a run summary are saved next to log.txt. If frame_ring is set, every
+    frame is also published to shared memory for analytics processes.
+    """
+    csv_dir = os.path.join(output_dir, "csv_frames")
+    os.makedirs(csv_dir, exist_ok=True)
+
+    archive = None
+    if archive_pcap:
+        seg_dir = os.path.join(output_dir, "segments")
+        os.makedirs(seg_dir, exist_ok=True)
+        archive_path = os.path.join(seg_dir, time.strftime("stream_%Y%m%d_%H%M%S.pcap"))
+        archive = PcapRecordWriter(archive_path)
+        logging.info(f"[STREAM] Archiving raw packets to {archive_path}")
+
+    assembler = FrameAssembler()
+    checker   = ContinuityChecker() if continuity else None
+    status    = {}   # frame_id -> FrameContinuity
+    pkt_count = 0
+    deadline  = time.time() + total_dur
+    if checker is not None:
+        metrics.gauge('continuity', checker.summary)
 
-        threading.Thread(
-            target=split_and_convert_segment,
-            args=(seg_path, label, output_dir, segment_len),
-            daemon=False
-        ).start()
+    def emit(frame):
+        t0 = time.perf_counter()
+        points   = compute_points(frame.batch, calib)
+        t1 = time.perf_counter()
+        points, filtered = apply_filter(points)
+        metrics.observe('transform.frame_s', t1 - t0)
+        t1 = time.perf_counter()
+        csv_name = f"frame_{frame.frame_id}{frame_writer.extension}"
+        frame_writer.write(points, os.path.join(csv_dir, f"frame_{frame.frame_id}"))
+        metrics.observe('write.frame_s', time.perf_counter() - t1)
+        if frame_ring is not None:
+            t1 = time.perf_counter()
+            frame_ring.publish(points, frame.frame_id, frame.t_first or 0.0)
+            metrics.observe('shm.publish_s', time.perf_counter() - t1)
+        metrics.add('frames.written')
+        metrics.add('frames.points', len(points['x']))
+        log_first_frame()
+        latency = time.time() - frame.t_first if frame.t_first else float('nan')
+        if frame.t_first:
+            metrics.observe('frame.latency_s', latency)
+        cont = status.pop(frame.frame_id, None)
+        if cont is not None and not cont.complete:
+            metrics.add('frames.incomplete')
+        logging.info(f"[STREAM] {csv_name} -> {len(points['x'])} pts{filtered} "
+                     f"(latency {latency:.3f}s){describe(cont)}")
 
-    logging.info("[CAPTURE] All segments captured. Conversions continue in background.")
+    while time.time() < deadline:
+        payloads, stamps = read()
+        if len(stamps) == 0:
+            continue
+        pkt_count += len(stamps)
+        metrics.packets(len(stamps))
+        metrics.observe('queue.wait_s', time.time() - stamps[0])
+        if archive is not None:
+            t0 = time.perf_counter()
+            for payload, ts in zip(payloads, stamps.tolist()):
+                archive.write_payload(payload, ts, port=port)
+            metrics.observe('archive.batch_s', time.perf_counter() - t0)
+
+        if checker is not None:
+            t0 = time.perf_counter()
+            status.update((f.frame_id, f) for f in checker.check(payloads))
+            metrics.observe('continuity.batch_s', time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        frames = assembler.push(parse_packets(payloads), float(stamps[-1]))
+        metrics.observe('decode.batch_s', time.perf_counter() - t0)
+        for frame in frames:
+            emit(frame)
+
+    frame = assembler.flush(time.time())
+    if checker is not None:
+        last = checker.flush()
+        if last is not None:
+            status[last.frame_id] = last
+    if frame is not None:
+        emit(frame)
+    if archive is not None:
+        archive.close()
+    logging.info(f"[STREAM] Done: {pkt_count} pkts, {assembler.frame_id} frames")
+    if checker is not None:
+        summary = save_continuity(checker, output_dir)
+        logging.info(f"[STREAM] Continuity: {summary}")
+
+def stream_sensors(sensors, merger: FrameMerger, output_dir: str, total_dur: float,
+                   rcvbuf: int = DEFAULT_RCVBUF):
+    """
+    Multi-sensor live pipeline: one UdpReceiver (thread) per sensor port,
+    drained round-robin by this loop. Each sensor's packets are decoded
+    with its own calibration, assembled into revolutions and moved into
+    the world frame by its pose; FrameMerger then groups revolutions whose
+    start times fall in one window into a merged cloud, written to
+    csv_frames/merged_<id>. Per-merge sensor times, time spread and
+    missing sensors go to merge_report.csv.
+    """
+    csv_dir = os.path.join(output_dir, "csv_frames")
+    os.makedirs(csv_dir, exist_ok=True)
+    receivers = []
+    arrived   = threading.Event()    # shared by all rings: set when any sensor has packets
+    for sensor in sensors:
+        receiver = UdpReceiver(port=sensor.port, rcvbuf=rcvbuf,
+                               ring=PacketRing(DEFAULT_RING_SLOTS, ready=arrived)).start()
+        receivers.append(receiver)
+        metrics.gauge(f'sensor.{sensor.name}.ring_fill', lambda r=receiver: len(r.ring))
+        metrics.gauge(f'sensor.{sensor.name}.kernel_drops', receiver.kernel_drops)
+        logging.info(f"[MULTI] {sensor.name}: UDP port {sensor.port}")
+
+    report = open(os.path.join(output_dir, "merge_report.csv"), "w", encoding="utf-8")
+    report.write("merge_id,points,spread_ms,missing,"
+                 + ",".join(f"{s.name}_frame,{s.name}_time" for s in sensors) + "\n")
+
+    def emit(merged):
+        t0 = time.perf_counter()
+        points, filtered = apply_filter(merged.points)
+        name = f"merged_{merged.merge_id}"
+        frame_writer.write(points, os.path.join(csv_dir, name))
+        if frame_ring is not None:
+            frame_ring.publish(points, merged.merge_id, min(f.time for f in merged.frames))
+        metrics.observe('write.frame_s', time.perf_counter() - t0)
+        metrics.observe('merge.spread_s', merged.spread)
+        metrics.add('frames.written')
+        metrics.add('frames.points', len(points['x']))
+        log_first_frame()
+        if merged.missing:
+            metrics.add('merge.partial')
+
+        by_name = {f.sensor: f for f in merged.frames}
+        cells   = []
+        for s in sensors:
+            f = by_name.get(s.name)
+            cells += ["", ""] if f is None else [str(f.frame_id), f"{f.time:.6f}"]
+        report.write(f"{merged.merge_id},{len(points['x'])},{merged.spread * 1e3:.3f},"
+                     f"{'|'.join(merged.missing)},{','.join(cells)}\n")
+        missing = f"; missing {', '.join(merged.missing)}" if merged.missing else ""
+        logging.info(f"[MULTI] {name}{frame_writer.extension} -> {len(points['x'])} pts{filtered} "
+                     f"from {len(merged.frames)} sensors (spread {merged.spread * 1e3:.1f} ms{missing})")
+
+    deadline = time.time() + total_dur
+    while time.time() < deadline:
+        got = 0
+        for sensor, receiver in zip(sensors, receivers):
+            payloads, stamps = receiver.ring.read(max_items=READ_BATCH)
+            if len(stamps) == 0:
+                continue
+            got += len(stamps)
+            metrics.packets(len(stamps))
+            t0 = time.perf_counter()
+            for frame in sensor.push(payloads, stamps):
+                merger.push(frame)
+            metrics.observe('decode.batch_s', time.perf_counter() - t0)
+        for merged in merger.pop():
+            emit(merged)
+        if not got:
+            arrived.wait(0.005)
+
+    for receiver in receivers:
+        receiver.stop()
+    for sensor in sensors:
+        for frame in sensor.flush(time.time()):
+            merger.push(frame)
+    for merged in merger.pop(force=True):
+        emit(merged)
+    report.close()
+    for sensor, receiver in zip(sensors, receivers):
+        logging.info(f"[MULTI] {sensor.name}: {sensor.packets} pkts, "
+                     f"{sensor.assembler.frame_id} frames, receiver {receiver.stats()}")
+    logging.info(f"[MULTI] Done: {merger.merged} merged frames ({merger.partial} partial)")
 
 def main():
     parser = argparse.ArgumentParser("LiDAR live → grouped CSV")
@@ -214,25 +568,163 @@ def main():
                         help="root output folder")
     parser.add_argument("-d", "--duration",  type=float, default=10.0,
                         help="total capture time (s)")
+    parser.add_argument("-m", "--mode",      choices=["stream", "segments"], default="stream",
+                        help="stream: in-memory revolution frames; "
+                             "segments: 0.3 s PCAP segments split into slices")
     parser.add_argument("-s", "--segment",   type=float, default=0.3,
-                        help="per-segment length (s)")
+                        help="per-segment length (s), segments mode")
+    parser.add_argument("-f", "--format",    choices=FRAME_FORMATS, default="csv",
+                        help="frame file format written to csv_frames/")
+    parser.add_argument("--archive-pcap",    action="store_true",
+                        help="stream mode: also archive raw packets to PCAP")
+    parser.add_argument("--filter",
+                        help="JSON filter config (ROI polygon/box, z and range limits, voxel grid)")
+    parser.add_argument("--background",
+                        help="background model .npz: loaded if present, otherwise learned "
+                             "from the first --bg-warmup frames and saved there")
+    parser.add_argument("--bg-warmup",       type=int, default=WARMUP_FRAMES,
+                        help="frames used to learn the background")
+    parser.add_argument("--bg-margin",       type=float,
+                        help="meters a return must be closer than the background (default 0.5)")
+    parser.add_argument("--bg-update",       action="store_true",
+                        help="keep adapting the background and save it at the end")
+    parser.add_argument("--no-continuity",   action="store_true",
+                        help="stream mode: skip the packet loss / gap check")
+    parser.add_argument("--calib-xml",
+                        help="build the calibration from this VeloView XML instead of the "
+                             "Data Order CSV (cached either way)")
+    parser.add_argument("--sensors",
+                        help="multi-sensor JSON config (port, calibration and pose per sensor); "
+                             "captures all of them with UDP sockets and merges their frames")
+    parser.add_argument("--shm",             nargs="?", const=DEFAULT_RING_NAME,
+                        help="stream mode: also publish frames to this shared-memory ring "
+                             f"(default name {DEFAULT_RING_NAME}); read with pipeline.shm_ring")
+    parser.add_argument("--shm-slots",       type=int, default=DEFAULT_SLOTS,
+                        help="frames kept in the shared-memory ring")
+    parser.add_argument("--shm-max-points",  type=int, default=DEFAULT_MAX_POINTS,
+                        help="points per ring slot (larger frames are truncated)")
+    parser.add_argument("-b", "--backend",   choices=["scapy", "socket"], default="scapy",
+                        help="capture backend: scapy sniff() or plain UDP socket")
+    parser.add_argument("-p", "--port",      type=int, default=VELODYNE_PORT,
+                        help="Velodyne data UDP port")
+    parser.add_argument("--rcvbuf",          type=int, default=DEFAULT_RCVBUF,
+                        help="SO_RCVBUF size for the socket backend (bytes)")
+    parser.add_argument("-w", "--workers",   type=int, default=DEFAULT_WORKERS,
+                        help="segments mode: conversion worker threads")
+    parser.add_argument("--max-pending",     type=int, default=DEFAULT_MAX_PENDING,
+                        help="segments mode: segments waiting for a worker before shedding")
+    parser.add_argument("--overload",        choices=OVERLOAD_POLICIES, default="skip-decode",
+                        help="segments mode: block capture, drop the oldest waiting "
+                             "segment, or skip decoding (raw PCAP kept)")
+    parser.add_argument("--drain-timeout",   type=float, default=DEFAULT_DRAIN_S,
+                        help="segments mode: max seconds to finish conversions after capture")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_INTERVAL,
+                        help="seconds between JSON lines in metrics.jsonl (0 disables)")
+    parser.add_argument("--expected-rate",   type=float, default=EXPECTED_PKT_RATE,
+                        help="expected packets/s used for the missing-packet count")
+    parser.add_argument("--stats-port",      type=int,
+                        help="serve live stats as JSON on http://127.0.0.1:PORT/")
+    parser.add_argument("--stats-socket",
+                        help="serve live stats as JSON on this Unix socket path")
     args = parser.parse_args()
 
     setup_main_logger(args.output)
-    iface = args.interface or auto_detect_interface()
-    logging.info(f"Using interface: {iface}")
+    iface = None
+    if args.backend == "scapy" and not args.sensors:
+        iface = args.interface or auto_detect_interface()
+        logging.info(f"Using interface: {iface}")
+
+    global calib, frame_writer, frame_filter, background, background_path, metrics, frame_ring
+
+    sensors = None
+    if args.sensors:
+        sensors, window, max_wait = load_sensors(args.sensors)
+        logging.info(f"[MULTI] {len(sensors)} sensors from {args.sensors}, "
+                     f"merge window {window * 1e3:.0f} ms")
 
-    global laser_map, vertical_angles, azimuth_offsets
-    global seq_primary, seq_secondary, timing_offsets
+    calib        = Calibration.load(xml_path=args.calib_xml)
+    t_calib      = time.perf_counter()
+    frame_writer = make_frame_writer(args.format)
+    metrics      = Metrics(expected_rate=args.expected_rate * (len(sensors) if sensors else 1))
+    if args.filter:
+        frame_filter = FrameFilter.from_json(args.filter)
+        logging.info(f"Point filter loaded from {args.filter}")
+    if args.background and sensors:
+        logging.warning("[MULTI] --background works on one sensor's grid; ignored with --sensors")
+    elif args.background:
+        opts = {'warmup_frames': args.bg_warmup, 'update': args.bg_update}
+        if args.bg_margin is not None:
+            opts['margin'] = args.bg_margin
+        background_path = args.background
+        background      = BackgroundModel.open(args.background, **opts)
+        state = "loaded" if background.ready else f"learning over {args.bg_warmup} frames"
+        logging.info(f"[BACKGROUND] {args.background}: {state}")
 
-    laser_map, vertical_angles, azimuth_offsets = load_data_order_and_angles()
-    fs = load_firing_sequence()
-    timing_offsets = load_timing_offsets()
-    seq_primary   = dict(zip(fs['Laser ID'],   fs.index))
-    seq_secondary = dict(zip(fs['Laser ID 2'], fs.index))
+    reporter = server = None
+    if args.metrics_interval > 0:
+        metrics_path = os.path.join(args.output, "metrics.jsonl")
+        reporter = MetricsReporter(metrics, metrics_path, args.metrics_interval).start()
+        logging.info(f"Writing pipeline metrics to {metrics_path}")
+    if args.stats_port is not None or args.stats_socket:
+        server = StatsServer(metrics, http_port=args.stats_port,
+                             unix_path=args.stats_socket).start()
+        logging.info(f"Stats endpoint: port={args.stats_port} socket={args.stats_socket}")
+
+    if args.shm and (args.mode == "stream" or sensors):
+        frame_ring = FrameRingWriter(args.shm, slots=args.shm_slots,
+                                     max_points=args.shm_max_points)
+        metrics.gauge('shm', frame_ring.stats)
+        logging.info(f"[SHM] Publishing frames to ring '{args.shm}' "
+                     f"({args.shm_slots} slots x {args.shm_max_points} pts)")
+    elif args.shm:
+        logging.warning("[SHM] --shm is only supported in stream mode; ignored")
+
+    try:
+        source = 'cache ' + os.path.basename(calib.cache_path) if calib.cache_path else 'parsed'
+        logging.info(f"Calibration loaded ({len(calib.laser_id)} lasers, {source})")
+        logging.info(f"[STARTUP] Ready to capture {time.perf_counter() - T_START:.3f}s after start "
+                     f"(imports {T_IMPORTED - T_START:.3f}s, "
+                     f"calibration {t_calib - T_IMPORTED:.3f}s)")
+        if sensors:
+            merger = FrameMerger(sensors, window, max_wait)
+            stream_sensors(sensors, merger, args.output, args.duration, rcvbuf=args.rcvbuf)
+        elif args.mode == "segments":
+            record_segments(iface, args.output, args.segment, args.duration,
+                            backend=args.backend, port=args.port, rcvbuf=args.rcvbuf,
+                            workers=args.workers, max_pending=args.max_pending,
+                            policy=args.overload, drain_timeout=args.drain_timeout)
+        else:
+            if args.backend == "socket":
+                receiver = start_socket_capture(args.port, args.rcvbuf)
+                add_receiver_gauges(receiver)
+                read = lambda: receiver.ring.read(max_items=READ_BATCH, timeout=0.01)
+            else:
+                pkt_q = start_scapy_capture(iface, args.port)
+                metrics.gauge('queue.depth', pkt_q.qsize)
+                read  = _scapy_reader(pkt_q, args.port)
+            stream_frames(read, args.output, args.duration, port=args.port,
+                          archive_pcap=args.archive_pcap, continuity=not args.no_continuity)
+            if args.backend == "socket":
+                logging.info(f"[CAPTURE] Receiver stats: {receiver.stats()}")
+                receiver.stop()
 
-    logging.info(f"Calibration loaded ({len(laser_map)} lasers)")
-    record_segments(iface, args.output, args.segment, args.duration)
+        if background is not None and background.ready and background.update:
+            background.save(background_path)
+            logging.info(f"[BACKGROUND] Updated model saved to {background_path}")
+        if frame_filter:
+            logging.info(f"[FILTER] Totals: {frame_filter.totals}")
+        snap = metrics.snapshot()
+        logging.info(f"[METRICS] packets={snap['packets']} counters={snap['counters']}")
+    finally:
+        # Unlink the ring even when capture stops on an error or Ctrl+C, so
+        # the next run can create it again
+        if frame_ring is not None:
+            logging.info(f"[SHM] Ring stats: {frame_ring.stats()}")
+            frame_ring.close()
+        if server is not None:
+            server.stop()
+        if reporter is not None:
+            reporter.stop()
 
 if __name__ == "__main__":
     main()
@@ -1,108 +1,292 @@
 # main.py
 
+import time
+T_START = time.perf_counter()   # cold-start reference, taken before the heavy imports
+
 import os
-import csv
+import argparse
 import logging
 
-from config import PCAP_DIR, OUTPUT_DIR, DISTANCE_RESOLUTION
-from decoder.pcap_reader       import read_pcap
-from decoder.packet_parser     import parse_packet_dual as parse_packet
-from decoder.calibration       import (
-    load_data_order_and_angles,
-    load_firing_sequence,
-    load_timing_offsets
-)
-from decoder.coordinate_transform import compute_cartesian
-from decoder.timestamp_utils      import apply_timing_offset
+from config import PCAP_DIR, OUTPUT_DIR
+from decoder.pcap_reader       import PcapReader
+from decoder.packet_parser     import parse_packets
+from decoder.frame_assembler   import FrameAssembler
+from decoder.calibration       import Calibration
+from decoder.coordinate_transform import compute_points
+from decoder.frame_writers     import make_frame_writer, FRAME_FORMATS
+from decoder.parallel_convert  import convert_parallel
+from decoder.continuity        import ContinuityChecker, save_continuity, describe
+from decoder.filters           import FrameFilter, format_removed
+from decoder.background        import BackgroundModel, WARMUP_FRAMES
+from decoder.range_image       import cluster_boxes, save_boxes, BOXES_SUFFIX
+from decoder.pcap_follow       import PcapFollower, POLL_INTERVAL_S
+T_IMPORTED = time.perf_counter()
 
-ROTATION_RATE_DEG_PER_US = 360.0 / 100_000.0  # 360° per 100ms
+CHUNK_PACKETS = 1800  # packets decoded per batch (~1 s of data)
+DEFAULT_PCAP  = os.path.join(PCAP_DIR, "2025-05-09-18-27-40_Velodyne-VLP-32C-Data.pcap")
 
 def setup_logging():
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
+def parse_args():
+    parser = argparse.ArgumentParser("LiDAR PCAP → per-frame point files")
+    parser.add_argument("-i", "--input",  default=DEFAULT_PCAP,
+                        help="input pcap/pcapng file")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR,
+                        help="output folder")
+    parser.add_argument("-f", "--format", choices=FRAME_FORMATS, default="csv",
+                        help="frame file format")
+    parser.add_argument("--calib-xml", default=None,
+                        help="build the calibration from this VeloView XML instead of the "
+                             "Data Order CSV (cached either way)")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep decoding the input as it grows (e.g. tcpdump -w), "
+                             "resuming from --checkpoint")
+    parser.add_argument("--checkpoint", default=None,
+                        help="follow mode resume file (default <output>/follow_checkpoint.json)")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="follow mode: stop after this many seconds without new packets "
+                             "(default: run until interrupted)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="decoder processes (>1 enables parallel conversion)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="parallel mode: max outstanding tasks (default 2 per worker)")
+    parser.add_argument("--filter", default=None,
+                        help="JSON filter config (ROI polygon/box, z and range limits, voxel grid)")
+    parser.add_argument("--background", default=None,
+                        help="background model .npz: loaded if present, otherwise learned "
+                             "from the first --bg-warmup frames and saved there")
+    parser.add_argument("--bg-warmup", type=int, default=WARMUP_FRAMES,
+                        help="frames used to learn the background")
+    parser.add_argument("--bg-margin", type=float, default=None,
+                        help="meters a return must be closer than the background (default 0.5)")
+    parser.add_argument("--bg-update", action="store_true",
+                        help="keep adapting the background to slow scene changes "
+                             "(single process only) and save it at the end")
+    parser.add_argument("--clusters", action="store_true",
+                        help="cluster each frame on its range image and write "
+                             "frame_<id>_boxes.csv bounding boxes")
+    parser.add_argument("--no-continuity", action="store_true",
+                        help="skip the packet loss / gap check")
+    parser.add_argument("--period-us", type=float, default=None,
+                        help="nominal packet period for the gap check (default: estimated)")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     setup_logging()
     log = logging.getLogger(__name__)
 
     # Load calibration
-    laser_map, vertical_angles, azimuth_offsets = load_data_order_and_angles()
-    firing_seq = load_firing_sequence()
-    timing_offsets = load_timing_offsets()
-
-    if firing_seq.shape != (32, 2):
-        raise RuntimeError(f"firing_sequence.csv must be (32,2), got {firing_seq.shape}")
-    if timing_offsets.shape != (32, 12):
-        raise RuntimeError(f"timing_offsets must be (32,12), got {timing_offsets.shape}")
-
-    seq_primary   = dict(zip(firing_seq['Laser ID'], firing_seq.index))
-    seq_secondary = dict(zip(firing_seq['Laser ID 2'], firing_seq.index))
-
-    log.info(f"Calibration loaded: {len(laser_map)} lasers")
-
-    # File input
-    pcap_file = os.path.join(PCAP_DIR, "2025-05-09-18-27-40_Velodyne-VLP-32C-Data.pcap")
-    packets   = read_pcap(pcap_file)
-    log.info(f"Read {len(packets)} packets from PCAP")
-
-    # Init
-    frame_id          = 0
-    frame_points      = []
-    last_block_az_raw = None
-
-    for pkt in packets:
-        blocks, base_ts = parse_packet(pkt)
-        for block_idx, (azi_raw, channels, _) in enumerate(blocks):
-            block_start_deg = azi_raw / 100.0
-
-            # Detect new frame on raw azimuth rollover
-            if last_block_az_raw is not None and azi_raw < last_block_az_raw:
-                _save_frame_csv(frame_points, frame_id)
-                log.info(f"Frame {frame_id} saved ({len(frame_points)} pts)")
-                frame_id      += 1
-                frame_points   = []
-            last_block_az_raw = azi_raw
-
-            for ch_idx, (dist_raw, intensity, ret_id) in enumerate(channels):
-                if dist_raw == 0:
-                    continue
-
-                lid        = laser_map[ch_idx]
-                vert_ang   = vertical_angles[lid]
-                offset_deg = azimuth_offsets[lid]
-                row_idx    = seq_primary[lid] if ret_id == 0 else seq_secondary[lid]
-                ts_point   = apply_timing_offset(base_ts, row_idx, block_idx, timing_offsets)
-
-                # Final azimuth (Velodyne logic: anchor per block, not frame)
-                dt_us   = ts_point - base_ts
-                az_base = (block_start_deg - offset_deg) % 360.0
-                az_deg  = (az_base + dt_us * ROTATION_RATE_DEG_PER_US + offset_deg) % 360.0
-                az_int  = int(round(az_deg * 100))
-
-                dist_m = dist_raw * DISTANCE_RESOLUTION
-                x, y, z = compute_cartesian(dist_m, az_deg, vert_ang)
-
-                frame_points.append([
-                    int(intensity), lid, az_int,
-                    f"{dist_m:.6f}", ts_point, ts_point,
-                    f"{vert_ang:.6f}", f"{x:.6f}", f"{y:.6f}", f"{z:.6f}"
-                ])
-
-    if frame_points:
-        _save_frame_csv(frame_points, frame_id)
-        log.info(f"Final frame {frame_id} saved ({len(frame_points)} pts)")
-
-def _save_frame_csv(points, frame_id):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    out_path = os.path.join(OUTPUT_DIR, f"frame_{frame_id}.csv")
-    header = [
-        'intensity','laser_id','azimuth','distance_m',
-        'adjustedtime','timestamp','vertical_angle',
-        'Points_m_XYZ:0','Points_m_XYZ:1','Points_m_XYZ:2'
-    ]
-    with open(out_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(header)
-        writer.writerows(points)
+    calib   = Calibration.load(xml_path=args.calib_xml)
+    t_calib = time.perf_counter()
+    log.info(f"Calibration loaded: {len(calib.laser_id)} lasers "
+             f"({'cache ' + os.path.basename(calib.cache_path) if calib.cache_path else 'parsed'})")
+
+    frame_filter = None
+    if args.filter:
+        frame_filter = FrameFilter.from_json(args.filter)
+        log.info(f"Point filter loaded from {args.filter}")
+
+    background = None
+    if args.background:
+        background = _open_background(args, calib, log)
+
+    os.makedirs(args.output, exist_ok=True)
+    checker = None if args.no_continuity else ContinuityChecker(period_us=args.period_us)
+    if args.follow and args.workers > 1:
+        log.warning("Follow mode decodes in a single process; ignoring --workers")
+    elif args.workers > 1:
+        first = []
+        def on_frame(frame_id):
+            if not first:
+                first.append(frame_id)
+                _log_startup(log, t_calib)
+        n = convert_parallel(args.input, calib, args.output, args.format,
+                             workers=args.workers, max_in_flight=args.max_in_flight,
+                             frame_filter=frame_filter, background=background,
+                             clusters=args.clusters, on_frame=on_frame)
+        log.info(f"Converted {n} frames")
+        _log_filter(frame_filter, background, log)
+        if checker is not None:
+            # Header-only pass; frames were written by the workers
+            with PcapReader(args.input) as reader:
+                offsets, _ = reader.payload_offsets()
+                for start in range(0, len(offsets), CHUNK_PACKETS):
+                    checker.check(reader.payload_array(offsets[start:start + CHUNK_PACKETS]))
+                checker.flush()
+            _log_continuity(checker, args.output, log)
+        return
+
+    if args.follow:
+        checkpoint = args.checkpoint or os.path.join(args.output, "follow_checkpoint.json")
+        follower   = PcapFollower(args.input, checkpoint=checkpoint)
+        if follower.resumed:
+            log.info(f"Resuming {args.input} at byte {follower.offset} "
+                     f"(frame {follower.assembler.frame_id}) from {checkpoint}")
+        if checker is not None:
+            # Counts of the frames reported before the resume point
+            base    = follower.extra.get('continuity') if follower.resumed else None
+            checker = ContinuityChecker(period_us=args.period_us or (base or {}).get('period_us'),
+                                        az_step=(base or {}).get('az_step'),
+                                        first_frame_id=follower.assembler.frame_id,
+                                        partial_start=bool(follower.resume and follower.resume[1]),
+                                        base=base)
+        source = _follow(follower, args.idle_timeout, log, checker)
+        flush  = follower.flush
+    else:
+        # File input
+        reader     = PcapReader(args.input)
+        offsets, _ = reader.payload_offsets()
+        log.info(f"Read {len(offsets)} packets from PCAP")
+        assembler = FrameAssembler()
+        source = ((payloads, assembler.push(parse_packets(payloads)))
+                  for payloads in (reader.payload_array(offsets[start:start + CHUNK_PACKETS])
+                                   for start in range(0, len(offsets), CHUNK_PACKETS)))
+        flush  = assembler.flush
+
+    writer  = make_frame_writer(args.format)
+    status  = {}   # frame_id -> FrameContinuity
+    started = False
+    try:
+        for payloads, frames in source:
+            if checker is not None:
+                status.update((f.frame_id, f) for f in checker.check(payloads))
+            for frame in frames:
+                saved = _decode_and_save(frame, calib, writer, args.output, log,
+                                         status.pop(frame.frame_id, None), frame_filter,
+                                         background, args.clusters)
+                if saved and not started:
+                    started = True
+                    _log_startup(log, t_calib)
+    except KeyboardInterrupt:
+        if not args.follow:
+            raise
+        log.info("Interrupted; the open revolution is decoded on the next --follow run")
+        if checker is not None:
+            _log_continuity(checker, args.output, log, resume=True)
+        return
+
+    frame = flush()
+    if checker is not None:
+        last = checker.flush()
+        if last is not None:
+            status[last.frame_id] = last
+    if frame is not None:
+        saved = _decode_and_save(frame, calib, writer, args.output, log,
+                                 status.pop(frame.frame_id, None), frame_filter, background,
+                                 args.clusters, final=True)
+        if saved and not started:
+            _log_startup(log, t_calib)
+    _log_filter(frame_filter, background, log)
+    if background is not None and background.update:
+        background.save(args.background)
+        log.info(f"Updated background saved to {args.background}")
+    if checker is not None:
+        _log_continuity(checker, args.output, log, resume=args.follow)
+
+def _follow(follower, idle_timeout, log, checker=None):
+    """
+    Yields (payloads, frames) chunks as the followed PCAP grows. The
+    checkpoint is saved once the caller has processed a chunk, with the
+    continuity counts of the frames reported so far. Stops after
+    idle_timeout seconds without new packets (never if None).
+    """
+    idle_since = time.monotonic()
+    while True:
+        got = False
+        for chunk in follower.poll():
+            got = True
+            yield chunk
+            if checker is not None:
+                follower.extra['continuity'] = checker.closed_summary()
+            follower.save_checkpoint()
+        if got:
+            idle_since = time.monotonic()
+        elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+            log.info(f"No new packets for {idle_timeout:.1f}s; {follower.packets} packets followed")
+            return
+        else:
+            time.sleep(POLL_INTERVAL_S)
+
+def _decode_and_save(frame, calib, writer, output_dir, log, continuity=None,
+                     frame_filter=None, background=None, clusters=False, final=False):
+    points = compute_points(frame.batch, calib)
+    if final and len(points['x']) == 0:
+        return False
+    removed = {}
+    if background is not None:
+        points, removed['background'] = background.subtract(points)
+    if frame_filter:
+        points, steps = frame_filter.apply(points)
+        removed.update(steps)
+    filtered = f"; {format_removed(removed)}" if removed else ""
+    path = os.path.join(output_dir, f"frame_{frame.frame_id}")
+    writer.write(points, path)
+    if clusters:
+        boxes = cluster_boxes(points, calib)
+        save_boxes(boxes, path + BOXES_SUFFIX)
+        filtered += f"; {len(boxes)} clusters"
+    log.info(f"{'Final frame' if final else 'Frame'} {frame.frame_id} saved "
+             f"({len(points['x'])} pts{filtered}){describe(continuity)}")
+    return True
+
+def _log_startup(log, t_calib):
+    now = time.perf_counter()
+    log.info(f"[STARTUP] First frame saved {now - T_START:.3f}s after start "
+             f"(imports {T_IMPORTED - T_START:.3f}s, calibration {t_calib - T_IMPORTED:.3f}s, "
+             f"first frame {now - t_calib:.3f}s)")
+
+def _log_filter(frame_filter, background, log):
+    if background is not None:
+        total = background.removed + background.kept
+        log.info(f"Background removed {background.removed} of {total} points "
+                 f"({background.removed / max(total, 1):.1%})")
+    if frame_filter:
+        log.info(f"Filter totals: {frame_filter.totals}")
+
+def _open_background(args, calib, log):
+    """
+    Loads the background model, or learns it from the first frames of the
+    input and saves it. Returns a ready BackgroundModel.
+    """
+    opts = {'warmup_frames': args.bg_warmup,
+            'update':        args.bg_update and args.workers <= 1}
+    if args.bg_margin is not None:
+        opts['margin'] = args.bg_margin
+    if args.bg_update and args.workers > 1:
+        log.warning("--bg-update needs sequential frames; ignored with --workers > 1")
+
+    model = BackgroundModel.open(args.background, **opts)
+    if model.ready:
+        log.info(f"Background loaded from {args.background} "
+                 f"({model.coverage():.1%} cells, {model.frames} frames)")
+        return model
+
+    with PcapReader(args.input) as reader:
+        offsets, _ = reader.payload_offsets()
+        assembler  = FrameAssembler()
+        for start in range(0, len(offsets), CHUNK_PACKETS):
+            batch = parse_packets(reader.payload_array(offsets[start:start + CHUNK_PACKETS]))
+            for frame in assembler.push(batch):
+                if model.learn(compute_points(frame.batch, calib)):
+                    break
+            if model.ready:
+                break
+    if not model.finish():
+        raise RuntimeError(f"No frames to learn the background from in {args.input}")
+    model.save(args.background)
+    log.info(f"Background learned from {model.frames} frames "
+             f"({model.coverage():.1%} cells) and saved to {args.background}")
+    return model
+
+def _log_continuity(checker, output_dir, log, resume=False):
+    s = save_continuity(checker, output_dir, resume=resume)
+    log.info(f"Continuity: {s['complete_frames']}/{s['frames']} frames complete, "
+             f"{s['missing']} packets missing ({s['loss_ratio']:.3%}), "
+             f"{s['duplicates']} duplicated, {s['out_of_order']} out of order, "
+             f"{s['az_jumps']} azimuth jumps, {s['irregular']} irregular deltas "
+             f"(period {s['period_us']} µs)")
 
 if __name__ == '__main__':
     main()
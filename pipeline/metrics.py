@@ -0,0 +1,309 @@
+# pipeline/metrics.py
+
+import os
+import json
+import time
+import socket
+import bisect
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXPECTED_PKT_RATE = 1808    # VLP-32C data packets per second at 600 RPM
+DEFAULT_INTERVAL  = 1.0     # seconds between JSON lines
+
+# Histogram bucket upper bounds: 8 per decade from 10 µs to 100 s
+BUCKET_BOUNDS = [1e-5 * 10 ** (i / 8) for i in range(57)]
+PERCENTILES   = (50, 90, 99)
+
+
+class Counter:
+    """
+    Monotonic counter. add() is called once per batch, never per packet.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Histogram:
+    """
+    Fixed log-bucket histogram of durations in seconds. Recording is a
+    bisect plus a few additions; percentiles are estimated from the bucket
+    upper bounds (clamped to the observed max).
+    """
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.n      = 0
+        self.total  = 0.0
+        self.min    = float('inf')
+        self.max    = 0.0
+        self._ilo   = float('inf')    # extremes since the last mark()
+        self._ihi   = 0.0
+        self._lock  = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.n     += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            if value < self._ilo:
+                self._ilo = value
+            if value > self._ihi:
+                self._ihi = value
+
+    def state(self):
+        with self._lock:
+            return list(self.counts), self.n, self.total
+
+    def mark(self):
+        """
+        state() plus the min/max observed since the previous mark(), taken
+        atomically; starts a new interval.
+        """
+        with self._lock:
+            out = (list(self.counts), self.n, self.total, self._ilo, self._ihi)
+            self._ilo, self._ihi = float('inf'), 0.0
+        return out
+
+    def summary(self, since=None, upto=None):
+        """
+        Returns count/mean/min/max/percentiles, either cumulative or over
+        the interval between two consecutive mark()s `since` and `upto`
+        (min/max are then those of the interval).
+        """
+        if upto is None:
+            counts, n, total = self.state()
+            lo, hi = self.min, self.max
+        else:
+            counts, n, total, lo, hi = upto
+        if since is not None:
+            counts = [c - p for c, p in zip(counts, since[0])]
+            n, total = n - since[1], total - since[2]
+        if n == 0:
+            return {'count': 0}
+
+        out = {'count': n, 'mean': total / n, 'min': lo, 'max': hi}
+        for p in PERCENTILES:
+            rank, seen = p / 100 * n, 0
+            for i, c in enumerate(counts):
+                seen += c
+                if seen >= rank:
+                    break
+            bound = self.bounds[i] if i < len(self.bounds) else hi
+            out[f'p{p}'] = min(bound, hi)
+        return out
+
+
+class Metrics:
+    """
+    Registry of named counters, histograms and gauges for the live
+    pipeline. Gauges are callables evaluated only when a snapshot is taken
+    (queue depth, ring fill, kernel drops, ...), so they cost nothing in
+    the hot loop.
+    The 'capture.packets' counter is compared against `expected_rate`
+    packets/s since the first packet was counted.
+    """
+
+    def __init__(self, expected_rate=EXPECTED_PKT_RATE):
+        self.expected_rate = expected_rate
+        self.started       = time.time()
+        self.first_packet  = None
+        self.counters   = {}
+        self.histograms = {}
+        self.gauges     = {}
+        self._lock      = threading.Lock()
+
+    def counter(self, name):
+        c = self.counters.get(name)
+        if c is None:
+            with self._lock:
+                c = self.counters.setdefault(name, Counter())
+        return c
+
+    def histogram(self, name):
+        h = self.histograms.get(name)
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault(name, Histogram())
+        return h
+
+    def add(self, name, n=1):
+        self.counter(name).add(n)
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def packets(self, n):
+        """
+        Counts n captured packets (per batch).
+        """
+        if self.first_packet is None:
+            self.first_packet = time.time()
+        self.counter('capture.packets').add(n)
+
+    def snapshot(self):
+        now = time.time()
+        gauges = {}
+        for name, fn in list(self.gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+
+        received = self.counter('capture.packets').value
+        elapsed  = now - self.first_packet if self.first_packet else 0.0
+        expected = int(elapsed * self.expected_rate)
+        return {
+            'time':       now,
+            'uptime_s':   now - self.started,
+            'packets': {
+                'received': received,
+                'expected': expected,
+                'missing':  max(0, expected - received),
+                'ratio':    received / expected if expected else None,
+                'rate':     received / elapsed if elapsed else 0.0,
+            },
+            'counters':   {k: c.value for k, c in list(self.counters.items())},
+            'gauges':     gauges,
+            'histograms': {k: h.summary() for k, h in list(self.histograms.items())},
+        }
+
+
+class MetricsReporter:
+    """
+    Background thread appending one JSON line per `interval` seconds to
+    `path`. Each line is a Metrics.snapshot() plus 'interval' rates and
+    histogram summaries covering only the last interval.
+    """
+
+    def __init__(self, metrics, path, interval=DEFAULT_INTERVAL):
+        self.metrics  = metrics
+        self.path     = path
+        self.interval = interval
+        self._prev    = None
+        self._stop    = threading.Event()
+        self._thread  = None
+        self._file    = None
+
+    def start(self):
+        self._file   = open(self.path, 'a', encoding='utf-8')
+        self._prev   = self._state()
+        self._thread = threading.Thread(target=self._run, name="metrics-reporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._file is not None:
+            self.report()
+            self._file.close()
+            self._file = None
+
+    def _state(self):
+        return (time.time(),
+                {k: c.value for k, c in list(self.metrics.counters.items())},
+                {k: h.mark() for k, h in list(self.metrics.histograms.items())})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def report(self):
+        snap = self.metrics.snapshot()
+        t0, counters, hists = self._prev
+        self._prev = self._state()
+        marks      = self._prev[2]
+        dt = max(snap['time'] - t0, 1e-9)
+        snap['interval'] = {
+            'seconds':    dt,
+            'rates':      {k: (v - counters.get(k, 0)) / dt
+                           for k, v in snap['counters'].items()},
+            'histograms': {k: h.summary(since=hists.get(k), upto=marks[k])
+                           for k, h in list(self.metrics.histograms.items()) if k in marks},
+        }
+        self._file.write(json.dumps(snap) + "\n")
+        self._file.flush()
+        return snap
+
+
+class StatsServer:
+    """
+    Local stats endpoint serving the current Metrics.snapshot() as JSON:
+      - http_port: GET http://127.0.0.1:<port>/ (any path)
+      - unix_path: connect to the Unix socket, read one JSON document
+    """
+
+    def __init__(self, metrics, http_port=None, unix_path=None, host="127.0.0.1"):
+        self.metrics   = metrics
+        self.http_port = http_port
+        self.unix_path = unix_path
+        self.host      = host
+        self._servers  = []
+
+    def start(self):
+        metrics = self.metrics
+
+        class HttpHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(metrics.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class UnixHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(json.dumps(metrics.snapshot()).encode() + b"\n")
+
+        if self.http_port is not None:
+            self._servers.append(ThreadingHTTPServer((self.host, self.http_port), HttpHandler))
+        if self.unix_path is not None:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            self._servers.append(socketserver.ThreadingUnixStreamServer(self.unix_path, UnixHandler))
+        for server in self._servers:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="stats-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+
+def read_unix_stats(path):
+    """
+    Client helper: returns the snapshot served on a StatsServer Unix socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        data = b""
+        while chunk := s.recv(65536):
+            data += chunk
+    return json.loads(data)
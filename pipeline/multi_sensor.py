@@ -0,0 +1,238 @@
+# pipeline/multi_sensor.py
+
+import json
+from collections import namedtuple, deque
+
+import numpy as np
+
+from decoder.calibration           import (Calibration, DATA_ORDER_PATH, FIRING_SEQUENCE_PATH,
+                                           TIMING_OFFSETS_PATH)
+from decoder.coordinate_transform import FRAME_COLUMNS, compute_points
+from decoder.frame_assembler      import FrameAssembler
+from decoder.packet_parser        import parse_packets
+from decoder.pcap_reader          import VELODYNE_PORT
+
+HOUR_S           = 3600.0
+MERGE_WINDOW_S   = 0.05    # frames closer than this (half a revolution) are merged
+MAX_WAIT_S       = 0.3     # a sensor this far behind the others counts as silent
+OFFSET_RELAX     = 0.01    # share of a larger clock offset accepted per batch (drift)
+TIMESTAMP_OFFSET = 1200    # packet footer: u32 µs past the hour
+
+SensorFrame = namedtuple('SensorFrame', ['sensor', 'frame_id', 'time', 'points'])
+SensorFrame.__doc__ = """
+One sensor's revolution, already in the world frame:
+  - time:   host-clock time of its first packet (sensor clock + offset)
+  - points: compute_points() columns with x/y/z transformed by the pose
+"""
+
+MergedFrame = namedtuple('MergedFrame', ['merge_id', 'points', 'frames', 'missing', 'spread'])
+MergedFrame.__doc__ = """
+World-frame cloud of the sensor frames that fell in one merge window:
+  - points:  concatenated columns plus 'sensor' (index into the config)
+  - frames:  SensorFrame per contributing sensor (points left out)
+  - missing: names of sensors without a frame in the window
+  - spread:  latest minus earliest frame time of the group (s)
+"""
+
+
+def pose_matrix(pose):
+    """
+    4x4 sensor-to-world transform from a pose entry: either
+    {"matrix": 4x4 nested list} or {"x", "y", "z" (m), "roll", "pitch",
+    "yaw" (°)} with R = Rz(yaw) @ Ry(pitch) @ Rx(roll). Missing keys are 0.
+    """
+    if pose is None:
+        return np.eye(4)
+    if 'matrix' in pose:
+        m = np.asarray(pose['matrix'], dtype=np.float64)
+        if m.shape != (4, 4):
+            raise ValueError(f"pose matrix must be 4x4, got {m.shape}")
+        return m
+    r, p, y = np.radians([pose.get('roll', 0.0), pose.get('pitch', 0.0), pose.get('yaw', 0.0)])
+    rx = np.array([[1, 0, 0], [0, np.cos(r), -np.sin(r)], [0, np.sin(r), np.cos(r)]])
+    ry = np.array([[np.cos(p), 0, np.sin(p)], [0, 1, 0], [-np.sin(p), 0, np.cos(p)]])
+    rz = np.array([[np.cos(y), -np.sin(y), 0], [np.sin(y), np.cos(y), 0], [0, 0, 1]])
+    m = np.eye(4)
+    m[:3, :3] = rz @ ry @ rx
+    m[:3, 3]  = [pose.get('x', 0.0), pose.get('y', 0.0), pose.get('z', 0.0)]
+    return m
+
+
+def transform_points(points, matrix):
+    """
+    Returns a copy of the frame columns with x/y/z mapped through `matrix`.
+    """
+    xyz = np.stack([points['x'], points['y'], points['z']])
+    w   = matrix[:3, :3] @ xyz + matrix[:3, 3:]
+    out = dict(points)
+    out['x'], out['y'], out['z'] = w
+    return out
+
+
+class Sensor:
+    """
+    Per-sensor state of the multi-sensor pipeline: its own calibration,
+    pose and FrameAssembler, plus the estimate of its clock offset.
+    The offset (host receive time - sensor timestamp) is the running
+    minimum over all packets, i.e. the least-delayed packet, folded across
+    the sensor's hourly timestamp wrap; it may grow by OFFSET_RELAX of a
+    larger batch minimum to follow clock drift.
+    """
+
+    def __init__(self, index, name, port, calib, matrix):
+        self.index     = index
+        self.name      = name
+        self.port      = port
+        self.calib     = calib
+        self.matrix    = matrix
+        self.assembler = FrameAssembler()
+        self.offset    = None
+        self.packets   = 0
+        self.watermark = None    # host-clock time of the last packet decoded
+
+    def _fold(self, t):
+        # Sensor timestamps wrap every hour; keep t next to the current offset
+        return t - HOUR_S * np.round((t - self.offset) / HOUR_S)
+
+    def push(self, payloads, stamps):
+        """
+        Decodes one batch of this sensor's packets. Returns the revolutions
+        it completed as SensorFrames.
+        """
+        payloads = np.asarray(payloads)
+        ts = payloads[:, TIMESTAMP_OFFSET:TIMESTAMP_OFFSET + 4].copy().view('<u4').ravel()
+        d  = float(np.min(np.asarray(stamps) - ts * 1e-6))
+        if self.offset is None:
+            self.offset = d
+        else:
+            d = self._fold(d)
+            self.offset = d if d < self.offset else self.offset + OFFSET_RELAX * (d - self.offset)
+        self.packets  += len(stamps)
+        self.watermark = self.host_time(ts[-1])
+
+        out = []
+        for frame in self.assembler.push(parse_packets(payloads), float(stamps[-1])):
+            out.append(self._frame(frame))
+        return out
+
+    def host_time(self, sensor_us):
+        return float(self._fold(sensor_us * 1e-6 + self.offset))
+
+    def open_time(self):
+        """
+        Host-clock start of the revolution still being assembled, or None.
+        """
+        ts = self.assembler.pending_timestamp
+        return None if ts is None else self.host_time(ts)
+
+    def flush(self, stamp):
+        frame = self.assembler.flush(stamp)
+        return [] if frame is None else [self._frame(frame)]
+
+    def _frame(self, frame):
+        points = transform_points(compute_points(frame.batch, self.calib), self.matrix)
+        t0     = self.host_time(frame.batch['timestamp'][0]) \
+            if len(frame.batch['timestamp']) else frame.t_first
+        return SensorFrame(self.name, frame.frame_id, t0, points)
+
+
+def load_sensors(path):
+    """
+    Reads a multi-sensor JSON config:
+        {"window_ms": 50, "max_wait_ms": 300,
+         "sensors": [{"name": "north", "port": 2368,
+                      "calibration": {"data_order": ..., "firing_sequence": ...,
+                                      "timing_offsets": ..., "xml": ...},
+                      "pose": {"x": 0, "y": 0, "z": 5.2, "yaw": 90}}, ...]}
+    calibration entries default to the bundled CSVs ("xml" replaces the
+    Data Order CSV); sensors sharing the same files share one Calibration.
+    Returns (sensors, window_s, max_wait_s).
+    """
+    with open(path) as f:
+        cfg = json.load(f)
+    entries = cfg.get('sensors') or []
+    if not entries:
+        raise ValueError(f"{path}: no sensors configured")
+
+    calibs, sensors, ports = {}, [], set()
+    for i, entry in enumerate(entries):
+        name  = entry.get('name', f"sensor{i}")
+        port  = int(entry.get('port', VELODYNE_PORT))
+        if port in ports:
+            raise ValueError(f"{path}: port {port} used by more than one sensor")
+        ports.add(port)
+        cal   = entry.get('calibration') or {}
+        files = (cal.get('data_order', DATA_ORDER_PATH),
+                 cal.get('firing_sequence', FIRING_SEQUENCE_PATH),
+                 cal.get('timing_offsets', TIMING_OFFSETS_PATH),
+                 cal.get('xml'))
+        if files not in calibs:
+            calibs[files] = Calibration.load(*files[:3], xml_path=files[3])
+        sensors.append(Sensor(i, name, port, calibs[files], pose_matrix(entry.get('pose'))))
+    window   = cfg.get('window_ms', MERGE_WINDOW_S * 1e3) / 1e3
+    max_wait = cfg.get('max_wait_ms', MAX_WAIT_S * 1e3) / 1e3
+    return sensors, window, max_wait
+
+
+class FrameMerger:
+    """
+    Groups SensorFrames from several sensors by time. A group starts at
+    the earliest pending frame and takes each sensor's oldest pending
+    frame within `window` seconds of it. A group is emitted once no other
+    sensor can still contribute: every sensor has a pending frame, is
+    assembling a revolution that started after the window, or is silent
+    (its last decoded packet is more than `max_wait` behind the most
+    recent one of any sensor). Silent sensors are reported as missing.
+    All decisions use the sensors' packet times, not the wall clock, so
+    a pipeline running behind does not split groups.
+    """
+
+    def __init__(self, sensors, window=MERGE_WINDOW_S, max_wait=MAX_WAIT_S):
+        self.sensors  = list(sensors)
+        self.names    = [s.name for s in self.sensors]
+        self.window   = window
+        self.max_wait = max_wait
+        self.pending  = {n: deque() for n in self.names}
+        self.merged   = 0
+        self.partial  = 0
+
+    def push(self, frame):
+        self.pending[frame.sensor].append(frame)
+
+    def _waiting_for(self, sensor, t0):
+        if self.pending[sensor.name] or sensor.watermark is None:
+            return False
+        latest = max(s.watermark for s in self.sensors if s.watermark is not None)
+        if latest - sensor.watermark > self.max_wait:
+            return False
+        start = sensor.open_time()
+        return start is None or start - t0 <= self.window
+
+    def pop(self, force=False):
+        """
+        Returns the MergedFrames that are complete; with force, everything
+        still pending.
+        """
+        out = []
+        while True:
+            heads = [q[0] for q in self.pending.values() if q]
+            if not heads:
+                return out
+            t0 = min(f.time for f in heads)
+            if not force and any(self._waiting_for(s, t0) for s in self.sensors):
+                return out
+            group = [self.pending[f.sensor].popleft() for f in heads if f.time - t0 <= self.window]
+            out.append(self._merge(group))
+
+    def _merge(self, group):
+        times   = [f.time for f in group]
+        missing = [n for n in self.names if n not in {f.sensor for f in group}]
+        points  = {k: np.concatenate([f.points[k] for f in group]) for k in FRAME_COLUMNS}
+        points['sensor'] = np.concatenate([np.full(len(f.points['x']), self.names.index(f.sensor),
+                                                   dtype=np.uint8) for f in group])
+        merged = MergedFrame(self.merged, points,
+                             [f._replace(points=None) for f in group],
+                             missing, max(times) - min(times))
+        self.merged  += 1
+        self.partial += bool(missing)
+        return merged
@@ -0,0 +1,181 @@
+# pipeline/replay.py
+
+import sys
+import time
+import socket
+import struct
+import argparse
+
+import numpy as np
+
+from decoder.pcap_reader import PcapReader, VELODYNE_PORT, PAYLOAD_SIZE
+
+HOUR_US          = 3_600_000_000
+TIMESTAMP_OFFSET = 1200      # packet footer: u32 µs past the hour
+SLEEP_MIN_S      = 0.001     # shorter waits are not slept: the packet goes out late instead
+SNDBUF           = 4 * 1024 * 1024
+
+
+class PcapReplayer:
+    """
+    Sends the Velodyne payloads of a capture file to a UDP address (by
+    default the local live pipeline), reproducing the recorded timing.
+      - speed: multiple of the recorded rate (2 = twice as fast);
+               0 sends as fast as the socket allows
+      - loops: passes over the file, 0 = until run() is stopped
+    Packets are paced against their capture times: the sender sleeps
+    while ahead of schedule and sends back-to-back while behind, so the
+    average rate holds even though single sleeps are coarse. From the
+    second pass on, the sensor timestamps are shifted by the length of
+    the recording so the stream stays monotonic for continuity checks
+    (the azimuth jumps once per pass, which ends one partial frame).
+    `sent`, `loop` and `max_lag` can be read from another thread while
+    run() is going.
+    """
+
+    def __init__(self, path, host="127.0.0.1", port=VELODYNE_PORT, speed=1.0, loops=1,
+                 pcap_port=VELODYNE_PORT):
+        if speed < 0:
+            raise ValueError("speed must be >= 0")
+        self.path  = path
+        self.dest  = (host, port)
+        self.speed = speed
+        self.loops = loops
+
+        self._reader = PcapReader(path, port=pcap_port)
+        _, self.offsets, stamps = self._reader.scan_offsets()
+        if len(self.offsets) == 0:
+            self._reader.close()
+            raise ValueError(f"{path}: no {PAYLOAD_SIZE}-byte Velodyne payloads found")
+        payloads = self._reader.payload_array(self.offsets)
+        sensor   = payloads[:, TIMESTAMP_OFFSET:TIMESTAMP_OFFSET + 4].copy().view('<u4').ravel()
+        self.sensor_ts = sensor.astype(np.int64)
+
+        # Schedule: capture times, or the sensor clock if the capture has none
+        step   = np.diff(self.sensor_ts) % HOUR_US
+        period = float(np.median(step)) * 1e-6 if len(step) else 0.0
+        rel    = stamps - stamps[0]
+        if len(rel) > 1 and rel[-1] <= 0:
+            rel = np.concatenate(([0], np.cumsum(step))) * 1e-6
+        self.times   = rel
+        self.span_s  = float(rel[-1]) + period        # one pass, incl. the last packet's slot
+        self.span_us = int(round(self.span_s * 1e6))
+
+        self.sent     = 0
+        self.errors   = 0
+        self.loop     = 0
+        self.max_lag  = 0.0
+        self.elapsed  = 0.0
+
+    @property
+    def packets(self):
+        return len(self.offsets)
+
+    @property
+    def rate(self):
+        """
+        Packet rate of the recording at the configured speed (pkt/s), or
+        None for as-fast-as-possible.
+        """
+        if not self.speed or self.span_s <= 0:
+            return None
+        return self.packets / self.span_s * self.speed
+
+    def run(self, duration=None, stop=None):
+        """
+        Replays until the configured loops are done, `duration` seconds
+        have passed or the `stop` event is set. Returns stats().
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SNDBUF)
+        t0   = time.perf_counter()
+        try:
+            self._send(sock, t0, None if duration is None else t0 + duration, stop)
+        finally:
+            self.elapsed = time.perf_counter() - t0
+            sock.close()
+        return self.stats()
+
+    def _send(self, sock, t0, end, stop):
+        view  = self._reader._view
+        buf   = bytearray(PAYLOAD_SIZE)
+        offs  = self.offsets.tolist()
+        times = self.times.tolist()
+        while not self.loops or self.loop < self.loops:
+            shift = self.loop * self.span_us
+            base  = self.loop * self.span_s
+            for i, off in enumerate(offs):
+                now = time.perf_counter()
+                if end is not None and now >= end or stop is not None and stop.is_set():
+                    return
+                if self.speed:
+                    wait = t0 + (base + times[i]) / self.speed - now
+                    if wait > SLEEP_MIN_S:
+                        time.sleep(wait)
+                    elif -wait > self.max_lag:
+                        self.max_lag = -wait
+                payload = view[off:off + PAYLOAD_SIZE]
+                if shift:
+                    buf[:] = payload
+                    struct.pack_into('<I', buf, TIMESTAMP_OFFSET,
+                                     (int(self.sensor_ts[i]) + shift) % HOUR_US)
+                    payload = buf
+                try:
+                    sock.sendto(payload, self.dest)
+                    self.sent += 1
+                except OSError:
+                    self.errors += 1   # ENOBUFS etc.: counted as not sent
+            self.loop += 1
+
+    def stats(self):
+        elapsed = self.elapsed or 0.0
+        return {
+            'sent':      self.sent,
+            'errors':    self.errors,
+            'loops':     self.loop,
+            'elapsed_s': elapsed,
+            'rate':      self.sent / elapsed if elapsed else 0.0,
+            'target':    self.rate,
+            'max_lag_s': self.max_lag,
+        }
+
+    def close(self):
+        self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a VLP-32C capture to a UDP port")
+    parser.add_argument("pcap",               help="pcap/pcapng capture (recorded or synthetic)")
+    parser.add_argument("--host",             default="127.0.0.1", help="destination address")
+    parser.add_argument("-p", "--port",       type=int, default=VELODYNE_PORT,
+                        help="destination UDP port")
+    parser.add_argument("--pcap-port",        type=int, default=VELODYNE_PORT,
+                        help="UDP port of the packets in the capture")
+    parser.add_argument("-s", "--speed",      type=float, default=1.0,
+                        help="multiple of the recorded rate, 0 = as fast as possible")
+    parser.add_argument("-l", "--loops",      type=int, default=1,
+                        help="passes over the capture, 0 = until --duration or Ctrl-C")
+    parser.add_argument("-d", "--duration",   type=float,
+                        help="stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    with PcapReplayer(args.pcap, host=args.host, port=args.port, speed=args.speed,
+                      loops=args.loops, pcap_port=args.pcap_port) as replayer:
+        target = f"{replayer.rate:.0f} pkt/s" if replayer.rate else "max rate"
+        print(f"[REPLAY] {replayer.packets} packets ({replayer.span_s:.1f}s) -> "
+              f"{args.host}:{args.port} at {target}", file=sys.stderr)
+        try:
+            stats = replayer.run(duration=args.duration)
+        except KeyboardInterrupt:
+            stats = replayer.stats()
+        print(f"[REPLAY] {stats}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# pipeline/segment_pool.py
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+OVERLOAD_POLICIES   = ("block", "drop-oldest", "skip-decode")
+DEFAULT_WORKERS     = 2
+DEFAULT_MAX_PENDING = 4     # segments waiting for a worker
+DEFAULT_DRAIN_S     = 10.0  # max wait for pending conversions at shutdown
+
+log = logging.getLogger(__name__)
+
+
+class SegmentPool:
+    """
+    Fixed set of conversion threads fed through a bounded hand-off queue.
+    submit(seg_path, *args) queues convert(seg_path, *args); a conversion
+    that raises or returns False is counted in `failed`. When
+    `max_pending` segments are already waiting, `policy` decides:
+      - block:       the caller waits for a free slot
+      - drop-oldest: the oldest waiting segment is discarded (its raw PCAP
+                     is deleted) to make room for the new one
+      - skip-decode: the new segment is not converted; its raw PCAP is kept
+    Every shed segment is logged and counted in `shed` by reason.
+    close() stops accepting work, drains the queue for at most
+    `drain_timeout` seconds, sheds what is left ('shutdown') and joins;
+    conversions still running then are logged by segment name, as their
+    frame files may be incomplete.
+    """
+
+    def __init__(self, convert, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 policy="block"):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"policy must be one of {OVERLOAD_POLICIES}")
+        self.convert     = convert
+        self.max_pending = max(1, max_pending)
+        self.policy      = policy
+
+        self.submitted = 0
+        self.converted = 0
+        self.failed    = 0
+        self.shed      = {'drop-oldest': 0, 'skip-decode': 0, 'shutdown': 0}
+        self.busy      = 0
+        self.running   = set()     # segment paths being converted
+
+        self._jobs    = deque()
+        self._cond    = threading.Condition()
+        self._closing = False
+        self._threads = [threading.Thread(target=self._run, name=f"segment-worker-{i}",
+                                          daemon=True)
+                         for i in range(max(1, workers))]
+        for t in self._threads:
+            t.start()
+
+    def pending(self):
+        return len(self._jobs)
+
+    def submit(self, seg_path, *args):
+        """
+        Queues a segment for conversion. Returns False if it was shed.
+        """
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("SegmentPool is closed")
+            self.submitted += 1
+            if len(self._jobs) >= self.max_pending:
+                if self.policy == "block":
+                    while len(self._jobs) >= self.max_pending:
+                        self._cond.wait()
+                elif self.policy == "drop-oldest":
+                    old = self._jobs.popleft()
+                    self._shed(old[0], "drop-oldest")
+                    try:
+                        os.remove(old[0])
+                    except OSError:
+                        pass
+                else:
+                    self._shed(seg_path, "skip-decode")
+                    return False
+            self._jobs.append((seg_path,) + args)
+            self._cond.notify_all()
+            return True
+
+    def _shed(self, seg_path, reason):
+        self.shed[reason] += 1
+        kept = "deleted" if reason == "drop-oldest" else "raw PCAP kept"
+        log.warning(f"[POOL] Shed segment {os.path.basename(seg_path)} "
+                    f"({reason}, {kept}; {self.pending()} pending, {self.busy} busy)")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closing:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                job = self._jobs.popleft()
+                self.busy += 1
+                self.running.add(job[0])
+                self._cond.notify_all()
+            try:
+                ok = self.convert(*job) is not False
+            except Exception as e:
+                log.error(f"[POOL] Conversion of {job[0]} failed: {e}")
+                ok = False
+            with self._cond:
+                self.busy -= 1
+                self.running.discard(job[0])
+                if ok:
+                    self.converted += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def close(self, drain_timeout=DEFAULT_DRAIN_S):
+        """
+        Waits up to drain_timeout seconds for queued and running conversions,
+        sheds the segments still waiting, and joins the workers. A conversion
+        still running after the deadline is abandoned (daemon thread) and
+        its segment is logged.
+        Returns stats().
+        """
+        deadline = time.monotonic() + drain_timeout
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            while self._jobs or self.busy:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            while self._jobs:
+                self._shed(self._jobs.popleft()[0], "shutdown")
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        if any(t.is_alive() for t in self._threads):
+            with self._cond:
+                names = sorted(os.path.basename(p) for p in self.running)
+            log.warning(f"[POOL] {len(names)} conversion(s) still running after "
+                        f"{drain_timeout:.1f}s drain timeout, frames may be incomplete: "
+                        f"{', '.join(names)}")
+        return self.stats()
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'converted': self.converted,
+            'failed':    self.failed,
+            'shed':      dict(self.shed),
+            'pending':   self.pending(),
+            'busy':      self.busy,
+        }
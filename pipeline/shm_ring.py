@@ -0,0 +1,354 @@
+# pipeline/shm_ring.py
+
+import os
+import sys
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from decoder.coordinate_transform import FRAME_COLUMNS
+from decoder.frame_writers       import FRAME_DTYPE
+
+RING_MAGIC         = 0x4C524652   # 'RFRL'
+RING_VERSION       = 2
+DEFAULT_RING_NAME  = "lidar_frames"
+DEFAULT_SLOTS      = 8             # ~0.8 s of revolutions at 600 RPM
+DEFAULT_MAX_POINTS = 131072        # VLP-32C dual return peaks near 70k pts/frame at 600 RPM
+POLL_INTERVAL_S    = 0.0005
+
+# Start of the shared block
+RING_HEADER_DTYPE = np.dtype([
+    ('magic',      '<u4'),
+    ('version',    '<u4'),
+    ('slots',      '<u4'),
+    ('max_points', '<u4'),
+    ('slot_bytes', '<u8'),
+    ('head',       '<u8'),   # frames published so far
+    ('writer_pid', '<u4'),   # process that created the ring (0: unknown)
+], align=True)
+
+# Start of every slot, followed by max_points FRAME_DTYPE records
+SLOT_HEADER_DTYPE = np.dtype([
+    ('seq',       '<u8'),    # 2k+1 while frame k is written, 2k+2 once complete
+    ('frame_id',  '<i8'),
+    ('timestamp', '<f8'),    # receive time of the frame's first packet
+    ('published', '<f8'),    # time.time() at publish
+    ('n_points',  '<u4'),
+    ('truncated', '<u4'),    # points beyond max_points that were not stored
+], align=True)
+
+HEADER_BYTES      = 64
+SLOT_HEADER_BYTES = 64
+
+
+def _slot_bytes(max_points):
+    return SLOT_HEADER_BYTES + max_points * FRAME_DTYPE.itemsize
+
+
+def _attach(name):
+    """
+    Attaches to an existing block without handing it to this process's
+    resource tracker, which would otherwise unlink it when a reader exits.
+    (Readers started through multiprocessing share the writer's tracker on
+    Python < 3.13; they work, but the tracker logs a KeyError at unlink.)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:   # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass                # exists, owned by another user
+    return True
+
+
+def _stale_ring(name):
+    """
+    True if the existing block `name` is a frame ring whose writer process
+    has exited (left over from a run that did not shut down cleanly).
+    Anything else, such as a live ring or some other program's block, is
+    not stale.
+    """
+    shm = _attach(name)
+    try:
+        if shm.size < HEADER_BYTES:
+            return False
+        header = np.ndarray((), dtype=RING_HEADER_DTYPE, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    pid = int(header['writer_pid'])
+    return int(header['magic']) == RING_MAGIC and pid != 0 and not _pid_alive(pid)
+
+
+class FrameRingWriter:
+    """
+    Single publisher of decoded frames into a shared-memory ring of
+    `slots` fixed-size slots. Frame k goes to slot k % slots, overwriting
+    whatever was there: the writer never waits for readers.
+    Every slot starts with a SLOT_HEADER_DTYPE header whose `seq` works as
+    a seqlock: it is odd while the slot is being rewritten and 2k+2 once
+    frame k is complete, so readers can tell a finished frame from a torn
+    or overwritten one. Frames larger than max_points are truncated and
+    the dropped count is kept in the header.
+    An existing block of the same name is only replaced when it is a ring
+    whose writer has exited; otherwise FileExistsError is raised.
+    """
+
+    def __init__(self, name=DEFAULT_RING_NAME, slots=DEFAULT_SLOTS,
+                 max_points=DEFAULT_MAX_POINTS):
+        size = HEADER_BYTES + slots * _slot_bytes(max_points)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not _stale_ring(name):
+                raise FileExistsError(f"shared memory block '{name}' already exists and is "
+                                      f"not a stale frame ring: another writer may be using "
+                                      f"it; pick another name or remove /dev/shm/{name}")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name       = name
+        self.slots      = slots
+        self.max_points = max_points
+        self.published  = 0
+        self.truncated  = 0
+
+        buf = self._shm.buf
+        self._header = np.ndarray((), dtype=RING_HEADER_DTYPE, buffer=buf)
+        self._slot_headers, self._records = [], []
+        for i in range(slots):
+            off = HEADER_BYTES + i * _slot_bytes(max_points)
+            self._slot_headers.append(np.ndarray((), dtype=SLOT_HEADER_DTYPE,
+                                                 buffer=buf, offset=off))
+            self._records.append(np.ndarray(max_points, dtype=FRAME_DTYPE, buffer=buf,
+                                            offset=off + SLOT_HEADER_BYTES))
+        self._header['head']       = 0
+        self._header['slots']      = slots
+        self._header['max_points'] = max_points
+        self._header['slot_bytes'] = _slot_bytes(max_points)
+        self._header['version']    = RING_VERSION
+        self._header['writer_pid'] = os.getpid()
+        self._header['magic']      = RING_MAGIC   # last: readers check it first
+
+    def publish(self, points, frame_id, timestamp=0.0):
+        """
+        Copies one frame (dict of FRAME_COLUMNS arrays) into the next slot.
+        Returns the publish sequence number k.
+        """
+        k    = self.published
+        slot = k % self.slots
+        hdr  = self._slot_headers[slot]
+        n    = len(points['x'])
+        keep = min(n, self.max_points)
+
+        hdr['seq'] = 2 * k + 1
+        rec = self._records[slot]
+        for c in FRAME_COLUMNS:
+            rec[c][:keep] = points[c][:keep]
+        hdr['frame_id']  = frame_id
+        hdr['timestamp'] = timestamp
+        hdr['published'] = time.time()
+        hdr['n_points']  = keep
+        hdr['truncated'] = n - keep
+        hdr['seq']       = 2 * k + 2
+        self._header['head'] = k + 1
+
+        self.published += 1
+        self.truncated += n - keep
+        return k
+
+    def stats(self):
+        return {'name': self.name, 'slots': self.slots, 'max_points': self.max_points,
+                'published': self.published, 'truncated_points': self.truncated}
+
+    def close(self, unlink=True):
+        self._header = self._slot_headers = self._records = None
+        self._shm.close()
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingFrame:
+    """
+    One frame read from the ring. `points` is a FRAME_DTYPE view straight
+    into shared memory (no copy), so the writer may overwrite it once the
+    ring wraps around: check valid() after processing, or copy() first.
+    """
+
+    def __init__(self, seq, header, points, slot_header):
+        self.seq       = seq
+        self.frame_id  = int(header['frame_id'])
+        self.timestamp = float(header['timestamp'])
+        self.published = float(header['published'])
+        self.truncated = int(header['truncated'])
+        self.points    = points
+        self._slot     = slot_header
+
+    def __len__(self):
+        return len(self.points)
+
+    def valid(self):
+        """
+        True while the slot still holds this frame.
+        """
+        return int(self._slot['seq']) == 2 * self.seq + 2
+
+    def copy(self):
+        """
+        Private copy of the points, or None if the frame was overwritten
+        before the copy finished.
+        """
+        out = self.points.copy()
+        return out if self.valid() else None
+
+
+class FrameRingReader:
+    """
+    Consumer side: attaches to a ring created by FrameRingWriter, from any
+    process. read() waits for the next frame and returns it as a RingFrame
+    view. A reader that falls more than `slots` frames behind is detected
+    by the sequence numbers; it skips ahead to the oldest frame still in
+    the ring and the skipped frames are counted in `lapped`. Frames found
+    half-written or overwritten while being read count as `torn` and are
+    skipped the same way.
+      start='latest' begins with the next frame published, 'oldest' with
+      the oldest one still in the ring.
+    """
+
+    def __init__(self, name=DEFAULT_RING_NAME, start='latest'):
+        if start not in ('latest', 'oldest'):
+            raise ValueError("start must be 'latest' or 'oldest'")
+        self._shm = _attach(name)
+        buf = self._shm.buf
+        self._header = np.ndarray((), dtype=RING_HEADER_DTYPE, buffer=buf)
+        if int(self._header['magic']) != RING_MAGIC:
+            self._shm.close()
+            raise ValueError(f"{name}: not a frame ring (or not initialised yet)")
+        if int(self._header['version']) != RING_VERSION:
+            self._shm.close()
+            raise ValueError(f"{name}: unsupported ring version {int(self._header['version'])}")
+        self.name       = name
+        self.slots      = int(self._header['slots'])
+        self.max_points = int(self._header['max_points'])
+        slot_bytes      = int(self._header['slot_bytes'])
+
+        self._slot_headers, self._records = [], []
+        for i in range(self.slots):
+            off = HEADER_BYTES + i * slot_bytes
+            self._slot_headers.append(np.ndarray((), dtype=SLOT_HEADER_DTYPE,
+                                                 buffer=buf, offset=off))
+            self._records.append(np.ndarray(self.max_points, dtype=FRAME_DTYPE, buffer=buf,
+                                            offset=off + SLOT_HEADER_BYTES))
+
+        head = int(self._header['head'])
+        self.next   = head if start == 'latest' else max(0, head - self.slots + 1)
+        self.read_count = 0
+        self.lapped = 0
+        self.torn   = 0
+
+    def behind(self):
+        """
+        Frames published but not read yet.
+        """
+        return int(self._header['head']) - self.next
+
+    def _skip_to(self, k):
+        self.lapped += k - self.next
+        self.next    = k
+
+    def try_read(self):
+        """
+        Returns the next frame, or None if it has not been published yet.
+        """
+        while True:
+            head = int(self._header['head'])
+            if self.next >= head:
+                return None
+            # Keep one slot of headroom: the slot after the oldest may be
+            # the one being rewritten right now
+            oldest = head - self.slots + 1
+            if self.next < oldest:
+                self._skip_to(oldest)
+
+            k    = self.next
+            hdr  = self._slot_headers[k % self.slots]
+            seq  = int(hdr['seq'])
+            if seq != 2 * k + 2:
+                if seq > 2 * k + 2:       # overwritten by a later frame
+                    self.torn += 1
+                    self.next += 1
+                    continue
+                return None               # still being written
+            meta   = hdr.copy()
+            points = self._records[k % self.slots][:int(meta['n_points'])]
+            if int(hdr['seq']) != seq:    # rewritten while reading the header
+                self.torn += 1
+                self.next += 1
+                continue
+            self.next += 1
+            self.read_count += 1
+            return RingFrame(k, meta, points, hdr)
+
+    def read(self, timeout=None):
+        """
+        Waits up to `timeout` seconds (forever if None) for the next frame.
+        Returns a RingFrame, or None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.try_read()
+            if frame is not None:
+                return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL_S)
+
+    def __iter__(self):
+        while True:
+            yield self.read()
+
+    def stats(self):
+        return {'name': self.name, 'read': self.read_count, 'lapped': self.lapped,
+                'torn': self.torn, 'behind': self.behind()}
+
+    def close(self):
+        self._header = self._slot_headers = self._records = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass   # RingFrame views still alive; released with them
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    # Minimal consumer: python -m pipeline.shm_ring [name]
+    name = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_RING_NAME
+    with FrameRingReader(name) as reader:
+        try:
+            while True:
+                frame = reader.read(timeout=1.0)
+                if frame is None:
+                    continue
+                age = time.time() - frame.published
+                print(f"frame {frame.frame_id}: {len(frame)} pts, age {age * 1e3:.2f} ms, "
+                      f"valid={frame.valid()} {reader.stats()}")
+        except KeyboardInterrupt:
+            pass
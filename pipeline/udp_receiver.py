@@ -0,0 +1,187 @@
+# pipeline/udp_receiver.py
+
+import os
+import select
+import socket
+import threading
+import time
+
+import numpy as np
+
+from decoder.packet_parser import PACKET_SIZE
+from decoder.pcap_reader   import VELODYNE_PORT
+
+DEFAULT_RCVBUF     = 32 * 1024 * 1024   # bytes requested for SO_RCVBUF
+DEFAULT_RING_SLOTS = 65536              # ~36 s of packets at 1,808 pkt/s
+MAX_BATCH          = 512                # datagrams drained per wakeup
+
+
+class PacketRing:
+    """
+    Preallocated single-producer / single-consumer ring of packet slots.
+    The producer receives straight into a slot (no per-packet objects);
+    `head` and `tail` are running totals, so head - tail is the fill level.
+    When the ring is full new packets are dropped and counted as overruns.
+    `ready` is the event set when packets arrive; rings read by one
+    consumer (several sensors) can share it so the consumer waits on all.
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_SLOTS, packet_size=PACKET_SIZE, ready=None):
+        self.capacity    = capacity
+        self.packet_size = packet_size
+        # One spare byte per slot so oversized datagrams show up as the wrong length
+        self.slots    = np.zeros((capacity, packet_size + 1), dtype=np.uint8)
+        self.stamps   = np.zeros(capacity, dtype=np.float64)
+        self.head     = 0
+        self.tail     = 0
+        self.overruns = 0
+        self._ready   = ready if ready is not None else threading.Event()
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def write_slot(self):
+        """
+        Returns a writable memoryview of the next free slot, or None if full.
+        """
+        if self.head - self.tail >= self.capacity:
+            return None
+        return memoryview(self.slots[self.head % self.capacity])
+
+    def commit(self, stamp):
+        self.stamps[self.head % self.capacity] = stamp
+        self.head += 1
+
+    def notify(self):
+        self._ready.set()
+
+    def read(self, max_items=None, timeout=None):
+        """
+        Pops up to max_items packets. Waits up to `timeout` seconds if the
+        ring is empty. Returns (payloads (n, packet_size) uint8 copy,
+        receive timestamps (n,) float64).
+        """
+        if self.head == self.tail and timeout:
+            self._ready.wait(timeout)
+        self._ready.clear()
+
+        n = self.head - self.tail
+        if max_items is not None:
+            n = min(n, max_items)
+        idx = (self.tail + np.arange(n)) % self.capacity
+        payloads = self.slots[idx, :self.packet_size]
+        stamps   = self.stamps[idx]
+        self.tail += n
+        return payloads, stamps
+
+
+class UdpReceiver:
+    """
+    Plain UDP socket capture for Velodyne packets.
+    A background thread waits for the socket to become readable, then drains
+    up to MAX_BATCH datagrams with non-blocking recv_into() straight into
+    PacketRing slots, stamping each with its receive time.
+    Datagrams that are not exactly packet_size bytes are counted and ignored.
+    """
+
+    def __init__(self, port=VELODYNE_PORT, host="", rcvbuf=DEFAULT_RCVBUF, ring=None):
+        self.port   = port
+        self.host   = host
+        self.rcvbuf = rcvbuf
+        self.ring   = ring if ring is not None else PacketRing()
+
+        self.received      = 0
+        self.ignored       = 0
+        self.wakeups       = 0
+        self.rcvbuf_actual = None
+
+        self._sock   = None
+        self._inode  = None
+        self._drops  = None
+        self._thread = None
+        self._stop   = threading.Event()
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        sock.bind((self.host, self.port))
+        sock.setblocking(False)
+        self._sock  = sock
+        self._inode = os.fstat(sock.fileno()).st_ino
+        # Linux reports twice the requested size (bookkeeping overhead included)
+        self.rcvbuf_actual = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+        self._thread = threading.Thread(target=self._run, name="udp-receiver", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._sock is not None:
+            # Keep the final drop count readable once the socket is gone
+            self._drops = self.kernel_drops()
+            self._sock.close()
+            self._sock = None
+
+    def _run(self):
+        sock, ring, size = self._sock, self.ring, self.ring.packet_size
+        now = time.time
+        while not self._stop.is_set():
+            readable, _, _ = select.select([sock], [], [], 0.1)
+            if not readable:
+                continue
+            self.wakeups += 1
+            for _ in range(MAX_BATCH):
+                slot = ring.write_slot()
+                try:
+                    if slot is None:
+                        # Ring full: drain the datagram so the kernel buffer keeps moving
+                        sock.recv(size + 1)
+                        ring.overruns += 1
+                        continue
+                    n = sock.recv_into(slot)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    if self._stop.is_set():
+                        return
+                    raise
+                if n != size:
+                    self.ignored += 1
+                    continue
+                ring.commit(now())
+                self.received += 1
+            ring.notify()
+
+    def kernel_drops(self):
+        """
+        Returns the kernel's drop counter for this socket (Linux
+        /proc/net/udp), or None where it is not available. After stop()
+        the last value read is returned.
+        """
+        if self._sock is None:
+            return self._drops
+        try:
+            with open("/proc/net/udp") as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if fields[9] == str(self._inode):
+                        return int(fields[-1])
+        except (OSError, IndexError, ValueError):
+            pass
+        return None
+
+    def stats(self):
+        return {
+            'received':      self.received,
+            'ignored':       self.ignored,
+            'wakeups':       self.wakeups,
+            'ring_fill':     len(self.ring),
+            'ring_overruns': self.ring.overruns,
+            'kernel_drops':  self.kernel_drops(),
+            'rcvbuf':        self.rcvbuf_actual,
+        }
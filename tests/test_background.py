@@ -0,0 +1,99 @@
+# tests/test_background.py
+
+import numpy as np
+import pytest
+
+from decoder.background  import BackgroundModel, AZ_BINS
+from decoder.calibration import NUM_CHANNELS
+
+
+def _scene(distance, lasers=range(NUM_CHANNELS)):
+    """
+    One return per laser and 0.2° azimuth bin at `distance` m (scalar or
+    (32, AZ_BINS) grid), in compute_points() columns.
+    """
+    laser, az_bin = np.meshgrid(np.asarray(lasers), np.arange(AZ_BINS), indexing='ij')
+    dist = np.broadcast_to(np.asarray(distance, dtype=np.float64),
+                           (NUM_CHANNELS, AZ_BINS))[laser, az_bin]
+    return {
+        'laser_id':   laser.ravel(),
+        'azimuth':    (az_bin.ravel() * 36000 // AZ_BINS + 5).astype(np.uint16),
+        'distance_m': dist.ravel(),
+    }
+
+
+@pytest.fixture
+def walls():
+    rng = np.random.default_rng(0)
+    return rng.uniform(10, 80, (NUM_CHANNELS, AZ_BINS))
+
+
+def _learned(walls, frames=5, **kwargs):
+    model = BackgroundModel(warmup_frames=frames, **kwargs)
+    rng   = np.random.default_rng(1)
+    for i in range(frames):
+        ready = model.learn(_scene(walls + rng.normal(0, 0.05, walls.shape)))
+        assert ready == (i == frames - 1)
+    return model
+
+
+def test_learn_and_subtract(walls):
+    model = _learned(walls)
+    assert model.coverage() == 1.0
+    np.testing.assert_allclose(model.range, walls, atol=0.2)
+
+    scene = _scene(walls)
+    near  = np.zeros(walls.shape, dtype=bool)
+    near[:, 100:200] = True                  # an object 5 m in front of the walls
+    scene['distance_m'][near.ravel()] -= 5.0
+    fg, removed = model.subtract(scene)
+    assert removed == (~near).sum() and len(fg['distance_m']) == near.sum()
+    assert (model.removed, model.kept) == (removed, near.sum())
+
+
+def test_margin(walls):
+    """
+    Returns just in front of the background stay background: the margin is
+    max(margin, margin_rel * background).
+    """
+    model = _learned(np.full_like(walls, 50.0), margin=0.5, margin_rel=0.02)
+    fg, _ = model.subtract(_scene(50.0 - np.where(np.arange(AZ_BINS) % 2, 0.6, 1.4)))
+    assert len(fg['distance_m']) == NUM_CHANNELS * AZ_BINS // 2
+    assert (fg['distance_m'] < 49.0).all()
+
+
+def test_unseen_cells_are_foreground(walls):
+    """
+    Cells hit in too few warm-up frames have no background; every return
+    there is kept.
+    """
+    model = BackgroundModel(warmup_frames=4)
+    for _ in range(3):
+        model.learn(_scene(walls, lasers=range(16)))
+    model.learn(_scene(walls))
+    assert model.ready and model.coverage() == pytest.approx(0.5)
+    fg, removed = model.subtract(_scene(walls))
+    assert removed == 16 * AZ_BINS
+    assert (fg['laser_id'] >= 16).all() and len(fg['laser_id']) == 16 * AZ_BINS
+
+
+def test_streaming_update_and_save(walls, tmp_path):
+    model = BackgroundModel(warmup_frames=2, update=True, update_alpha=0.5)
+    for _ in range(2):
+        points, removed = model.apply(_scene(walls))
+        assert removed == 0 and len(points['distance_m']) == walls.size
+    assert model.ready
+
+    # A wall moved 10 m back is absorbed by the EMA updates
+    for _ in range(12):
+        model.apply(_scene(walls + 10.0))
+    np.testing.assert_allclose(model.range, walls + 10.0, atol=0.01)
+
+    path = str(tmp_path / "bg.npz")
+    model.save(path)
+    loaded = BackgroundModel.open(path, margin=1.0)
+    np.testing.assert_array_equal(loaded.range, model.range)
+    assert loaded.margin == 1.0 and loaded.margin_rel == model.margin_rel
+    assert not BackgroundModel.open(str(tmp_path / "missing.npz")).ready
+    with pytest.raises(RuntimeError):
+        BackgroundModel().subtract(_scene(walls))
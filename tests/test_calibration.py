@@ -0,0 +1,84 @@
+# tests/test_calibration.py
+
+import numpy as np
+import pytest
+
+from decoder.calibration import (
+    Calibration, CALIB_XML_PATH, TIMING_OFFSETS_PATH, NUM_CHANNELS, NUM_BLOCKS,
+    load_data_order_and_angles, load_firing_sequence, load_timing_offsets,
+)
+
+
+@pytest.fixture(scope="module")
+def csv_calib():
+    return Calibration.load(cache_dir=None)
+
+
+def test_xml_matches_csv(csv_calib):
+    xml = Calibration.load(xml_path=CALIB_XML_PATH, cache_dir=None)
+    for name in ('laser_id', 'vertical_angle', 'azimuth_offset', 'cos_elev', 'sin_elev', 'timing'):
+        np.testing.assert_allclose(getattr(xml, name), getattr(csv_calib, name),
+                                   rtol=0, atol=1e-9, err_msg=name)
+
+
+def test_tables_match_dict_loaders(csv_calib):
+    """
+    The dense tables hold what the per-point path looked up in the dicts.
+    """
+    laser_map, vertical_angles, azimuth_offsets = load_data_order_and_angles()
+    firing_seq = load_firing_sequence()
+    timing     = load_timing_offsets()
+    seq_rows   = (dict(zip(firing_seq['Laser ID'], firing_seq.index)),
+                  dict(zip(firing_seq['Laser ID 2'], firing_seq.index)))
+    for ch in range(NUM_CHANNELS):
+        lid = laser_map[ch]
+        assert csv_calib.laser_id[ch] == lid
+        assert csv_calib.vertical_angle[ch] == vertical_angles[lid]
+        assert csv_calib.azimuth_offset[ch] == azimuth_offsets[lid]
+        for ret in (0, 1):
+            for col in range(NUM_BLOCKS):
+                # pandas' default float parser may be one ulp off the text
+                assert csv_calib.timing[ret, col, ch] == pytest.approx(
+                    timing[seq_rows[ret][lid]][col], rel=0, abs=1e-9)
+
+
+def test_cache(tmp_path, csv_calib):
+    first = Calibration.load(cache_dir=str(tmp_path))
+    assert first.cache_path is None
+    again = Calibration.load(cache_dir=str(tmp_path))
+    assert again.cache_path is not None and again.cache_path.startswith(str(tmp_path))
+    np.testing.assert_array_equal(again.timing, csv_calib.timing)
+    np.testing.assert_array_equal(again.vertical_angle, csv_calib.vertical_angle)
+
+
+def test_cache_invalidation(tmp_path, csv_calib):
+    """
+    The cache is keyed by the source file contents; an unusable cache
+    location only disables caching.
+    """
+    timing = tmp_path / "timing.csv"
+    timing.write_text(open(TIMING_OFFSETS_PATH).read())
+    cache  = str(tmp_path / "cache")
+    Calibration.load(timing_offsets_path=str(timing), cache_dir=cache)
+    before = Calibration.load(timing_offsets_path=str(timing), cache_dir=cache)
+    assert before.cache_path is not None
+
+    rows = timing.read_text().splitlines()
+    rows[0] = ",".join(["0"] * NUM_BLOCKS)
+    timing.write_text("\n".join(rows) + "\n")
+    after = Calibration.load(timing_offsets_path=str(timing), cache_dir=cache)
+    assert after.cache_path is None
+    assert not np.array_equal(after.timing, before.timing)
+
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    calib = Calibration.load(cache_dir=str(blocked / "cache"))
+    assert calib.cache_path is None
+    np.testing.assert_array_equal(calib.timing, csv_calib.timing)
+
+
+def test_bad_shapes():
+    with pytest.raises(ValueError):
+        Calibration(np.zeros((32, 3)), np.zeros((31, 2)), np.zeros((32, 12)))
+    with pytest.raises(ValueError):
+        Calibration(np.zeros((32, 3)), np.zeros((32, 2)), np.zeros((32, 6)))
@@ -0,0 +1,92 @@
+# tests/test_continuity.py
+
+import numpy as np
+import pytest
+
+from decoder.continuity      import ContinuityChecker
+from decoder.frame_assembler import FrameAssembler
+from decoder.packet_parser   import parse_packets
+from decoder.synthetic       import generate_packets
+
+N_PACKETS = 1500     # 5 revolutions of dual-return packets at 600 RPM
+
+
+@pytest.fixture(scope="module")
+def packets():
+    return generate_packets(N_PACKETS)
+
+
+def _check(pkts, batch=None):
+    checker = ContinuityChecker()
+    step    = batch or len(pkts)
+    frames  = [f for i in range(0, len(pkts), step) for f in checker.check(pkts[i:i + step])]
+    last    = checker.flush()
+    return frames + ([last] if last is not None else []), checker.summary()
+
+
+def test_clean_capture(packets):
+    frames, summary = _check(packets)
+    assembler = FrameAssembler()
+    expected  = [f.frame_id for f in assembler.push(parse_packets(packets))]
+    expected.append(assembler.flush().frame_id)
+    assert [f.frame_id for f in frames] == expected
+    assert all(f.complete for f in frames[:-1])
+    assert sum(f.packets for f in frames) == N_PACKETS
+    assert (summary['missing'], summary['duplicates'], summary['out_of_order'],
+            summary['az_jumps'], summary['irregular']) == (0, 0, 0, 0, 0)
+    assert summary['loss_ratio'] == 0.0
+
+
+def _lossy_order():
+    """
+    Packet order with 3 + 1 packets lost, one duplicated and one pair swapped.
+    """
+    keep = np.ones(N_PACKETS, dtype=bool)
+    keep[100:103] = False
+    keep[1000]    = False
+    order = np.flatnonzero(keep).tolist()
+    order.insert(order.index(500) + 1, 500)
+    i = order.index(800)
+    order[i], order[i + 1] = order[i + 1], order[i]
+    return order
+
+
+@pytest.mark.parametrize("batch", [7, 128])
+def test_gaps_duplicates_reordering(packets, batch):
+    """
+    Lost, duplicated and swapped packets are counted once each, whatever
+    the batching. A repeated or late packet steps the azimuth back, which
+    the rollover rule shared with FrameAssembler treats as a new
+    revolution, so frame ids still match the decoder's.
+    """
+    pkts            = packets[_lossy_order()]
+    frames, summary = _check(pkts, batch)
+    assert frames == _check(pkts)[0]
+
+    assembler = FrameAssembler()
+    expected  = [f.frame_id for f in assembler.push(parse_packets(pkts))]
+    expected.append(assembler.flush().frame_id)
+    assert [f.frame_id for f in frames] == expected
+
+    assert (frames[0].missing, frames[0].complete) == (3, False)
+    assert sum(f.duplicates for f in frames) == 1
+    assert sum(f.out_of_order for f in frames) == 1
+    assert summary['packets'] == N_PACKETS - 4 + 1
+    # The late packet fills the hole it left: 4 lost in total, not 5
+    assert (summary['missing'], summary['duplicates'], summary['out_of_order']) == (4, 1, 1)
+    assert summary['loss_ratio'] == pytest.approx(4 / (N_PACKETS - 3 + 4))
+
+
+def test_azimuth_jump(packets):
+    """
+    A packet that jumps ahead in azimuth without a timestamp gap is
+    flagged, and its frame is not complete.
+    """
+    pkts   = packets.copy()
+    blocks = pkts[:, :1200].reshape(N_PACKETS, 12, 100)
+    az     = (blocks[400, :, 2].astype(np.int64) | blocks[400, :, 3].astype(np.int64) << 8)
+    az     = (az + 9000) % 36000
+    blocks[400, :, 2], blocks[400, :, 3] = az & 0xFF, az >> 8
+    frames, summary = _check(pkts)
+    assert summary['az_jumps'] >= 1 and summary['missing'] == 0
+    assert any(f.az_jumps and not f.complete for f in frames)
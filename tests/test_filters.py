@@ -0,0 +1,88 @@
+# tests/test_filters.py
+
+import pickle
+
+import numpy as np
+import pytest
+
+from decoder.filters import FrameFilter, points_in_polygon, voxel_downsample
+
+# Concave "U": the notch between x = 1..2 above y = 1 is outside
+U_SHAPE = [(0, 0), (3, 0), (3, 3), (2, 3), (2, 1), (1, 1), (1, 3), (0, 3)]
+
+
+def _points(x, y, z=None, distance_m=None):
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    return {
+        'x':          x,
+        'y':          np.asarray(y, dtype=np.float64),
+        'z':          np.zeros(n) if z is None else np.asarray(z, dtype=np.float64),
+        'distance_m': np.ones(n) if distance_m is None else np.asarray(distance_m, dtype=np.float64),
+        'laser_id':   np.arange(n, dtype=np.int64),
+    }
+
+
+def test_polygon_even_odd():
+    x = np.array([0.5, 1.5, 2.5, 1.5, 4.0, -0.5, 0.5])
+    y = np.array([2.0, 2.0, 2.0, 0.5, 1.0,  1.0, 3.5])
+    np.testing.assert_array_equal(points_in_polygon(x, y, U_SHAPE),
+                                  [True, False, True, True, False, False, False])
+
+    # Self-intersecting pentagram: the inner pentagon crosses two edges, so is outside
+    star = [(np.cos(a), np.sin(a)) for a in np.pi / 2 + np.arange(5) * 4 * np.pi / 5]
+    np.testing.assert_array_equal(points_in_polygon(np.array([0.0, 0.0]), np.array([0.0, 0.8]),
+                                                    star), [False, True])
+
+
+def test_voxel_first():
+    pts = _points([0.1, 0.2, 1.5, 0.3, 1.6], [0.1, 0.1, 0.1, 0.4, 0.2], z=[0, 0, 0, 0, 0])
+    out = voxel_downsample(pts, 1.0, 'first')
+    np.testing.assert_array_equal(out['laser_id'], [0, 2])
+    np.testing.assert_array_equal(out['x'], [0.1, 1.5])
+
+
+def test_voxel_centroid():
+    pts = _points([0.1, 0.2, 1.5, 0.3, 1.6], [0.1, 0.1, 0.1, 0.4, 0.2], z=[0, 0.3, 0, 0.6, 0])
+    out = voxel_downsample(pts, [1.0, 1.0, 1.0], 'centroid')
+    # Coordinates are the voxel means, other columns from the first point
+    np.testing.assert_array_equal(out['laser_id'], [0, 2])
+    np.testing.assert_allclose(out['x'], [0.2, 1.55])
+    np.testing.assert_allclose(out['y'], [0.2, 0.15])
+    np.testing.assert_allclose(out['z'], [0.3, 0.0])
+    with pytest.raises(ValueError):
+        voxel_downsample(pts, 1.0, 'median')
+
+
+def test_filter_steps_and_totals():
+    rng = np.random.default_rng(0)
+    n   = 2000
+    pts = _points(rng.uniform(-1, 4, n), rng.uniform(-1, 4, n), rng.uniform(-3, 3, n),
+                  rng.uniform(0, 100, n))
+    flt = FrameFilter(polygon=U_SHAPE, z_min=-2, z_max=2, range_max=80, voxel_size=0.25)
+
+    out, removed = flt.apply(pts)
+    keep = ((pts['distance_m'] <= 80) & (pts['z'] >= -2) & (pts['z'] <= 2)
+            & points_in_polygon(pts['x'], pts['y'], U_SHAPE))
+    expected = voxel_downsample({k: v[keep] for k, v in pts.items()}, 0.25)
+    np.testing.assert_array_equal(out['laser_id'], expected['laser_id'])
+    assert sum(removed.values()) == n - len(out['x'])
+    assert all(removed[k] > 0 for k in ('range', 'z', 'roi', 'voxel'))
+
+    # A worker's copy (pickled with its totals) and the counts it sends back
+    worker = pickle.loads(pickle.dumps(flt))
+    worker.apply(pts)
+    flt.add_totals(n, len(out['x']), removed)
+    assert flt.totals == worker.totals
+    assert flt.totals['input'] == 2 * n and flt.totals['output'] == 2 * len(out['x'])
+
+
+def test_config_checks():
+    assert not FrameFilter()
+    assert FrameFilter.from_dict({'box': [0, 0, 1, 1]})
+    with pytest.raises(ValueError):
+        FrameFilter.from_dict({'bbox': [0, 0, 1, 1]})
+    with pytest.raises(ValueError):
+        FrameFilter(polygon=U_SHAPE, box=[0, 0, 1, 1])
+    with pytest.raises(ValueError):
+        FrameFilter(polygon=[(0, 0), (1, 1)])
@@ -0,0 +1,128 @@
+# tests/test_frame_archive.py
+
+import os
+
+import numpy as np
+import pytest
+
+import decoder.frame_archive as frame_archive
+from decoder.frame_archive import (
+    FrameArchiveWriter, FrameArchiveReader, convert_frames, V1_COLUMNS,
+    HOUR_US, XYZ_TOL_ABS_M, XYZ_TOL_REL,
+)
+from decoder.calibration          import Calibration
+from decoder.coordinate_transform import FRAME_COLUMNS, compute_points
+from decoder.frame_assembler      import FrameAssembler
+from decoder.frame_writers        import make_frame_writer
+from decoder.packet_parser        import parse_packets, RETURN_SINGLE
+from decoder.synthetic            import generate_packets, packet_period_us
+
+PACKETS_PER_REV = 301     # dual-return packets per revolution at 600 RPM
+
+
+@pytest.fixture(scope="module")
+def calib():
+    return Calibration.load()
+
+
+def _frames(calib, n_packets, start_us=0):
+    """
+    (frame_id, points) of the revolutions in n_packets synthetic packets.
+    """
+    assembler = FrameAssembler()
+    frames    = assembler.push(parse_packets(generate_packets(n_packets, start_us=start_us)))
+    frames.append(assembler.flush())
+    return [(f.frame_id, compute_points(f.batch, calib)) for f in frames]
+
+
+def _write(path, frames, chunk_points=20_000):
+    with FrameArchiveWriter(path, chunk_points=chunk_points) as writer:
+        for frame_id, points in frames:
+            writer.add(points, frame_id)
+    return path
+
+
+def _assert_same(got, points, return_type=None):
+    for k in FRAME_COLUMNS:
+        if k in ('x', 'y', 'z', 'return_type'):
+            continue
+        np.testing.assert_allclose(got[k], points[k], rtol=0, atol=1e-4, err_msg=k)
+    err = np.sqrt(sum((got[k] - points[k]) ** 2 for k in ('x', 'y', 'z')))
+    assert (err <= XYZ_TOL_ABS_M + XYZ_TOL_REL * points['distance_m']).all()
+    expected = points['return_type'] if return_type is None else return_type
+    np.testing.assert_array_equal(got['return_type'], expected)
+
+
+def test_round_trip(tmp_path, calib):
+    frames = _frames(calib, 3 * PACKETS_PER_REV)
+    path   = _write(str(tmp_path / "a.lfa"), frames)
+    with FrameArchiveReader(path) as reader:
+        assert reader.meta['version'] == 2 and len(reader.chunks) > 1
+        assert reader.frame_ids.tolist() == [f for f, _ in frames]
+        # Out of order, so chunks are decompressed again
+        for frame_id, points in reversed(frames):
+            _assert_same(reader.read_frame(frame_id), points)
+        with pytest.raises(KeyError):
+            reader.read_frame(999)
+
+
+def test_version_1_files(tmp_path, calib, monkeypatch):
+    """
+    Archives written before the return_type column (version 1) are read
+    with every point RETURN_SINGLE.
+    """
+    frames = _frames(calib, 2 * PACKETS_PER_REV)
+    with monkeypatch.context() as m:
+        m.setattr(frame_archive, 'ARCHIVE_VERSION', 1)
+        m.setattr(frame_archive, 'POINT_COLUMNS', V1_COLUMNS)
+        path = _write(str(tmp_path / "v1.lfa"), frames)
+    with FrameArchiveReader(path) as reader:
+        assert reader.meta['version'] == 1
+        for frame_id, points in frames:
+            _assert_same(reader.read_frame(frame_id), points,
+                         return_type=np.full(len(points['x']), RETURN_SINGLE))
+
+
+def test_hour_wrap(tmp_path, calib):
+    """
+    Sensor timestamps restart at the top of the hour: points keep their
+    raw timestamps, the index unwraps them so time windows still work.
+    """
+    start  = HOUR_US - int(1.5 * PACKETS_PER_REV * packet_period_us())
+    frames = _frames(calib, 4 * PACKETS_PER_REV, start_us=start)
+    wraps  = [np.diff(p['timestamp']).min() < 0 for _, p in frames]
+    assert any(wraps)    # one frame spans the rollover itself
+    path   = _write(str(tmp_path / "wrap.lfa"), frames)
+    with FrameArchiveReader(path) as reader:
+        idx = reader.index
+        assert (np.diff(idx['ts_start']) > 0).all()
+        assert (idx['ts_end'] >= idx['ts_start']).all()
+        assert idx['ts_end'][-1] > HOUR_US
+        for frame_id, points in frames:
+            _assert_same(reader.read_frame(frame_id), points)
+        after = reader.frames_between(HOUR_US + 1, 2 * HOUR_US).tolist()
+        assert after and after[-1] == frames[-1][0] and frames[0][0] not in after
+
+
+def test_convert_frame_files(tmp_path, calib):
+    frames = _frames(calib, 2 * PACKETS_PER_REV)
+    folder = tmp_path / "frames"
+    folder.mkdir()
+    writer = make_frame_writer('npy')
+    for frame_id, points in frames:
+        writer.write(points, os.path.join(folder, f"frame_{frame_id}"))
+    summary = convert_frames(str(folder), str(tmp_path / "c.lfa"), log=None)
+    assert summary['frames'] == len(frames)
+    assert summary['points'] == sum(len(p['x']) for _, p in frames)
+    with FrameArchiveReader(str(tmp_path / "c.lfa")) as reader:
+        for frame_id, points in frames:
+            _assert_same(reader.read_frame(frame_id), points)
+
+
+def test_refuses_transformed_frames(tmp_path, calib):
+    _, points = _frames(calib, PACKETS_PER_REV)[0]
+    points = dict(points, x=points['x'] + 1.0)
+    with pytest.raises(ValueError):
+        with FrameArchiveWriter(str(tmp_path / "bad.lfa")) as writer:
+            writer.add(points, 0)
+    assert not os.path.exists(tmp_path / "bad.lfa.tmp")
@@ -0,0 +1,53 @@
+# tests/test_frame_index.py
+
+import os
+
+import numpy as np
+import pytest
+
+import decoder.frame_index as frame_index
+from decoder.frame_index     import IndexedPcap, load_frame_index, index_path
+from decoder.frame_assembler import FrameAssembler
+from decoder.packet_parser   import parse_packets
+from decoder.synthetic       import generate_packets, write_synthetic_pcap
+
+N_PACKETS = 1500     # 5 revolutions of dual-return packets at 600 RPM
+
+
+@pytest.fixture
+def capture(tmp_path):
+    path = str(tmp_path / "synthetic.pcap")
+    write_synthetic_pcap(path, N_PACKETS)
+    return path
+
+
+def test_frames_match_assembler(capture):
+    assembler = FrameAssembler()
+    expected  = assembler.push(parse_packets(generate_packets(N_PACKETS)))
+    expected.append(assembler.flush())
+    with IndexedPcap(capture) as pcap:
+        assert len(pcap) == len(expected)
+        for f in expected:
+            got = pcap.read_frame(f.frame_id)
+            for k in ('block', 'azimuth', 'distance', 'timestamp'):
+                np.testing.assert_array_equal(got[k], f.batch[k], err_msg=k)
+
+
+def test_sidecar_reused(capture, monkeypatch):
+    index = load_frame_index(capture)
+    assert os.path.exists(index_path(capture))
+    monkeypatch.setattr(frame_index, 'build_frame_index',
+                        lambda path: pytest.fail("index rebuilt"))
+    np.testing.assert_array_equal(load_frame_index(capture), index)
+
+
+def test_unwritable_sidecar(capture, tmp_path, monkeypatch):
+    """
+    The sidecar is only a cache: a location that cannot be written still
+    gives the index.
+    """
+    expected = load_frame_index(capture, rebuild=True)
+    missing  = str(tmp_path / "no_such_dir" / "x.fidx.npz")
+    monkeypatch.setattr(frame_index, 'index_path', lambda path: missing)
+    np.testing.assert_array_equal(load_frame_index(capture), expected)
+    assert not os.path.exists(missing)
@@ -0,0 +1,45 @@
+# tests/test_live_capture.py
+
+import os
+
+import pytest
+
+import live_capture
+from decoder.calibration   import Calibration
+from decoder.frame_writers import make_frame_writer
+from decoder.pcap_writer   import PcapRecordWriter
+from decoder.synthetic     import generate_packets
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def segment_env(monkeypatch):
+    monkeypatch.setattr(live_capture, 'calib', Calibration.load(), raising=False)
+    monkeypatch.setattr(live_capture, 'frame_writer', make_frame_writer('csv'), raising=False)
+
+
+def _segment(path, n_packets):
+    with PcapRecordWriter(path) as writer:
+        for i, payload in enumerate(generate_packets(n_packets)):
+            writer.write_payload(payload.tobytes(), T0 + i * 1e-3)
+    return path
+
+
+def test_short_segment(tmp_path, segment_env):
+    """
+    A segment with fewer packets than slices converts the slices that
+    have packets and skips the empty ones.
+    """
+    seg = _segment(str(tmp_path / "seg.pcap"), 2)
+    assert live_capture.split_and_convert_segment(seg, "seg", str(tmp_path), 0.5) is True
+    slices = sorted(os.listdir(tmp_path / "pcap_slices" / "seg"))
+    frames = sorted(os.listdir(tmp_path / "csv_frames"))
+    assert len(slices) == 5
+    assert frames == ["seg_frame_1.csv", "seg_frame_2.csv"]
+
+
+def test_unreadable_segment(tmp_path, segment_env):
+    bad = tmp_path / "bad.pcap"
+    bad.write_bytes(b"not a capture")
+    assert live_capture.split_and_convert_segment(str(bad), "bad", str(tmp_path), 0.3) is False
@@ -0,0 +1,143 @@
+# tests/test_multi_sensor.py
+
+import json
+
+import numpy as np
+import pytest
+
+from decoder.coordinate_transform import FRAME_COLUMNS
+from decoder.synthetic            import generate_packets, packet_period_us
+from pipeline.multi_sensor        import (FrameMerger, SensorFrame, load_sensors, pose_matrix,
+                                          transform_points)
+
+WINDOW   = 0.05
+MAX_WAIT = 0.3
+
+
+class FakeSensor:
+    """
+    What FrameMerger reads from a Sensor: its name, the time of its last
+    decoded packet and the start of the revolution it is assembling.
+    """
+
+    def __init__(self, name, watermark=None, open_at=None):
+        self.name      = name
+        self.watermark = watermark
+        self.open_at   = open_at
+
+    def open_time(self):
+        return self.open_at
+
+
+def _frame(sensor, t, n=3):
+    points = {k: np.full(n, t, dtype=np.float64) for k in FRAME_COLUMNS}
+    return SensorFrame(sensor, 0, t, points)
+
+
+@pytest.fixture
+def sensors():
+    return [FakeSensor('a', watermark=10.1), FakeSensor('b', watermark=10.1)]
+
+
+def test_merge_window(sensors):
+    merger = FrameMerger(sensors, WINDOW, MAX_WAIT)
+    for sensor, t in (('a', 10.00), ('b', 10.03), ('a', 10.10), ('b', 10.16)):
+        merger.push(_frame(sensor, t))
+    merged = merger.pop(force=True)
+
+    assert [len(m.frames) for m in merged] == [2, 1, 1]
+    first = merged[0]
+    assert first.merge_id == 0 and first.missing == []
+    assert first.spread == pytest.approx(0.03)
+    np.testing.assert_array_equal(first.points['sensor'], [0, 0, 0, 1, 1, 1])
+    # 10.16 is more than a window after 10.10: separate groups
+    assert [m.missing for m in merged[1:]] == [['b'], ['a']]
+    assert (merger.merged, merger.partial) == (3, 2)
+
+
+def test_waits_for_live_sensor(sensors):
+    """
+    A group is held while another sensor may still deliver a frame for it.
+    """
+    a, b   = sensors
+    merger = FrameMerger(sensors, WINDOW, MAX_WAIT)
+    merger.push(_frame('a', 10.00))
+    assert merger.pop() == []                  # b is assembling, start unknown
+
+    b.open_at = 10.02                          # b's revolution started inside the window
+    assert merger.pop() == []
+
+    b.open_at = 10.08                          # ... or after it: b cannot contribute
+    (merged,) = merger.pop()
+    assert merged.missing == ['b']
+
+    merger.push(_frame('a', 10.10))
+    b.open_at = None
+    merger.push(_frame('b', 10.12))
+    (merged,) = merger.pop()
+    assert [f.sensor for f in merged.frames] == ['a', 'b'] and merged.missing == []
+
+
+def test_silent_sensor_times_out(sensors):
+    a, b   = sensors
+    merger = FrameMerger(sensors, WINDOW, MAX_WAIT)
+    merger.push(_frame('a', 10.00))
+    b.watermark = a.watermark - MAX_WAIT / 2
+    assert merger.pop() == []
+    b.watermark = a.watermark - 2 * MAX_WAIT   # silent: no longer waited for
+    (merged,) = merger.pop()
+    assert merged.missing == ['b']
+
+
+def test_pose_matrix():
+    m = pose_matrix({'x': 1.0, 'y': 2.0, 'z': 3.0, 'yaw': 90})
+    out = transform_points({'x': np.array([1.0]), 'y': np.array([0.0]), 'z': np.array([0.0])}, m)
+    np.testing.assert_allclose([out['x'][0], out['y'][0], out['z'][0]], [1.0, 3.0, 3.0],
+                               atol=1e-12)
+    np.testing.assert_array_equal(pose_matrix({'matrix': m.tolist()}), m)
+    with pytest.raises(ValueError):
+        pose_matrix({'matrix': [[1, 0], [0, 1]]})
+
+
+def test_sensors_end_to_end(tmp_path):
+    """
+    Two sensors with clocks 2 s apart and different poses: their
+    revolutions are aligned on the host clock and merged pairwise.
+    """
+    cfg = {"window_ms": 50, "max_wait_ms": 300, "sensors": [
+        {"name": "north", "port": 2368},
+        {"name": "south", "port": 2369, "pose": {"x": 100.0}},
+    ]}
+    path = tmp_path / "sensors.json"
+    path.write_text(json.dumps(cfg))
+    sensors, window, max_wait = load_sensors(str(path))
+    assert (window, max_wait) == (0.05, 0.3)
+    assert sensors[0].calib is sensors[1].calib
+
+    n, period = 900, packet_period_us() * 1e-6
+    merger = FrameMerger(sensors, window, max_wait)
+    merged = []
+    for first in range(0, n, 100):
+        for sensor, clock in zip(sensors, (0.0, 2.0)):
+            pkts   = generate_packets(100, start_us=int(first * period * 1e6) + int(clock * 1e6))
+            stamps = 1000.0 + (first + np.arange(100)) * period + 0.001
+            for frame in sensor.push(pkts, stamps):
+                merger.push(frame)
+        merged += merger.pop()
+    for sensor in sensors:
+        for frame in sensor.flush(None):
+            merger.push(frame)
+    merged += merger.pop(force=True)
+
+    full = [m for m in merged if not m.missing]
+    assert len(full) >= max(2, len(merged) - 2)
+    assert all(m.spread < window for m in full)
+    for m in full:
+        x = m.points['x']
+        s = m.points['sensor']
+        # Same scene, the second sensor shifted 100 m along x
+        assert x[s == 1].mean() - x[s == 0].mean() == pytest.approx(100.0, abs=1.0)
+
+    path.write_text(json.dumps({"sensors": [{"port": 1}, {"port": 1}]}))
+    with pytest.raises(ValueError):
+        load_sensors(str(path))
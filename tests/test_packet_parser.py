@@ -0,0 +1,172 @@
+# tests/test_packet_parser.py
+
+import os
+import glob
+import struct
+
+import numpy as np
+import pytest
+
+from config import DISTANCE_RESOLUTION
+
+from decoder.packet_parser import (
+    parse_packets, parse_packet_dual, as_packet_array, return_mode, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK,
+    RETURN_SINGLE, RETURN_DISTINCT, RETURN_DUPLICATE,
+)
+from decoder.calibration          import (Calibration, FIRING_SEQUENCE_PATH,
+                                          load_data_order_and_angles, load_firing_sequence,
+                                          load_timing_offsets)
+from decoder.coordinate_transform import compute_points, compute_cartesian, ROTATION_RATE_DEG_PER_US
+from decoder.pcap_reader          import PcapReader
+from decoder.synthetic            import generate_packets, FIRING_CYCLE_US
+
+# VLP-32C firing table: firing k starts FIRING_CYCLE_US * k after the
+# packet timestamp, and the lasers of firing-sequence row r fire
+# LASER_STEP_US * r into it
+LASER_STEP_US = 1.152
+
+ROOT         = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_PCAP = sorted(glob.glob(os.path.join(ROOT, "pcap_data", "*.pcap")))
+
+
+@pytest.fixture(scope="module")
+def calib():
+    return Calibration.load()
+
+
+def test_empty_batch(calib):
+    for empty in ([], b"", np.empty((0, 1206), dtype=np.uint8)):
+        batch = parse_packets(empty)
+        assert all(len(v) == 0 for v in batch.values())
+        points = compute_points(batch, calib)
+        assert all(len(v) == 0 for v in points.values())
+
+
+def test_return_types():
+    pkts = generate_packets(4, return_mode='dual', seed=3)
+    dist = as_packet_array(pkts)['blocks']['channels']['distance']    # (4, 12, 32)
+    batch = parse_packets(pkts)
+    types = batch['return_type'].reshape(4, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK)
+    first, second = dist[:, 0::2], dist[:, 1::2]
+    np.testing.assert_array_equal(types[:, 1::2] == RETURN_DUPLICATE, first == second)
+    distinct = (first != second) & (first != 0) & (second != 0)
+    np.testing.assert_array_equal(types[:, 0::2] == RETURN_DISTINCT, distinct)
+    assert return_mode(pkts) == 'dual'
+
+    single = parse_packets(generate_packets(4, return_mode='strongest', seed=3))
+    assert (single['return_type'] == RETURN_SINGLE).all()
+    assert (single['return_id'] == 0).all()
+
+
+@pytest.mark.parametrize("mode", ['dual', 'strongest'])
+def test_firing_offsets(calib, mode):
+    """
+    Per-point time offsets follow the firing table: in dual return the two
+    blocks of a pair fire together, so block b is firing b // 2; in single
+    return every block is its own firing.
+    """
+    pkts  = generate_packets(2, return_mode=mode, zero_ratio=0.0, seed=5)
+    batch = parse_packets(pkts)
+    pts   = compute_points(batch, calib, drop_zero=False, drop_duplicates=False)
+    assert len(pts['timestamp']) == 2 * BLOCKS_PER_PACKET * CHANNELS_PER_BLOCK
+
+    seq    = np.loadtxt(FIRING_SEQUENCE_PATH, delimiter=',', skiprows=1, dtype=np.int64)
+    row_of = {int(laser): r for r, laser in enumerate(seq[:, 0])}
+    rows   = np.array([row_of[int(laser)] for laser in pts['laser_id']])
+    firing = batch['block'] // 2 if mode == 'dual' else batch['block']
+    expect = FIRING_CYCLE_US * firing + LASER_STEP_US * rows
+    offset = pts['timestamp'] - batch['timestamp'].astype(np.int64)
+    # Offsets are truncated to whole µs
+    assert ((offset <= expect + 1e-6) & (offset > expect - 1)).all()
+
+    by_block = offset.reshape(2, BLOCKS_PER_PACKET, CHANNELS_PER_BLOCK)
+    if mode == 'dual':
+        np.testing.assert_array_equal(by_block[:, 0::2], by_block[:, 1::2])
+    else:
+        assert (np.diff(by_block[:, :, 0], axis=1) > 0).all()
+
+
+# -- reference: the per-packet decoder the batch path replaced ------------------
+
+def _legacy_parse(packet):
+    """
+    The original struct-based parse_packet_dual().
+    """
+    blocks = []
+    for block_idx in range(12):
+        block = packet[block_idx * 100:(block_idx + 1) * 100]
+        if struct.unpack("<H", block[0:2])[0] != 0xEEFF:
+            continue
+        azimuth  = struct.unpack("<H", block[2:4])[0]
+        channels = []
+        for ch in range(32):
+            i = 4 + ch * 3
+            channels.append((struct.unpack("<H", block[i:i + 2])[0], block[i + 2], block_idx % 2))
+        blocks.append((azimuth, channels, block_idx))
+    return blocks, struct.unpack("<I", packet[1200:1204])[0]
+
+
+def _legacy_points(payloads):
+    """
+    The original per-point loop of main1.py over the dict calibration,
+    with one deliberate change: the timing column is the block's firing
+    (block // 2 in dual return) instead of the block index.
+    """
+    laser_map, vertical_angles, azimuth_offsets = load_data_order_and_angles()
+    firing_seq    = load_firing_sequence()
+    timing        = load_timing_offsets()
+    seq_primary   = dict(zip(firing_seq['Laser ID'], firing_seq.index))
+    seq_secondary = dict(zip(firing_seq['Laser ID 2'], firing_seq.index))
+
+    rows = []
+    for payload in payloads:
+        blocks, base_ts = _legacy_parse(bytes(payload))
+        for azi_raw, channels, block_idx in blocks:
+            for ch_idx, (dist_raw, intensity, ret_id) in enumerate(channels):
+                if dist_raw == 0:
+                    continue
+                lid      = laser_map[ch_idx]
+                vert_ang = vertical_angles[lid]
+                az_off   = azimuth_offsets[lid]
+                row_idx  = seq_primary[lid] if ret_id == 0 else seq_secondary[lid]
+                ts_pt    = int(base_ts + float(timing[row_idx][block_idx // 2]))
+                az_base  = (azi_raw / 100.0 - az_off) % 360.0
+                az_deg   = (az_base + (ts_pt - base_ts) * ROTATION_RATE_DEG_PER_US + az_off) % 360.0
+                dist_m   = dist_raw * DISTANCE_RESOLUTION
+                rows.append((int(intensity), lid, int(round(az_deg * 100)), dist_m, ts_pt,
+                             vert_ang) + compute_cartesian(dist_m, az_deg, vert_ang))
+    return rows
+
+
+def _dual_payloads(source):
+    if source == 'synthetic':
+        pkts = generate_packets(40, return_mode='dual', seed=7)
+        pkts[3, 200:202] = 0            # one invalid block flag
+        return pkts
+    if not BUNDLED_PCAP:
+        pytest.skip("no capture in pcap_data/")
+    with PcapReader(BUNDLED_PCAP[0]) as reader:
+        return reader.payload_array()[:60].copy()
+
+
+@pytest.mark.parametrize("source", ['synthetic', 'bundled'])
+def test_matches_legacy_decoder(calib, source):
+    """
+    parse_packets() + compute_points() give the points of the original
+    per-packet path, in the same order.
+    """
+    payloads = _dual_payloads(source)
+    legacy   = _legacy_points(payloads)
+    pts      = compute_points(parse_packets(payloads), calib, drop_duplicates=False)
+    assert len(pts['x']) == len(legacy)
+
+    ref = list(zip(*legacy))
+    for k, col in zip(('intensity', 'laser_id', 'azimuth', 'distance_m', 'timestamp',
+                       'vertical_angle', 'x', 'y', 'z'), ref):
+        np.testing.assert_allclose(pts[k], col, rtol=0, atol=1e-9, err_msg=k)
+    np.testing.assert_array_equal(pts['adjustedtime'], pts['timestamp'])
+
+
+def test_parse_packet_dual_wrapper():
+    payload = _dual_payloads('synthetic')[3].tobytes()
+    assert parse_packet_dual(payload) == _legacy_parse(payload)
@@ -0,0 +1,159 @@
+# tests/test_pcap_reader.py
+
+import struct
+
+import numpy as np
+import pytest
+
+import decoder.pcap_reader as pcap_reader
+from decoder.pcap_reader import (
+    PcapReader, PCAP_MAGIC_US, PCAP_MAGIC_NS, PCAPNG_SHB, PCAPNG_BOM, BLOCK_IDB, BLOCK_EPB,
+    LINKTYPE_ETHERNET, LINKTYPE_NULL, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, VELODYNE_PORT,
+)
+from decoder.pcap_writer import PcapRecordWriter, udp_frame_header
+from decoder.synthetic   import generate_packets
+
+N_PACKETS = 20
+T0        = 1_700_000_000.0
+
+
+@pytest.fixture(scope="module")
+def packets():
+    return generate_packets(N_PACKETS, seed=1)
+
+
+def _stamps(n):
+    return T0 + np.arange(n) * 0.001
+
+
+def _ip_udp(payload, port=VELODYNE_PORT):
+    """
+    IPv4/UDP headers + payload (the Ethernet header of udp_frame_header()
+    stripped).
+    """
+    return udp_frame_header(len(payload), port)[14:] + bytes(payload)
+
+
+def _write_pcap(path, frames, stamps, endian='<', magic=PCAP_MAGIC_US, linktype=LINKTYPE_ETHERNET):
+    scale = 1e9 if magic == PCAP_MAGIC_NS else 1e6
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', magic, 2, 4, 0, 0, 65535, linktype))
+        for frame, ts in zip(frames, stamps):
+            sec = int(ts)
+            f.write(struct.pack(endian + 'IIII', sec, int(round((ts - sec) * scale)),
+                                len(frame), len(frame)))
+            f.write(frame)
+
+
+def _pad4(b):
+    return b + b"\0" * (-len(b) % 4)
+
+
+def _block(endian, btype, body):
+    blen = 12 + len(body)
+    return struct.pack(endian + 'II', btype, blen) + body + struct.pack(endian + 'I', blen)
+
+
+def _write_pcapng(path, frames, stamps, endian='<', tsresol=None, linktype=LINKTYPE_ETHERNET):
+    e     = endian
+    scale = 1e6 if tsresol is None else 10.0 ** tsresol
+    out   = [_block(e, PCAPNG_SHB, struct.pack(e + 'IHHq', PCAPNG_BOM, 1, 0, -1))]
+    opts  = b""
+    if tsresol is not None:
+        opts = struct.pack(e + 'HH', 9, 1) + _pad4(bytes([tsresol])) + struct.pack(e + 'HH', 0, 0)
+    out.append(_block(e, BLOCK_IDB, struct.pack(e + 'HHI', linktype, 0, 65535) + opts))
+    for frame, ts in zip(frames, stamps):
+        t = int(round(ts * scale))
+        out.append(_block(e, BLOCK_EPB, struct.pack(e + 'IIIII', 0, t >> 32, t & 0xFFFFFFFF,
+                                                   len(frame), len(frame)) + _pad4(frame)))
+    with open(path, 'wb') as f:
+        f.write(b"".join(out))
+
+
+def _check(path, packets, stamps, tol=1e-6):
+    with PcapReader(path) as reader:
+        offsets, ts = reader.payload_offsets()
+        np.testing.assert_array_equal(reader.payload_array(offsets), packets)
+        np.testing.assert_allclose(ts, stamps, rtol=0, atol=tol)
+        return reader.format, reader.linktype
+
+
+def test_pcap_writer_round_trip(tmp_path, packets):
+    path, stamps = str(tmp_path / "w.pcap"), _stamps(N_PACKETS)
+    with PcapRecordWriter(path) as writer:
+        for payload, ts in zip(packets, stamps):
+            writer.write_payload(payload.tobytes(), ts)
+    assert _check(path, packets, stamps) == ('pcap', LINKTYPE_ETHERNET)
+    with PcapReader(path) as reader:
+        assert [bytes(p) for p in reader] == [p.tobytes() for p in packets]
+
+
+@pytest.mark.parametrize("endian", ['<', '>'])
+@pytest.mark.parametrize("magic", [PCAP_MAGIC_US, PCAP_MAGIC_NS])
+def test_pcap_endianness_and_resolution(tmp_path, packets, endian, magic):
+    path, stamps = str(tmp_path / "e.pcap"), _stamps(N_PACKETS)
+    frames = [udp_frame_header(1206) + p.tobytes() for p in packets]
+    _write_pcap(path, frames, stamps, endian, magic)
+    assert _check(path, packets, stamps) == ('pcap', LINKTYPE_ETHERNET)
+
+
+@pytest.mark.parametrize("endian", ['<', '>'])
+@pytest.mark.parametrize("tsresol", [None, 9])
+def test_pcapng(tmp_path, packets, endian, tsresol):
+    path, stamps = str(tmp_path / "n.pcapng"), _stamps(N_PACKETS)
+    frames = [udp_frame_header(1206) + p.tobytes() for p in packets]
+    _write_pcapng(path, frames, stamps, endian, tsresol)
+    assert _check(path, packets, stamps) == ('pcapng', LINKTYPE_ETHERNET)
+
+
+@pytest.mark.parametrize("linktype, link_header", [
+    (LINKTYPE_NULL,      struct.pack('<I', 2)),
+    (LINKTYPE_RAW,       b""),
+    (LINKTYPE_LINUX_SLL, b"\0" * 14 + b"\x08\x00"),
+    (LINKTYPE_ETHERNET,  udp_frame_header(0)[:12] + b"\x81\x00\x00\x01\x08\x00"),   # VLAN tag
+])
+def test_link_types(tmp_path, packets, linktype, link_header):
+    path, stamps = str(tmp_path / "l.pcap"), _stamps(N_PACKETS)
+    _write_pcap(path, [link_header + _ip_udp(p) for p in packets], stamps, linktype=linktype)
+    assert _check(path, packets, stamps) == ('pcap', linktype)
+
+
+def test_filters_and_uneven_records(tmp_path, packets, monkeypatch):
+    """
+    Other ports and payload sizes are skipped; the records left are not
+    evenly spaced, so payload_array() takes the chunked gather path.
+    """
+    monkeypatch.setattr(pcap_reader, 'GATHER_CHUNK', 3)
+    path, frames = str(tmp_path / "f.pcap"), []
+    for i, p in enumerate(packets):
+        frames.append(udp_frame_header(1206) + p.tobytes())
+        if i % 3 == 0:
+            frames.append(udp_frame_header(1206, port=2369) + p.tobytes())
+        if i % 4 == 0:
+            frames.append(udp_frame_header(512) + bytes(512))
+    _write_pcap(path, frames, [T0] * len(frames))
+    with PcapReader(path) as reader:
+        offsets, _ = reader.payload_offsets()
+        assert len(set(np.diff(offsets).tolist())) > 1
+        np.testing.assert_array_equal(reader.payload_array(offsets), packets)
+
+
+def test_truncated_tail(tmp_path, packets):
+    path, stamps = str(tmp_path / "t.pcap"), _stamps(N_PACKETS)
+    with PcapRecordWriter(path) as writer:
+        for payload, ts in zip(packets, stamps):
+            writer.write_payload(payload.tobytes(), ts)
+    full = open(path, 'rb').read()
+    with open(path, 'wb') as f:
+        f.write(full[:-100])
+    with PcapReader(path) as reader:
+        records, _, _ = reader.scan_offsets()
+        assert len(records) == N_PACKETS - 1
+        assert reader.scan_end == records[-1] + 16 + 42 + 1206
+
+
+def test_unknown_magic(tmp_path):
+    path = tmp_path / "x.pcap"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        PcapReader(str(path))
@@ -0,0 +1,125 @@
+# tests/test_range_image.py
+
+import numpy as np
+import pytest
+
+from decoder.range_image import (
+    RangeImage, firing_columns, cluster_boxes, laser_rows, RANGE_ABS_M, RANGE_REL,
+)
+from decoder.calibration          import Calibration
+from decoder.coordinate_transform import compute_points
+from decoder.frame_assembler      import FrameAssembler
+from decoder.packet_parser        import parse_packets
+from decoder.synthetic            import generate_packets
+
+PACKETS_PER_REV = 301     # dual-return packets per revolution at 600 RPM
+
+
+@pytest.fixture(scope="module")
+def calib():
+    return Calibration.load()
+
+
+def _image(range_):
+    range_ = np.asarray(range_, dtype=np.float32)
+    index  = np.where(range_ > 0, np.arange(range_.size).reshape(range_.shape), -1)
+    xyz    = np.stack([range_, np.zeros_like(range_), np.zeros_like(range_)], axis=-1)
+    return RangeImage(range_, np.zeros(range_.shape, dtype=np.uint8), xyz, index)
+
+
+def _reference_labels(range_, abs_m=RANGE_ABS_M, rel=RANGE_REL):
+    """
+    Flood fill over 4-neighbours (azimuth wraps), clusters numbered in
+    order of their first cell.
+    """
+    rows, cols = range_.shape
+    labels = np.full(range_.shape, -1)
+    n = 0
+    for start in zip(*np.nonzero(range_ > 0)):
+        if labels[start] >= 0:
+            continue
+        labels[start], stack = n, [start]
+        while stack:
+            r, c = stack.pop()
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, (c - 1) % cols), (r, (c + 1) % cols)):
+                if not 0 <= nr < rows or labels[nr, nc] >= 0 or range_[nr, nc] <= 0:
+                    continue
+                a, b = range_[r, c], range_[nr, nc]
+                if abs(a - b) <= max(abs_m, rel * min(a, b)):
+                    labels[nr, nc] = n
+                    stack.append((nr, nc))
+        n += 1
+    return labels
+
+
+def test_cluster_small():
+    r = np.zeros((4, 8), dtype=np.float32)
+    r[0:2, 0:2] = 10.0        # wraps around to columns 6..7
+    r[0:2, 6:8] = 10.2
+    r[2:4, 3:5] = 20.0        # two objects side by side, 5 m apart
+    r[3, 5]     = 25.0
+    r[3, 1]     = 10.1        # isolated: no occupied neighbour
+    labels = _image(r).cluster()
+    expected = np.array([
+        [0, 0, -1, -1, -1, -1, 0, 0],
+        [0, 0, -1, -1, -1, -1, 0, 0],
+        [-1, -1, -1, 1, 1, -1, -1, -1],
+        [-1, 2, -1, 1, 1, 3, -1, -1],
+    ])
+    np.testing.assert_array_equal(labels, expected)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_cluster_matches_flood_fill(seed):
+    rng = np.random.default_rng(seed)
+    r   = rng.choice([0.0, 5.0, 5.3, 12.0, 40.0], size=(32, 300), p=[0.3, 0.2, 0.2, 0.2, 0.1])
+    r  += rng.normal(0, 0.05, r.shape) * (r > 0)
+    np.testing.assert_array_equal(_image(r).cluster(), _reference_labels(r.astype(np.float32)))
+
+
+def test_boxes():
+    r = np.zeros((4, 8), dtype=np.float32)
+    r[0:3, 1:5] = 10.0
+    r[3, 7]     = 30.0
+    img   = _image(r)
+    boxes = img.boxes(img.cluster(), min_points=2)
+    assert len(boxes) == 1
+    b = boxes[0]
+    assert (b['cluster'], b['n_points']) == (0, 12)
+    assert b['x_min'] == b['x_max'] == b['cx'] == b['range_min'] == 10.0
+    assert len(img.boxes(img.cluster(), min_points=1)) == 2
+
+
+def test_from_frame(calib):
+    """
+    A decoded dual-return revolution gets one column per firing; each
+    cell keeps its nearest return, and every box contains its points.
+    """
+    assembler = FrameAssembler()
+    frame     = assembler.push(parse_packets(generate_packets(2 * PACKETS_PER_REV)))[0]
+    points    = compute_points(frame.batch, calib)
+    assert firing_columns(points['block_azimuth']) == 1800
+
+    img = RangeImage.from_points(points, calib)
+    assert img.shape == (32, 1800)
+    dist = points['distance_m'].astype(np.float32)
+    np.testing.assert_array_equal(img.range[img.valid], dist[img.index[img.valid]])
+    az      = points['block_azimuth'].astype(np.int64)
+    col     = np.floor(az * 1800 / 36000 + 0.5).astype(np.int64) % 1800
+    cell    = laser_rows(calib)[points['laser_id']] * 1800 + col
+    nearest = np.full(32 * 1800, np.inf, dtype=np.float32)
+    np.minimum.at(nearest, cell, dist)
+    np.testing.assert_array_equal(img.range.ravel()[img.valid.ravel()],
+                                  nearest[img.valid.ravel()])
+    assert img.valid.sum() == len(np.unique(cell))
+
+    labels = img.cluster()
+    boxes  = cluster_boxes(points, calib)
+    assert len(boxes) > 0
+    per_point = img.point_labels(labels, len(points['x']))
+    for b in boxes:
+        sel = per_point == b['cluster']
+        assert sel.sum() == b['n_points']
+        for c in 'xyz':
+            assert points[c][sel].min() == pytest.approx(b[f'{c}_min'], abs=1e-4)
+            assert points[c][sel].max() == pytest.approx(b[f'{c}_max'], abs=1e-4)
@@ -0,0 +1,62 @@
+# tests/test_segment_pool.py
+
+import threading
+
+import pytest
+
+from pipeline.segment_pool import SegmentPool
+
+
+def _convert(seg_path):
+    if seg_path.startswith("raise"):
+        raise OSError("unreadable segment")
+    if seg_path.startswith("none"):
+        return None
+    return not seg_path.startswith("false")
+
+
+def test_failed_segments_counted():
+    """
+    A conversion that raises or returns False is counted as failed; any
+    other return value (None included) as converted.
+    """
+    pool = SegmentPool(_convert, workers=2, max_pending=8)
+    for seg in ("ok_1", "raise_1", "false_1", "ok_2", "none", "raise_2"):
+        assert pool.submit(seg) is True
+    stats = pool.close(drain_timeout=5)
+    assert stats['submitted'] == 6
+    assert (stats['converted'], stats['failed']) == (3, 3)
+    assert stats['pending'] == stats['busy'] == 0
+
+
+@pytest.mark.parametrize("policy, shed, expected", [
+    ("skip-decode", {'skip-decode': 1}, ["seg_0", "seg_1", "seg_2"]),
+    ("drop-oldest", {'drop-oldest': 1}, ["seg_0", "seg_2", "seg_3"]),
+])
+def test_overload_policy(tmp_path, policy, shed, expected):
+    """
+    With the only worker busy and the queue full, a new segment is shed
+    according to the policy.
+    """
+    release, started, done = threading.Event(), threading.Event(), []
+
+    def convert(seg_path):
+        started.set()
+        release.wait(5)
+        done.append(seg_path.rsplit("/", 1)[-1])
+
+    segs = [str(tmp_path / f"seg_{i}") for i in range(4)]
+    for seg in segs:
+        open(seg, 'wb').close()
+    pool = SegmentPool(convert, workers=1, max_pending=2, policy=policy)
+    pool.submit(segs[0])
+    assert started.wait(5)
+    results = [pool.submit(seg) for seg in segs[1:]]
+    release.set()
+    stats = pool.close(drain_timeout=5)
+
+    assert results == [True, True, policy != "skip-decode"]
+    assert sorted(done) == expected
+    assert {k: v for k, v in stats['shed'].items() if v} == shed
+    assert (tmp_path / "seg_1").exists() == (policy != "drop-oldest")
+    assert stats['failed'] == 0 and stats['converted'] == 3
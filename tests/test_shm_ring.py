@@ -0,0 +1,160 @@
+# tests/test_shm_ring.py
+
+import os
+import sys
+import itertools
+import subprocess
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pytest
+
+from decoder.coordinate_transform import FRAME_COLUMNS
+from pipeline.shm_ring import FrameRingWriter, FrameRingReader
+
+SLOTS      = 4
+MAX_POINTS = 64
+
+_names = itertools.count()
+
+
+def _points(frame_id, n=10):
+    """
+    Frame whose every column holds its frame id, so a read can be matched
+    to the frame that was published.
+    """
+    return {c: np.full(n, frame_id % 200) for c in FRAME_COLUMNS}
+
+
+@pytest.fixture
+def ring():
+    name   = f"test_ring_{os.getpid()}_{next(_names)}"
+    writer = FrameRingWriter(name, slots=SLOTS, max_points=MAX_POINTS)
+    yield writer
+    # Readers attached in this process took the block off the resource
+    # tracker (see shm_ring._attach); hand it back so unlink is balanced
+    resource_tracker.register(writer._shm._name, 'shared_memory')
+    writer.close()
+
+
+def test_read_in_order(ring):
+    with FrameRingReader(ring.name, start='latest') as reader:
+        assert reader.try_read() is None
+        for k in range(3):
+            ring.publish(_points(k), frame_id=100 + k, timestamp=float(k))
+        for k in range(3):
+            frame = reader.read(timeout=0)
+            assert (frame.seq, frame.frame_id, frame.timestamp) == (k, 100 + k, float(k))
+            assert frame.valid() and (frame.points['x'] == k).all()
+        assert reader.read(timeout=0) is None
+        assert reader.stats() == {'name': ring.name, 'read': 3, 'lapped': 0, 'torn': 0, 'behind': 0}
+
+
+def test_truncated_frame(ring):
+    with FrameRingReader(ring.name) as reader:
+        ring.publish(_points(7, MAX_POINTS + 5), frame_id=7)
+        frame = reader.read(timeout=0)
+        assert len(frame) == MAX_POINTS and frame.truncated == 5
+        assert ring.stats()['truncated_points'] == 5
+
+
+def test_lapped_reader_skips_to_oldest(ring):
+    with FrameRingReader(ring.name, start='latest') as reader:
+        for k in range(10):
+            ring.publish(_points(k), frame_id=k)
+        assert reader.behind() == 10
+        # One slot of headroom: the oldest frame kept is head - slots + 1
+        oldest = 10 - SLOTS + 1
+        ids    = [reader.read(timeout=0).frame_id for _ in range(10 - oldest)]
+        assert ids == list(range(oldest, 10))
+        assert reader.lapped == oldest
+        assert reader.read(timeout=0) is None
+
+
+def test_start_oldest(ring):
+    for k in range(6):
+        ring.publish(_points(k), frame_id=k)
+    with FrameRingReader(ring.name, start='oldest') as reader:
+        assert reader.read(timeout=0).frame_id == 6 - SLOTS + 1
+        assert reader.lapped == 0
+
+
+def test_frame_overwritten_after_read(ring):
+    with FrameRingReader(ring.name) as reader:
+        ring.publish(_points(0), frame_id=0)
+        frame = reader.read(timeout=0)
+        assert frame.copy() is not None
+        for k in range(1, SLOTS + 1):
+            ring.publish(_points(k), frame_id=k)
+        assert not frame.valid()
+        assert frame.copy() is None
+
+
+def test_torn_slots(ring):
+    with FrameRingReader(ring.name) as reader:
+        ring.publish(_points(0), frame_id=0)
+        slot = ring._slot_headers[0]
+
+        # Frame 0 still being written: nothing to read yet
+        slot['seq'] = 1
+        assert reader.try_read() is None and reader.torn == 0
+
+        # Frame SLOTS (same slot) written after the reader checked `head`:
+        # frame 0 is counted as torn and skipped
+        slot['seq'] = 2 * SLOTS + 1
+        ring.publish(_points(1), frame_id=1)
+        assert reader.try_read().frame_id == 1
+        assert reader.torn == 1 and reader.lapped == 0
+
+
+def test_not_a_ring():
+    with pytest.raises(FileNotFoundError):
+        FrameRingReader(f"test_ring_missing_{os.getpid()}")
+
+
+def test_live_ring_not_replaced(ring):
+    """
+    A second writer must not take over a ring whose writer is running.
+    """
+    with pytest.raises(FileExistsError):
+        FrameRingWriter(ring.name, slots=SLOTS, max_points=MAX_POINTS)
+    with FrameRingReader(ring.name) as reader:
+        ring.publish(_points(1), frame_id=1)
+        assert reader.read(timeout=0).frame_id == 1
+
+
+def test_foreign_block_not_replaced():
+    name  = f"test_ring_foreign_{os.getpid()}"
+    other = shared_memory.SharedMemory(name=name, create=True, size=4096)
+    try:
+        other.buf[:8] = b"not ring"
+        with pytest.raises(FileExistsError):
+            FrameRingWriter(name, slots=SLOTS, max_points=MAX_POINTS)
+        assert bytes(other.buf[:8]) == b"not ring"
+    finally:
+        # The writer's check attached to the block (see the ring fixture)
+        resource_tracker.register(other._name, 'shared_memory')
+        other.close()
+        other.unlink()
+
+
+def test_stale_ring_replaced():
+    """
+    A ring left behind by a writer that exited without unlinking it is
+    replaced.
+    """
+    name  = f"test_ring_stale_{os.getpid()}"
+    stale = FrameRingWriter(name, slots=SLOTS, max_points=MAX_POINTS)
+    dead  = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    stale._header['writer_pid'] = dead.pid
+    stale.close(unlink=False)
+
+    writer = FrameRingWriter(name, slots=2, max_points=MAX_POINTS)
+    try:
+        with FrameRingReader(name) as reader:
+            assert reader.slots == 2
+        assert int(writer._header['writer_pid']) == os.getpid()
+    finally:
+        resource_tracker.register(writer._shm._name, 'shared_memory')
+        writer.close()
@@ -0,0 +1,66 @@
+# tests/test_soak_live.py
+
+import pytest
+
+from benchmarks.soak_live  import summarize
+from pipeline.udp_receiver import DEFAULT_RING_SLOTS
+
+RATE = 3000.0
+
+
+def _replay(elapsed_s, rate=RATE):
+    return {'sent': int(elapsed_s * rate), 'errors': 0, 'loops': 1, 'elapsed_s': elapsed_s,
+            'rate': rate, 'target': rate, 'max_lag_s': 0.0}
+
+
+def _samples(elapsed_s, recv_rate, rss_mb_per_s=0.0):
+    return [{'t': float(t), 'sent': int(t * RATE), 'received': int(t * recv_rate),
+             'frames': t * 10, 'ring_fill': 0, 'ring_overruns': 0, 'kernel_drops': 0,
+             'rss_mb': 100.0 + t * rss_mb_per_s}
+            for t in range(1, int(elapsed_s) + 1)]
+
+
+def _final(received, backlog=0, p50=0.05):
+    return {'packets': {'received': received},
+            'gauges': {'ring.fill': backlog, 'ring.overruns': 0, 'kernel.drops': 0},
+            'counters': {'frames.written': 100},
+            'histograms': {'frame.latency_s': {'count': 100, 'p50': p50}}}
+
+
+def test_steady_run():
+    warmup  = DEFAULT_RING_SLOTS / RATE
+    elapsed = 3 * warmup
+    summary = summarize(_samples(elapsed, RATE, rss_mb_per_s=0.01), _final(int(elapsed * RATE)),
+                        _replay(elapsed))
+    assert summary['warmup_s'] == pytest.approx(warmup)
+    assert not summary['too_short'] and summary['behind'] == []
+    assert summary['rate']['sustained'] == pytest.approx(RATE, rel=0.01)
+    assert summary['memory']['growth_mb_per_h'] == pytest.approx(36.0, rel=0.01)
+    assert summary['packets']['dropped'] == 0
+
+
+def test_run_shorter_than_warmup():
+    """
+    No sample after the warm-up: no rate or memory trend instead of one
+    computed from the warm-up itself.
+    """
+    summary = summarize(_samples(5, RATE, rss_mb_per_s=3.0), _final(5 * 3000), _replay(5.0))
+    assert summary['too_short']
+    assert summary['rate']['sustained'] is None
+    assert summary['memory']['growth_mb_per_h'] is None
+    assert summary['memory']['rss_start_mb'] is None
+
+
+def test_not_keeping_up():
+    """
+    Received short of sent only by the ring backlog: no drops, but the run
+    is flagged as behind.
+    """
+    elapsed = 3 * DEFAULT_RING_SLOTS / RATE
+    sent    = int(elapsed * RATE)
+    summary = summarize(_samples(elapsed, 2000.0), _final(sent - 5000, backlog=5000, p50=1.8),
+                        _replay(elapsed))
+    assert summary['packets']['dropped'] == 0 and summary['packets']['backlog'] == 5000
+    reasons = " / ".join(summary['behind'])
+    assert len(summary['behind']) == 3
+    assert "sustained 2000" in reasons and "backlog 5000" in reasons and "p50 1.80s" in reasons